@@ -0,0 +1,89 @@
+"""Bulk import benchmark.
+
+Loads the same generated catalog twice against a running API, once with
+one ``POST /api/products`` per row (the only option before bulk import)
+and once streamed through ``POST /api/products/import``, and reports
+rows per second for each:
+
+    python -m benchmarks.bulk_import --base-url http://localhost:8001 --rows 20000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+
+
+def make_product(rng: random.Random, run: str, index: int) -> dict:
+    price = round(rng.uniform(9.99, 299.99), 2)
+    return {
+        "name": f"Bench {run} {index}",
+        "description": "Produto gerado para o benchmark de importação.",
+        "price": price,
+        "original_price": round(price * 1.4, 2),
+        "category": rng.choice(["Moda Feminina", "Acessórios", "Beleza", "Electrónicos"]),
+        "images": [f"https://images.example.com/bench/{index}.jpg"],
+        "stock": rng.randint(0, 200),
+        "supplier": rng.choice(["temu", "shein", "aliexpress"]),
+        "tags": ["bench"],
+    }
+
+
+async def per_item(client: httpx.AsyncClient, rows: list, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(row):
+        async with semaphore:
+            (await client.post("/api/products", json=row)).raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(post(row) for row in rows))
+    return time.perf_counter() - started
+
+
+async def bulk(client: httpx.AsyncClient, rows: list) -> tuple:
+    async def body():
+        for start in range(0, len(rows), 500):
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows[start:start + 500]).encode()
+
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/products/import", content=body(), headers={"Content-Type": "application/x-ndjson"}
+    )
+    response.raise_for_status()
+    return time.perf_counter() - started, response.json()
+
+
+async def run(base_url: str, count: int, concurrency: int) -> dict:
+    rng = random.Random(count)
+    run_id = uuid.uuid4().hex[:6]
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        item_seconds = await per_item(client, [make_product(rng, run_id, i) for i in range(count)], concurrency)
+        bulk_seconds, report = await bulk(client, [make_product(rng, run_id, count + i) for i in range(count)])
+    return {
+        "rows": count,
+        "per_item": {"seconds": round(item_seconds, 2), "rows_per_second": round(count / item_seconds, 1)},
+        "bulk_import": {
+            "seconds": round(bulk_seconds, 2),
+            "rows_per_second": round(count / bulk_seconds, 1),
+            "inserted": report["inserted"],
+            "failed": report["failed"],
+        },
+        "speedup": round(item_seconds / bulk_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.base_url, args.rows, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
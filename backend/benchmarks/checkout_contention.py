@@ -0,0 +1,101 @@
+"""Checkout contention benchmark.
+
+Creates one hot product with a fixed stock and fires many concurrent
+``POST /api/orders`` at it, then checks that exactly ``stock`` orders went
+through, the rest were rejected with 409, and the product never oversold:
+
+    python -m benchmarks.checkout_contention --base-url http://localhost:8001 \
+        --stock 500 --orders 5000 --concurrency 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+
+from benchmarks.harness import percentile
+
+
+async def place_order(client: httpx.AsyncClient, product: dict, semaphore: asyncio.Semaphore, latencies: list) -> int:
+    order = {
+        "user_email": f"bench-{uuid.uuid4().hex[:8]}@example.com",
+        "user_name": "Benchmark",
+        "items": [{"product_id": product["id"], "name": product["name"], "quantity": 1, "price": product["price"]}],
+        "total": product["price"],
+        "payment_method": "card",
+        "shipping_address": {"address": "Rua Augusta 1", "city": "Lisboa", "postal_code": "1100-048", "country": "Portugal"},
+    }
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/orders", json=order)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        latencies.append(time.perf_counter() - started)
+    return status
+
+
+async def run(base_url: str, stock: int, orders: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        product = (await client.post("/api/products", json={
+            "name": f"Hot Product {uuid.uuid4().hex[:6]}",
+            "description": "Checkout contention benchmark product",
+            "price": 19.99,
+            "category": "Benchmark",
+            "images": [],
+            "stock": stock,
+            "supplier": "benchmark",
+        })).raise_for_status().json()
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(
+            place_order(client, product, semaphore, latencies) for _ in range(orders)
+        ))
+        elapsed = time.perf_counter() - started
+
+        final_stock = (await client.get(f"/api/products/{product['id']}")).raise_for_status().json()["stock"]
+
+    accepted = statuses.count(200)
+    rejected = statuses.count(409)
+    return {
+        "product_id": product["id"],
+        "orders": orders,
+        "concurrency": concurrency,
+        "initial_stock": stock,
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": orders - accepted - rejected,
+        "final_stock": final_stock,
+        "oversold": accepted > stock or final_stock < 0,
+        "consistent": final_stock == stock - accepted,
+        "seconds": round(elapsed, 3),
+        "orders_per_second": round(orders / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.base_url, args.stock, args.orders, args.concurrency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
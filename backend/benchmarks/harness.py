@@ -0,0 +1,414 @@
+"""API load-test harness.
+
+Boots ``server.app`` with the fake LLM backend against a throwaway
+database and drives a weighted mix of storefront scenarios (browse,
+search, product page, checkout, order tracking, admin stats, chatbot). It
+reports requests/sec and p50/p95/p99 latency per route for every
+combination of catalog size and concurrency, and writes them to a JSON
+file:
+
+    python -m benchmarks.harness --catalog 1000 10000 --concurrency 8 64 --duration 20
+
+The app runs in-process behind httpx's ASGI transport by default.
+``--transport http`` serves it with uvicorn on a local port instead, and
+``--base-url`` points the load at a server that is already running.
+``--workers N`` (with ``--transport http``) runs it under gunicorn with N
+worker processes, as deployed; compare runs with 1 and N workers to check
+that throughput scales:
+
+    python -m benchmarks.harness --transport http --workers 4 --concurrency 64 128
+
+MongoDB comes from MONGO_URL (default ``mongodb://localhost:27017``).
+``--mongo mock`` swaps in mongomock-motor (``pip install mongomock-motor``);
+mongomock lacks some aggregation stages, so routes that use them show up as
+errors. Catalog sizes run in ascending order, and the catalog is topped up
+through ``POST /api/products/import`` between sizes.
+
+Compare two result files, failing if any route regressed by more than the
+threshold:
+
+    python -m benchmarks.harness --compare results/base.json results/head.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+CATEGORIES = ["Moda Feminina", "Moda Masculina", "Acessórios", "Beleza", "Electrónicos", "Casa & Decoração"]
+SUPPLIERS = ["temu", "shein", "aliexpress"]
+NOUNS = ["Relógio", "Bolsa", "Óculos", "Vestido", "Perfume", "Smartwatch", "Casaco", "Velas", "Colar", "Sapatos"]
+ADJECTIVES = ["Luxury", "Premium", "Elegante", "Gold", "Clássico", "Moderno", "Vintage", "Minimalista"]
+CHAT_MESSAGES = [
+    "Quanto tempo demora o envio para Lisboa?",
+    "Posso devolver um produto?",
+    "Que métodos de pagamento aceitam?",
+    "O relógio tem garantia?",
+]
+
+DEFAULT_MIX = {
+    "browse": 30,
+    "search": 15,
+    "product_page": 25,
+    "checkout": 8,
+    "order_tracking": 10,
+    "admin_stats": 2,
+    "chatbot": 10,
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_product(index: int) -> dict:
+    rng = random.Random(index)
+    noun = rng.choice(NOUNS)
+    price = round(rng.uniform(9.99, 299.99), 2)
+    return {
+        "id": f"bench-{index}",
+        "name": f"{noun} {rng.choice(ADJECTIVES)} {index}",
+        "description": f"{noun} de alta qualidade, ideal para oferecer. Referência {index}.",
+        "price": price,
+        "original_price": round(price * rng.uniform(1.2, 2.0), 2),
+        "category": rng.choice(CATEGORIES),
+        "images": [f"https://images.example.com/bench/{index}.jpg"],
+        # Plenty of stock so checkouts don't turn into 409s mid-run
+        "stock": 1_000_000,
+        "supplier": rng.choice(SUPPLIERS),
+        "tags": [noun.lower(), rng.choice(ADJECTIVES).lower()],
+    }
+
+
+class Workload:
+    """Scenario implementations plus the state they share (catalog ids, placed orders)."""
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, int]):
+        self.client = client
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+        self.catalog_size = 0
+        self.order_ids: List[str] = []
+        self.rng = random.Random(42)
+
+    async def grow_catalog(self, size: int) -> None:
+        if size <= self.catalog_size:
+            return
+        if self.catalog_size == 0:
+            for name in CATEGORIES:
+                slug = name.lower().replace(" & ", "-").replace(" ", "-")
+                await self.client.post("/api/categories", json={"id": f"bench-{slug}", "name": name, "slug": slug, "image": ""})
+
+        async def body():
+            for start in range(self.catalog_size, size, 1000):
+                rows = (make_product(i) for i in range(start, min(start + 1000, size)))
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+
+        response = await self.client.post(
+            "/api/products/import", content=body(), headers={"Content-Type": "application/x-ndjson"}, timeout=None
+        )
+        response.raise_for_status()
+        report = response.json()
+        if report["failed"]:
+            raise RuntimeError(f"Catalog import failed for {report['failed']} rows: {report['errors'][:3]}")
+        self.catalog_size = size
+
+    def product_id(self) -> str:
+        return f"bench-{self.rng.randrange(self.catalog_size)}"
+
+    async def browse(self):
+        params = {"category": self.rng.choice(CATEGORIES)}
+        if self.rng.random() < 0.5:
+            params.update(in_stock="true", min_price=self.rng.choice([0, 25, 50]))
+        return "GET /api/products/browse", await self.client.get("/api/products/browse", params=params)
+
+    async def search(self):
+        query = self.rng.choice(NOUNS + ADJECTIVES).lower()
+        return "GET /api/products?search", await self.client.get("/api/products", params={"search": query, "limit": 24})
+
+    async def product_page(self):
+        return "GET /api/products/{id}", await self.client.get(f"/api/products/{self.product_id()}")
+
+    async def checkout(self):
+        items = []
+        for product_id in {self.product_id() for _ in range(self.rng.randint(1, 3))}:
+            items.append({"product_id": product_id, "name": "", "quantity": 1, "price": 0})
+        response = await self.client.post("/api/orders", json={
+            "user_email": f"cliente{self.rng.randrange(1000)}@example.com",
+            "user_name": "Cliente Benchmark",
+            "items": items,
+            "total": 0,
+            "payment_method": "card",
+            "shipping_address": {"address": "Rua Augusta 1", "city": "Lisboa", "postal_code": "1100-048", "country": "Portugal"},
+        })
+        if response.status_code == 200:
+            self.order_ids.append(response.json()["id"])
+        return "POST /api/orders", response
+
+    async def order_tracking(self):
+        if not self.order_ids:
+            return await self.checkout()
+        order_id = self.rng.choice(self.order_ids)
+        return "GET /api/orders/{id}/tracking", await self.client.get(f"/api/orders/{order_id}/tracking")
+
+    async def admin_stats(self):
+        return "GET /api/admin/stats", await self.client.get("/api/admin/stats")
+
+    async def chatbot(self):
+        return "POST /api/ai/chatbot", await self.client.post("/api/ai/chatbot", json={
+            "message": self.rng.choice(CHAT_MESSAGES),
+            "session_id": f"bench-{self.rng.randrange(200)}",
+        })
+
+    async def run(self, concurrency: int, duration: float, record: bool = True) -> dict:
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                scenario = self.rng.choices(self.scenarios, self.weights)[0]
+                started = time.perf_counter()
+                try:
+                    route, response = await getattr(self, scenario)()
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    route, failed = scenario, True
+                latencies[route].append(time.perf_counter() - started)
+                if failed:
+                    errors[route] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        if not record:
+            return {}
+        everything = [latency for values in latencies.values() for latency in values]
+        return {
+            "concurrency": concurrency,
+            "seconds": round(elapsed, 2),
+            "total": summarize(everything, sum(errors.values()), elapsed),
+            "routes": {route: summarize(values, errors[route], elapsed) for route, values in sorted(latencies.items())},
+        }
+
+
+@asynccontextmanager
+async def api_client(args):
+    """Yield an httpx client bound to the app under test, booting it if needed."""
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+            yield client
+        return
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_DELAY_SECONDS"] = str(args.llm_delay)
+    os.environ.setdefault("CACHE_BACKEND", "local")
+    if args.mongo == "mock":
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("--mongo mock needs mongomock-motor: pip install mongomock-motor")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    import server
+
+    workers = getattr(args, "workers", 1)
+    try:
+        if args.transport == "http" and workers > 1:
+            if args.mongo == "mock":
+                sys.exit("--workers needs a real MongoDB; mongomock is per process")
+            # Separate processes, sharing only MongoDB, started the way production starts them
+            process = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+                 "--bind", f"127.0.0.1:{args.port}", "server:app"],
+                cwd=Path(__file__).resolve().parent.parent,
+                env={**os.environ, "WEB_CONCURRENCY": str(workers)},
+            )
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60, limits=limits) as client:
+                    while True:
+                        if process.poll() is not None:
+                            sys.exit(f"gunicorn exited with status {process.returncode}")
+                        try:
+                            if (await client.get("/api/health/ready")).status_code == 200:
+                                break
+                        except httpx.TransportError:
+                            pass
+                        await asyncio.sleep(0.2)
+                    yield client
+            finally:
+                process.terminate()
+                await asyncio.to_thread(process.wait)
+        elif args.transport == "http":
+            import uvicorn
+            uvicorn_server = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=args.port, log_level="warning"))
+            serving = asyncio.create_task(uvicorn_server.serve())
+            while not uvicorn_server.started:
+                if serving.done():
+                    serving.result()
+                await asyncio.sleep(0.05)
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60, limits=limits) as client:
+                    yield client
+            finally:
+                uvicorn_server.should_exit = True
+                await serving
+        else:
+            async with server.app.router.lifespan_context(server.app):
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+                    yield client
+    finally:
+        if not args.keep_db:
+            # The app's lifespan has closed its client by now
+            server.client.open()
+            await server.client.drop_database(args.db_name)
+            server.client.close()
+
+
+async def benchmark(args) -> dict:
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            sys.exit(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    runs = []
+    async with api_client(args) as client:
+        workload = Workload(client, mix)
+        for catalog_size in sorted(args.catalog):
+            print(f"Loading catalog of {catalog_size} products...", file=sys.stderr)
+            await workload.grow_catalog(catalog_size)
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await workload.run(concurrency, args.warmup, record=False)
+                print(f"Running {args.duration}s at concurrency {concurrency}...", file=sys.stderr)
+                run = await workload.run(concurrency, args.duration)
+                runs.append({"catalog_size": catalog_size, **run})
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "transport": "external" if args.base_url else args.transport,
+            "workers": None if args.base_url else args.workers,
+            "mongo": "external" if args.base_url else args.mongo,
+            "duration": args.duration,
+            "llm_delay": args.llm_delay,
+            "mix": mix,
+        },
+        "runs": runs,
+    }
+
+
+def compare(base_path: str, head_path: str, threshold: float) -> int:
+    """Print per-route changes between two result files; returns the number of regressions."""
+    base, head = (json.loads(Path(path).read_text()) for path in (base_path, head_path))
+    base_runs = {(run["catalog_size"], run["concurrency"]): run for run in base["runs"]}
+    regressions = 0
+    print(f"{'catalog':>8} {'conc':>5}  {'route':<32} {'p95 ms':>18} {'rps':>18}")
+    for run in head["runs"]:
+        previous = base_runs.get((run["catalog_size"], run["concurrency"]))
+        if not previous:
+            continue
+        for route, stats in run["routes"].items():
+            before = previous["routes"].get(route)
+            if not before or not before["p95_ms"] or not before["rps"]:
+                continue
+            p95_change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            rps_change = (stats["rps"] - before["rps"]) / before["rps"] * 100
+            regressed = p95_change > threshold or rps_change < -threshold
+            regressions += regressed
+            print(
+                f"{run['catalog_size']:>8} {run['concurrency']:>5}  {route:<32} "
+                f"{before['p95_ms']:>7} → {stats['p95_ms']:<7} {p95_change:+5.0f}% "
+                f"{before['rps']:>7} → {stats['rps']:<7} {rps_change:+5.0f}%"
+                f"{'  REGRESSION' if regressed else ''}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog", type=int, nargs="+", default=[1000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16])
+    parser.add_argument("--duration", type=float, default=20, help="seconds per run")
+    parser.add_argument("--warmup", type=float, default=2, help="unrecorded seconds before each run")
+    parser.add_argument("--mix", nargs="*", metavar="SCENARIO=WEIGHT", help=f"override weights ({', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--transport", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes (--transport http)")
+    parser.add_argument("--base-url", help="benchmark an already running server instead")
+    parser.add_argument("--mongo", choices=["local", "mock"], default="local")
+    parser.add_argument("--db-name", default=f"luxdrop_bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"))
+    parser.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    result = asyncio.run(benchmark(args))
+    output = Path(args.output) if args.output else Path(__file__).parent / "results" / (
+        f"{result['meta']['commit'] or 'local'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    for run in result["runs"]:
+        total = run["total"]
+        print(
+            f"catalog={run['catalog_size']} concurrency={run['concurrency']}: {total['rps']} req/s, "
+            f"p50 {total['p50_ms']} ms, p95 {total['p95_ms']} ms, p99 {total['p99_ms']} ms, {total['errors']} errors"
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
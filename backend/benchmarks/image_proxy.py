@@ -0,0 +1,142 @@
+"""Image proxy check against a local static file server.
+
+Generates JPEG originals, serves them from a local static file server and
+requests them through ``/api/images`` in-process. Reports cold (fetch +
+render) and warm (disk cache) latency per width and format, how much
+smaller the variants are, that revalidation answers 304, and that creating
+a product pre-warms its variants:
+
+    python -m benchmarks.image_proxy --images 20 --size 2400 --mongo mock
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from argparse import Namespace
+
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+from benchmarks.harness import api_client, percentile
+
+
+def make_originals(directory: str, count: int, size: int, prefix: str = "original") -> dict:
+    """Noisy gradient JPEGs (photo-like enough that encoders have work to do); returns sizes by name."""
+    rng = random.Random(count)
+    sizes = {}
+    for index in range(count):
+        image = Image.linear_gradient("L").resize((size, size * 3 // 4)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for _ in range(200):
+            x, y = rng.randrange(size), rng.randrange(size * 3 // 4)
+            draw.ellipse((x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200)),
+                         fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        name = f"{prefix}-{index}.jpg"
+        image.save(os.path.join(directory, name), quality=92)
+        sizes[name] = os.path.getsize(os.path.join(directory, name))
+    return sizes
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+async def run(args) -> dict:
+    directory = tempfile.mkdtemp(prefix="luxdrop-originals-")
+    originals = make_originals(directory, args.images, args.size)
+    static = web.Application()
+    static.router.add_static("/", directory)
+    runner = web.AppRunner(static)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    os.environ["IMAGE_ALLOWED_HOSTS"] = "127.0.0.1"
+    os.environ["IMAGE_CACHE_DIR"] = tempfile.mkdtemp(prefix="luxdrop-images-")
+    harness_args = Namespace(
+        base_url=None, concurrency=[args.concurrency], db_name=args.db_name, llm_delay=0.0,
+        mongo=args.mongo, transport="asgi", port=0, keep_db=False,
+    )
+    results = {}
+    try:
+        async with api_client(harness_args) as client:
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def fetch(url: str, width: int, format: str, latencies: list, sizes: list) -> str:
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get("/api/images", params={"url": url, "w": width, "format": format})
+                    latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+                sizes.append(len(response.content))
+                return response.headers["etag"]
+
+            urls = [f"{base}/{name}" for name in originals]
+            for format in args.formats:
+                for width in args.widths:
+                    row = {}
+                    for phase in ("cold", "warm"):
+                        latencies, sizes = [], []
+                        etags = await asyncio.gather(*(fetch(url, width, format, latencies, sizes) for url in urls))
+                        row[phase] = summarize(latencies)
+                    row["bytes_mean"] = round(statistics.mean(sizes))
+                    row["vs_original"] = round(statistics.mean(sizes) / statistics.mean(originals.values()), 3)
+                    results[f"{format}@{width}"] = row
+
+            revalidated = await client.get(
+                "/api/images", params={"url": urls[0], "w": args.widths[0], "format": args.formats[0]},
+                headers={"If-None-Match": etags[0]},
+            )
+
+            # A new product's images should be rendered before anyone asks for them
+            (name,) = make_originals(directory, 1, args.size, prefix=f"prewarm-{uuid.uuid4().hex[:6]}")
+            (await client.post("/api/products", json={
+                "name": "Prewarm check", "description": "Image proxy pre-warm check", "price": 10.0,
+                "category": "Benchmark", "images": [f"{base}/{name}"], "stock": 1, "supplier": "benchmark",
+            })).raise_for_status()
+            deadline = time.perf_counter() + args.timeout
+            while (await client.get("/api/admin/images/stats")).json()["prewarming"] and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+            started = time.perf_counter()
+            (await client.get("/api/images", params={"url": f"{base}/{name}", "w": 640, "format": "webp"})).raise_for_status()
+            prewarmed_ms = round((time.perf_counter() - started) * 1000, 2)
+            cache = (await client.get("/api/admin/images/stats")).json()
+    finally:
+        await runner.cleanup()
+
+    return {
+        "images": args.images,
+        "original_bytes_mean": round(statistics.mean(originals.values())),
+        "variants": results,
+        "revalidation_status": revalidated.status_code,
+        "prewarmed_request_ms": prewarmed_ms,
+        "cache": cache,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size", type=int, default=2400, help="original width in pixels")
+    parser.add_argument("--widths", type=int, nargs="+", default=[320, 640, 1280])
+    parser.add_argument("--formats", nargs="+", default=["webp", "jpeg"], help="add avif if Pillow supports it")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for pre-warming")
+    parser.add_argument("--mongo", choices=["local", "mock"], default="local")
+    parser.add_argument("--db-name", default=f"luxdrop_images_{uuid.uuid4().hex[:8]}")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
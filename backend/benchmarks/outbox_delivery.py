@@ -0,0 +1,214 @@
+"""Outbox delivery check against local SMTP and HTTP stand-ins.
+
+Boots the app in-process with a minimal SMTP sink and an HTTP webhook sink
+on localhost, both wired in as the real delivery targets. It places orders,
+moves some of them through status changes, then waits for the outbox to
+settle. It reports checkout latency, how long delivery took, and whether
+every event arrived exactly once after receivers drop repeats by
+idempotency key:
+
+    python -m benchmarks.outbox_delivery --orders 500 --concurrency 50 \
+        --fail-rate 0.2 --reject-rate 0.01
+
+``--fail-rate`` makes the webhook sink answer 503 (retried with backoff).
+``--reject-rate`` makes it answer 400 (dead-lettered). ``--mongo mock``
+works as it does for ``benchmarks.harness``. mongomock has no transactions,
+so the outbox writes events after the order.
+"""
+import argparse
+import asyncio
+import email
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from argparse import Namespace
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks.harness import api_client, percentile
+
+
+class SmtpSink:
+    """Just enough SMTP for smtplib: accepts every message and keeps it."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"220 luxdrop-sink ESMTP\r\n")
+        in_data, lines = False, []
+        while line := await reader.readline():
+            if in_data:
+                if line == b".\r\n":
+                    self.messages.append(email.message_from_bytes(b"".join(lines)))
+                    in_data, lines = False, []
+                    writer.write(b"250 OK\r\n")
+                else:
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                continue
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                writer.write(b"250 luxdrop-sink\r\n")
+            elif command == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+class WebhookSink:
+    """Records webhook deliveries by idempotency key, failing a share of attempts on purpose."""
+
+    def __init__(self, fail_rate: float, reject_rate: float, seed: int = 0):
+        self.fail_rate = fail_rate
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.attempts = 0
+        self.received = Counter()
+        self.kinds = Counter()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.attempts += 1
+        roll = self.rng.random()
+        if roll < self.reject_rate:
+            return web.Response(status=400)
+        if roll < self.reject_rate + self.fail_rate:
+            return web.Response(status=503)
+        await request.read()
+        self.received[request.headers["Idempotency-Key"]] += 1
+        self.kinds[request.headers.get("X-LuxDrop-Event", "")] += 1
+        return web.json_response({"ok": True})
+
+
+async def place_order(client, product: dict, semaphore: asyncio.Semaphore, latencies: list) -> str:
+    order = {
+        "user_email": f"outbox-{uuid.uuid4().hex[:8]}@example.com",
+        "user_name": "Outbox Check",
+        "items": [{"product_id": product["id"], "quantity": 1}],
+        "total": 0,
+        "payment_method": "card",
+        "shipping_address": {"address": "Rua Augusta 1", "city": "Lisboa", "postal_code": "1100-048", "country": "Portugal"},
+    }
+    async with semaphore:
+        started = time.perf_counter()
+        response = await client.post("/api/orders", json=order)
+        latencies.append(time.perf_counter() - started)
+    return response.raise_for_status().json()["id"]
+
+
+async def run(args) -> dict:
+    smtp = SmtpSink()
+    smtp_server = await asyncio.start_server(smtp.handle, "127.0.0.1", 0)
+    webhooks = WebhookSink(args.fail_rate, args.reject_rate)
+    http_app = web.Application()
+    http_app.router.add_post("/{target}", webhooks.handle)
+    runner = web.AppRunner(http_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    http_port = site._server.sockets[0].getsockname()[1]
+
+    os.environ["SMTP_HOST"] = "127.0.0.1"
+    os.environ["SMTP_PORT"] = str(smtp_server.sockets[0].getsockname()[1])
+    os.environ["SUPPLIER_ORDER_URL"] = f"http://127.0.0.1:{http_port}/supplier"
+    os.environ["ORDER_WEBHOOK_URLS"] = f"http://127.0.0.1:{http_port}/status"
+    os.environ.setdefault("OUTBOX_RETRY_BASE_SECONDS", "0.2")
+    os.environ.setdefault("OUTBOX_MAX_ATTEMPTS", "6")
+
+    harness_args = Namespace(
+        base_url=None, concurrency=[args.concurrency], db_name=args.db_name, llm_delay=0.0,
+        mongo=args.mongo, transport="asgi", port=0, keep_db=False,
+    )
+    try:
+        async with api_client(harness_args) as client:
+            product = (await client.post("/api/products", json={
+                "name": f"Outbox Product {uuid.uuid4().hex[:6]}",
+                "description": "Outbox delivery check product",
+                "price": 24.99,
+                "category": "Benchmark",
+                "images": [],
+                "stock": args.orders,
+                "supplier": "benchmark",
+            })).raise_for_status().json()
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies = []
+            started = time.perf_counter()
+            order_ids = await asyncio.gather(*(
+                place_order(client, product, semaphore, latencies) for _ in range(args.orders)
+            ))
+            shipped = order_ids[: int(len(order_ids) * args.ship_share)]
+            # An order has to be confirmed before it can ship
+            transitions = ("confirmed", "shipped")
+            for order_id in shipped:
+                for status in transitions:
+                    (await client.patch(f"/api/orders/{order_id}/status", params={"status": status})).raise_for_status()
+            writes_done = time.perf_counter()
+
+            deadline = writes_done + args.timeout
+            while True:
+                counts = (await client.get("/api/admin/outbox")).raise_for_status().json()["counts"]
+                busy = sum(n for statuses in counts.values() for status, n in statuses.items() if status in ("pending", "processing"))
+                if not busy or time.perf_counter() > deadline:
+                    break
+                await asyncio.sleep(0.2)
+            settled = time.perf_counter()
+    finally:
+        await runner.cleanup()
+        smtp_server.close()
+
+    message_ids = Counter(message["Message-ID"] for message in smtp.messages)
+    expected = {"order_email": args.orders, "supplier_order": args.orders, "status_webhook": len(shipped) * len(transitions)}
+    delivered = {kind: statuses.get("delivered", 0) for kind, statuses in counts.items()}
+    return {
+        "orders": args.orders,
+        "status_changes": len(shipped) * len(transitions),
+        "checkout_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+        },
+        "settle_seconds": round(settled - writes_done, 3),
+        "total_seconds": round(settled - started, 3),
+        "settled": not busy,
+        "outbox": counts,
+        "expected": expected,
+        "emails_received": len(message_ids),
+        "emails_repeated": sum(n - 1 for n in message_ids.values()),
+        "webhook_attempts": webhooks.attempts,
+        "webhooks_received": dict(webhooks.kinds),
+        "webhooks_repeated": sum(n - 1 for n in webhooks.received.values()),
+        "complete": all(delivered.get(kind, 0) + counts.get(kind, {}).get("dead", 0) == n for kind, n in expected.items()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ship-share", type=float, default=0.5, help="share of orders moved to shipped")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="webhook attempts answered with 503")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="webhook attempts answered with 400")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the outbox to settle")
+    parser.add_argument("--mongo", choices=["local", "mock"], default="local")
+    parser.add_argument("--db-name", default=f"luxdrop_outbox_{uuid.uuid4().hex[:8]}")
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["settled"] and result["complete"] else 1)
+
+
+if __name__ == "__main__":
+    main()
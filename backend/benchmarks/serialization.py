@@ -0,0 +1,99 @@
+"""Listing serialization benchmark.
+
+Compares the CPU spent turning stored product documents into a response
+body on the old path (parse ISO string dates per row, validate through the
+``List[Product]`` response model, then JSON-encode) and on the fast path
+(projected documents with native dates straight to orjson bytes):
+
+    python -m benchmarks.serialization --rows 100 10000 --repeat 20
+
+Needs no database; documents are generated in memory.
+"""
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "luxdrop_benchmark")
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+from codec import dump_rows  # noqa: E402
+from server import PRODUCT_DEFAULTS, product_list_adapter  # noqa: E402
+
+
+def make_rows(count: int) -> list:
+    rng = random.Random(count)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        price = round(rng.uniform(9.99, 299.99), 2)
+        rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"Relógio Luxury {i}",
+            "description": "Relógio de pulso com acabamento dourado e pulseira em pele genuína.",
+            "price": price,
+            "original_price": round(price * 1.5, 2),
+            "category": "Acessórios",
+            "images": [f"https://images.example.com/{i}.jpg"],
+            "stock": rng.randint(0, 200),
+            "supplier": "temu",
+            "tags": ["relógio", "luxo"],
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "reviews_count": rng.randint(0, 500),
+            "created_at": start + timedelta(minutes=i),
+        })
+    return rows
+
+
+def legacy_path(rows: list) -> bytes:
+    # What the handler and FastAPI did per request before the change
+    for row in rows:
+        if isinstance(row.get("created_at"), str):
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+    validated = product_list_adapter.validate_python(rows)
+    return json.dumps(product_list_adapter.dump_python(validated, mode="json")).encode()
+
+
+def fast_path(rows: list) -> bytes:
+    return dump_rows(rows, PRODUCT_DEFAULTS)
+
+
+def measure(func, make_input, repeat: int) -> float:
+    """Mean CPU milliseconds per call; inputs are rebuilt outside the timed section."""
+    total = 0.0
+    for _ in range(repeat):
+        rows = make_input()
+        started = time.process_time()
+        func(rows)
+        total += time.process_time() - started
+    return total / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.rows:
+        native = make_rows(count)
+        stored_as_strings = [{**row, "created_at": row["created_at"].isoformat()} for row in native]
+        legacy_ms = measure(legacy_path, lambda: [dict(row) for row in stored_as_strings], args.repeat)
+        fast_ms = measure(fast_path, lambda: [dict(row) for row in native], args.repeat)
+        results.append({
+            "rows": count,
+            "legacy_cpu_ms": round(legacy_ms, 3),
+            "fast_cpu_ms": round(fast_ms, 3),
+            "saved_cpu_ms": round(legacy_ms - fast_ms, 3),
+            "speedup": round(legacy_ms / fast_ms, 1) if fast_ms else None,
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Bulk product import and export.
+
+Imports read the request body as a stream of NDJSON or CSV rows and never
+hold more than one chunk of rows in memory. Each chunk is validated row by
+row against the create model and written with a single unordered
+``bulk_write``. Rows that carry an ``id`` are upserted, others are
+inserted. Validation and write failures are reported per row, by line
+number, and the rest of the chunk still goes through. Exports stream the
+catalog back out in the same two formats.
+
+CSV files use the column names in ``CSV_COLUMNS``. List fields (``images``
+and ``tags``) are separated by ``|``, and empty cells are treated as missing.
+Besides the create model's fields, imports accept the ``PRESERVED_FIELDS``
+that exports write, so an exported file imports back unchanged.
+"""
+import csv
+import io
+import logging
+from typing import AsyncIterator, List, Optional, Tuple, Type
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from changes import ChangeFeed, ProductChange
+from codec import JSON_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = [
+    "id", "name", "description", "price", "original_price", "category", "images",
+    "stock", "supplier", "tags", "rating", "reviews_count", "created_at",
+]
+# Exported fields outside the create model; validated against the product model on import
+PRESERVED_FIELDS = ("rating", "reviews_count", "created_at")
+LIST_COLUMNS = {"images", "tags"}
+LIST_SEPARATOR = "|"
+MAX_LINE_BYTES = 1024 * 1024
+
+Row = Tuple[int, Optional[dict], Optional[str]]  # line number, row, parse error
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering more than one line."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"Line longer than {MAX_LINE_BYTES} bytes")
+    if buffer:
+        yield buffer
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_no, None, f"invalid JSON: {str(e)}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+def _csv_row(header: List[str], values: List[str]) -> dict:
+    row = {}
+    for column, value in zip(header, values):
+        if value == "":
+            continue
+        row[column] = [item for item in value.split(LIST_SEPARATOR) if item] if column in LIST_COLUMNS else value
+    return row
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    header = None
+    line_no, record_start, pending = 0, 0, ""
+    async for line in iter_lines(chunks):
+        line_no += 1
+        text = line.decode("utf-8-sig" if line_no == 1 else "utf-8", errors="replace").rstrip("\r")
+        if not pending:
+            record_start = line_no
+        pending = f"{pending}\n{text}" if pending else text
+        # An odd number of quotes means a quoted field continues on the next line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield record_start, _csv_row(header, values), None
+    if pending:
+        yield record_start, None, "unterminated quoted field"
+
+
+def rows_for(format: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    return iter_csv(chunks) if format == "csv" else iter_ndjson(chunks)
+
+
+class ProductImporter:
+    def __init__(
+        self,
+        collection,
+        change_feed: ChangeFeed,
+        create_model: Type[BaseModel],
+        product_model: Type[BaseModel],
+        chunk_size: int = 1000,
+        max_errors: int = 1000,
+    ):
+        self.collection = collection
+        self.change_feed = change_feed
+        self.create_model = create_model
+        self.product_model = product_model
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    async def run(self, rows: AsyncIterator[Row]) -> dict:
+        report = {"received": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": [], "errors_truncated": False}
+        chunk: List[Tuple[int, dict]] = []
+        try:
+            async for line_no, row, error in rows:
+                report["received"] += 1
+                if error:
+                    self._fail(report, line_no, error)
+                    continue
+                chunk.append((line_no, row))
+                if len(chunk) >= self.chunk_size:
+                    await self._write_chunk(chunk, report)
+                    chunk = []
+        except ValueError as e:
+            # The stream itself is unreadable; report what was imported up to here
+            self._fail(report, None, str(e))
+        if chunk:
+            await self._write_chunk(chunk, report)
+        return report
+
+    def _fail(self, report: dict, line_no: Optional[int], error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < self.max_errors:
+            report["errors"].append({"line": line_no, "error": error})
+        else:
+            report["errors_truncated"] = True
+
+    async def _write_chunk(self, chunk: List[Tuple[int, dict]], report: dict) -> None:
+        operations, lines, docs, written = [], [], [], []
+        for line_no, row in chunk:
+            product_id = row.get("id")
+            preserved = {field: row[field] for field in PRESERVED_FIELDS if field in row}
+            try:
+                fields = self.create_model.model_validate(row).model_dump()
+                doc = self.product_model(
+                    **fields, **preserved, **({"id": str(product_id)} if product_id else {})
+                ).model_dump()
+            except ValidationError as e:
+                errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                self._fail(report, line_no, errors)
+                continue
+            fields.update({field: doc[field] for field in preserved})
+            if product_id:
+                operations.append(UpdateOne(
+                    {"id": doc["id"]},
+                    {"$set": fields, "$setOnInsert": {k: v for k, v in doc.items() if k not in fields}},
+                    upsert=True,
+                ))
+            else:
+                operations.append(InsertOne(doc))
+            lines.append(line_no)
+            docs.append(doc)
+            written.append(sorted(fields))
+        if not operations:
+            return
+
+        # Previous price and stock of rows that update existing products, for the change feed
+        update_ids = [doc["id"] for operation, doc in zip(operations, docs) if isinstance(operation, UpdateOne)]
+        previous = {}
+        if update_ids:
+            previous = {
+                current["id"]: current
+                async for current in self.collection.find(
+                    {"id": {"$in": update_ids}}, {"_id": 0, "id": 1, "price": 1, "stock": 1}
+                )
+            }
+
+        failed = set()
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get("writeErrors", []):
+                failed.add(error["index"])
+                self._fail(report, lines[error["index"]], error.get("errmsg", "write failed"))
+
+        upserted = {item["index"] for item in details.get("upserted", [])}
+        changes = []
+        for index, (operation, doc, fields) in enumerate(zip(operations, docs, written)):
+            if index in failed:
+                continue
+            if isinstance(operation, InsertOne) or index in upserted:
+                changes.append(ProductChange.created(doc))
+            else:
+                current = previous.get(doc["id"], {})
+                changes.append(ProductChange(
+                    product_id=doc["id"],
+                    kind="updated",
+                    old_price=current.get("price"),
+                    new_price=doc["price"],
+                    old_stock=current.get("stock"),
+                    new_stock=doc["stock"],
+                    changed_fields=fields,
+                ))
+        report["inserted"] += sum(1 for change in changes if change.kind == "created")
+        report["updated"] += sum(1 for change in changes if change.kind == "updated")
+        await self.change_feed.publish(changes)
+
+
+# ----- export -----
+
+async def export_ndjson(cursor) -> AsyncIterator[bytes]:
+    async for doc in cursor:
+        yield orjson.dumps(doc, default=str, option=JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+def _csv_value(doc: dict, column: str):
+    value = doc.get(column)
+    if column in LIST_COLUMNS:
+        return LIST_SEPARATOR.join(value or [])
+    if value is None:
+        return ""
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+async def export_csv(cursor, batch_rows: int = 500) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc, column) for column in CSV_COLUMNS])
+        rows += 1
+        if rows % batch_rows == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
@@ -0,0 +1,274 @@
+"""Read-through cache for hot catalog responses.
+
+Two layers: a small in-process LRU with TTL in front of an optional shared
+backend (MongoDB ``cache_entries`` collection, or a process-local stand-in
+for development). Entries hold the serialized JSON body together with its
+ETag so handlers can answer ``If-None-Match`` with a 304 without touching
+the database. Concurrent misses for the same key are coalesced into a
+single load, and a load that an ``invalidate`` overtook is returned to its
+callers but not cached, so a write is never undone by a read that started
+before it.
+
+Invalidation reaches this process's LRU and the shared backend. Other
+workers' LRUs keep their copy until it expires, so the local TTL is the
+staleness bound across workers; ``server.py`` shortens it when running
+several of them.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "CacheEntry":
+        return cls(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+class LRUCache:
+    """Bounded in-process LRU with per-entry expiry.
+
+    Bounded by entry count and, when ``max_bytes`` is set, by the total size
+    of the cached values (``bytes``/``str`` length or ``CacheEntry.body``).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.size_bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        if isinstance(value, CacheEntry):
+            return len(value.body)
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        return 0
+
+    def _pop(self, key: str) -> None:
+        _, _, size = self._data.pop(key)
+        self.size_bytes -= size
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None) -> None:
+        if key in self._data:
+            self._pop(key)
+        size = self._sizeof(value)
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value, size)
+        self.size_bytes += size
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self.size_bytes > self.max_bytes and len(self._data) > 1
+        ):
+            self._pop(next(iter(self._data)))
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        if key in self._data:
+            self._pop(key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            self._pop(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size_bytes = 0
+
+
+class CacheBackend:
+    """Shared cache backend interface."""
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def delete_prefix(self, prefix: str) -> None:
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """Process-local stand-in for a shared backend (development and tests)."""
+
+    def __init__(self, max_entries: int = 10000):
+        self._lru = LRUCache(max_entries=max_entries)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return self._lru.get(key)
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self._lru.set(key, entry, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._lru.delete(key)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        self._lru.delete_prefix(prefix)
+
+
+class MongoCacheBackend(CacheBackend):
+    """Shared backend stored in a MongoDB collection with a TTL index on expires_at."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        doc = await self.collection.find_one(
+            {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}
+        )
+        if not doc:
+            return None
+        return CacheEntry(body=bytes(doc["body"]), etag=doc["etag"])
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                "body": entry.body,
+                "etag": entry.etag,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl),
+            },
+            upsert=True,
+        )
+
+    async def delete(self, *keys: str) -> None:
+        await self.collection.delete_many({"_id": {"$in": list(keys)}})
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await self.collection.delete_many({"_id": {"$regex": f"^{re.escape(prefix)}"}})
+
+
+class ResponseCache:
+    """Read-through cache with request coalescing and hit/miss counters."""
+
+    def __init__(self, local: LRUCache, shared: Optional[CacheBackend] = None, shared_ttl: float = 300.0):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped by invalidations of a key while it is being loaded
+        self._generations: Dict[str, int] = {}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> CacheEntry:
+        entry = self.local.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generations.setdefault(key, 0)
+        try:
+            entry = await self.shared.get(key) if self.shared else None
+            if entry is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                entry = CacheEntry.from_body(await loader())
+                if self.shared and self._generations.get(key) == generation:
+                    await self.shared.set(key, entry, self.shared_ttl)
+            if self._generations.get(key) == generation:
+                self.local.set(key, entry)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an error with no waiters doesn't get logged as unhandled
+            future.exception()
+            raise
+        finally:
+            # An invalidation may have handed the key to a newer load already
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if key not in self._inflight:
+                self._generations.pop(key, None)
+
+    def _overtake(self, keys) -> None:
+        """Keep loads in flight for ``keys`` from caching what they read, and from new callers."""
+        for key in keys:
+            if key in self._inflight:
+                self._generations[key] += 1
+                del self._inflight[key]
+
+    async def invalidate(self, *keys: str) -> None:
+        self._overtake(keys)
+        for key in keys:
+            self.local.delete(key)
+        if self.shared and keys:
+            await self.shared.delete(*keys)
+
+    async def invalidate_prefix(self, prefix: str) -> None:
+        self._overtake([key for key in self._inflight if key.startswith(prefix)])
+        self.local.delete_prefix(prefix)
+        if self.shared:
+            await self.shared.delete_prefix(prefix)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self.local),
+            "size_bytes": self.local.size_bytes,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.local.evictions,
+            "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_response(request: Request, entry: CacheEntry) -> Response:
+    """JSON response for a cache entry, or an empty 304 if the client's copy is current."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,141 @@
+"""Product change feed.
+
+Writers (product creation, supplier syncs, AI enrichment) publish
+``ProductChange`` events after their database write succeeds. Downstream
+consumers such as the search index, the catalog cache and the dashboard
+counters subscribe once, instead of each writer calling them directly or
+consumers polling ``db.products``. Events are also appended to
+``product_changes`` so price/stock history can be inspected later.
+
+Subscribers run in the worker that published the change. Ones that keep
+per-process state (the search index, the in-process cache) subscribe with
+``every_worker=True``; ``follow`` polls ``product_changes`` for changes
+other workers recorded and replays them to those subscribers.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[List["ProductChange"]], Awaitable[None]]
+
+
+@dataclass
+class ProductChange:
+    product_id: str
+    kind: str  # created, updated
+    old_price: Optional[float] = None
+    new_price: Optional[float] = None
+    old_stock: Optional[int] = None
+    new_stock: Optional[int] = None
+    changed_fields: List[str] = field(default_factory=list)
+    # Full document for created products, so consumers don't need to read it back
+    product: Optional[dict] = None
+    changed_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def created(cls, product: dict) -> "ProductChange":
+        return cls(
+            product_id=product["id"],
+            kind="created",
+            new_price=product.get("price"),
+            new_stock=product.get("stock"),
+            changed_fields=sorted(k for k in product if k != "_id"),
+            product={k: v for k, v in product.items() if k != "_id"},
+        )
+
+    @property
+    def price_changed(self) -> bool:
+        return self.kind == "created" or self.old_price != self.new_price
+
+    @property
+    def stock_changed(self) -> bool:
+        return self.kind == "created" or self.old_stock != self.new_stock
+
+
+class ChangeFeed:
+    def __init__(self, collection=None):
+        self.collection = collection
+        # Tags this worker's records so follow() can skip them
+        self.origin = uuid.uuid4().hex
+        self._subscribers: List[Subscriber] = []
+        self._replicated: List[Subscriber] = []
+
+    def subscribe(self, subscriber: Optional[Subscriber] = None, *, every_worker: bool = False):
+        def register(subscriber: Subscriber) -> Subscriber:
+            self._subscribers.append(subscriber)
+            if every_worker:
+                self._replicated.append(subscriber)
+            return subscriber
+
+        return register(subscriber) if subscriber else register
+
+    async def publish(self, changes: List[ProductChange]) -> None:
+        if not changes:
+            return
+        if self.collection is not None:
+            try:
+                await self.collection.insert_many(
+                    [
+                        {**{k: v for k, v in asdict(change).items() if k != "product"}, "origin": self.origin}
+                        for change in changes
+                    ],
+                    ordered=False,
+                )
+            except Exception as e:
+                logger.error(f"Failed to record {len(changes)} product changes: {str(e)}")
+        await self._deliver(self._subscribers, changes)
+
+    async def _deliver(self, subscribers: List[Subscriber], changes: List[ProductChange]) -> None:
+        results = await asyncio.gather(
+            *(subscriber(changes) for subscriber in subscribers), return_exceptions=True
+        )
+        for subscriber, result in zip(subscribers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Change feed subscriber {subscriber.__name__} failed: {str(result)}")
+
+    async def _replay(self, records: List[dict], products) -> List[ProductChange]:
+        # Records leave out the product document; read back the ones that were created
+        created = [record["product_id"] for record in records if record["kind"] == "created"]
+        documents = {}
+        if created:
+            documents = {doc["id"]: doc async for doc in products.find({"id": {"$in": created}}, {"_id": 0})}
+        names = {f.name for f in fields(ProductChange)}
+        changes = []
+        for record in records:
+            change = ProductChange(**{k: v for k, v in record.items() if k in names})
+            if change.kind == "created":
+                change.product = documents.get(change.product_id)
+                if change.product is None:
+                    continue
+            changes.append(change)
+        return changes
+
+    async def follow(self, products, interval: float = 1.0, overlap: float = 5.0) -> None:
+        """Replay changes recorded by other workers to ``every_worker`` subscribers, until cancelled.
+
+        Records are read by ``changed_at``, which is stamped before the insert,
+        so the last ``overlap`` seconds are re-read and already-seen ids skipped.
+        """
+        window = timedelta(seconds=overlap)
+        since = datetime.now(timezone.utc)
+        seen: Dict[object, datetime] = {}
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                records = await self.collection.find(
+                    {"changed_at": {"$gt": since - window}, "origin": {"$ne": self.origin}},
+                ).sort("changed_at", 1).to_list(None)
+                records = [record for record in records if record["_id"] not in seen]
+                for record in records:
+                    seen[record["_id"]] = record["changed_at"]
+                    since = max(since, record["changed_at"])
+                seen = {key: at for key, at in seen.items() if at > since - window}
+                if records:
+                    await self._deliver(self._replicated, await self._replay(records, products))
+            except Exception as e:
+                logger.error(f"Following product changes failed: {str(e)}")
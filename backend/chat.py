@@ -0,0 +1,117 @@
+"""Chatbot session history and batched transcript persistence.
+
+``ChatHistory`` keeps the last few turns of each active session in memory
+(bounded per session and in number of sessions) and only reads
+``chat_messages`` when a session is not cached. ``TranscriptWriter`` takes
+transcript writes off the response path: messages are queued and flushed
+in bulk by a background task.
+"""
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChatHistory:
+    def __init__(self, collection, window: int = 10, max_sessions: int = 5000):
+        self.collection = collection
+        self.window = window
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Deque[dict]]" = OrderedDict()
+
+    async def get(self, session_id: str) -> List[dict]:
+        """Return up to ``window`` previous turns of a session, oldest first."""
+        turns = self._sessions.get(session_id)
+        if turns is None:
+            docs = await self.collection.find(
+                {"session_id": session_id}, {"_id": 0, "message": 1, "response": 1}
+            ).sort("created_at", -1).limit(self.window).to_list(self.window)
+            turns = deque(reversed(docs), maxlen=self.window)
+            self._remember(session_id, turns)
+        else:
+            self._sessions.move_to_end(session_id)
+        return list(turns)
+
+    def append(self, session_id: str, message: str, response: str) -> None:
+        turns = self._sessions.get(session_id)
+        if turns is None:
+            turns = deque(maxlen=self.window)
+            self._remember(session_id, turns)
+        turns.append({"message": message, "response": response})
+
+    def _remember(self, session_id: str, turns: Deque[dict]) -> None:
+        self._sessions[session_id] = turns
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+def build_chat_prompt(message: str, history: List[dict]) -> str:
+    """Prefix the customer's message with the recent conversation, if any."""
+    if not history:
+        return message
+    lines = ["Conversation so far:"]
+    for turn in history:
+        lines.append(f"Customer: {turn['message']}")
+        lines.append(f"Assistant: {turn['response']}")
+    lines.append("")
+    lines.append(f"Customer: {message}")
+    return "\n".join(lines)
+
+
+class TranscriptWriter:
+    """Queue chat messages and write them with insert_many in the background."""
+
+    def __init__(self, collection, batch_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, doc: dict) -> None:
+        # Only waits if the queue is full, which applies backpressure instead of dropping transcripts
+        await self._queue.put(doc)
+
+    async def stop(self) -> None:
+        """Stop the background task and flush whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        await self._flush(batch)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            try:
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                await self._flush(batch)
+                raise
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]) -> None:
+        if not batch:
+            return
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(batch)} chat messages: {str(e)}")
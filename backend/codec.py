@@ -0,0 +1,113 @@
+"""Storage and wire codecs.
+
+Timestamps are stored as native BSON dates. The Mongo client is created
+with ``CLIENT_OPTIONS`` so they come back as timezone-aware UTC datetimes,
+and they sort and range-query correctly without per-row parsing.
+Documents written before this change still hold ISO strings.
+``migrate_string_dates`` converts them in the background in small keyset
+batches, and each update only applies if the field still holds the string
+it read, so it can run while the API keeps serving.
+
+Hot list endpoints skip building a Pydantic model per row. They fetch
+documents projected to the response model's fields and serialize them
+straight to JSON bytes with orjson (``dump_rows``). UTC datetimes are
+written with a ``Z`` suffix, as Pydantic writes them, so these endpoints
+return the same dates as the ``response_model`` path they replaced.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Sequence, Type
+
+import orjson
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+CLIENT_OPTIONS = {"tz_aware": True, "tzinfo": timezone.utc}
+# "2026-03-01T10:30:00Z" like Pydantic, rather than orjson's "+00:00"
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+# Date fields that older releases wrote as ISO strings
+DATE_FIELDS: Dict[str, Sequence[str]] = {
+    "products": ("created_at", "synced_at"),
+    "orders": ("created_at", "updated_at"),
+    "chat_messages": ("created_at",),
+    "product_changes": ("changed_at",),
+    "inventory_ledger": ("created_at",),
+    "stock_reservations": ("created_at",),
+    "enrichment_jobs": ("created_at", "updated_at"),
+    "sync_runs": ("started_at", "finished_at"),
+}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    """Parse an ISO 8601 string; naive values are taken as UTC."""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+async def migrate_string_dates(db, fields: Dict[str, Sequence[str]] = DATE_FIELDS, batch_size: int = 1000) -> Dict[str, int]:
+    """Rewrite string dates as BSON dates. Returns the number converted per collection."""
+    converted = {}
+    for collection_name, names in fields.items():
+        collection = db[collection_name]
+        count = 0
+        for name in names:
+            last_id = None
+            while True:
+                query = {name: {"$type": "string"}}
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                docs = await collection.find(query, {name: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not docs:
+                    break
+                last_id = docs[-1]["_id"]
+                operations = []
+                for doc in docs:
+                    parsed = parse_date(doc[name])
+                    if parsed is None:
+                        logger.warning(f"Leaving unparseable {collection_name}.{name} on {doc['_id']}: {doc[name]!r}")
+                        continue
+                    # Only if nobody rewrote the field since it was read
+                    operations.append(UpdateOne({"_id": doc["_id"], name: doc[name]}, {"$set": {name: parsed}}))
+                if operations:
+                    result = await collection.bulk_write(operations, ordered=False)
+                    count += result.modified_count
+        if count:
+            converted[collection_name] = count
+    return converted
+
+
+# ----- fast JSON -----
+
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly the model's fields."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def model_defaults(model: Type[BaseModel]) -> dict:
+    """Static defaults to fill in for fields a stored document may lack."""
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=str, option=JSON_OPTIONS)
+
+
+def dump_rows(rows: Iterable[dict], defaults: Optional[dict] = None) -> bytes:
+    """Serialize projected documents as a JSON array without per-row validation."""
+    if defaults:
+        rows = [{**defaults, **row} for row in rows]
+    return orjson.dumps(rows if isinstance(rows, list) else list(rows), default=str, option=JSON_OPTIONS)
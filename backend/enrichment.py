@@ -0,0 +1,205 @@
+"""Bulk AI enrichment of catalog products.
+
+A job takes a list of product ids (or a category/supplier filter), and for
+each product generates a description, SEO tags and one social post per
+platform. The prompts for one product run concurrently, and products are
+processed under a configurable concurrency limit. Failed model calls are
+retried with exponential backoff. Results are written back to
+``db.products`` in ``bulk_write`` batches.
+
+Progress is tracked in ``enrichment_jobs``. Each enriched product is
+stamped with ``ai_enrichment.job_id``, so a job that was interrupted
+(crash, redeploy) picks up where it left off when it is resumed. A run in
+which some products still failed after their retries ends as
+``completed_with_errors``; resuming it retries just those products.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from llm import LLMClient, LLMError
+from prompts import description_prompt, parse_tags, social_post_prompt, tags_prompt
+
+logger = logging.getLogger(__name__)
+
+ID_CHUNK_SIZE = 500
+MAX_ERRORS_KEPT = 100
+
+
+class EnrichmentJobs:
+    def __init__(
+        self,
+        db,
+        llm_client: LLMClient,
+        concurrency: int = 8,
+        batch_size: int = 50,
+        max_attempts: int = 4,
+        on_products_updated: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+    ):
+        self.products = db.products
+        self.jobs = db.enrichment_jobs
+        self.llm = llm_client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.on_products_updated = on_products_updated
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # With several workers only the one holding the jobs lease runs jobs;
+        # the others just record them and it picks them up on its next poll
+        self.active = True
+
+    async def create(self, product_ids: List[str], platforms: List[str]) -> dict:
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "product_ids": product_ids,
+            "platforms": platforms,
+            "total": len(product_ids),
+            "succeeded": 0,
+            "failed": 0,
+            "errors": [],
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.jobs.insert_one(job)
+        self.start(job["id"])
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.jobs.find_one({"id": job_id}, {"_id": 0, "product_ids": 0})
+
+    def start(self, job_id: str) -> None:
+        if not self.active:
+            return
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            return
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def resume_interrupted(self) -> int:
+        """Restart jobs that were still running when the process stopped."""
+        jobs = await self.jobs.find({"status": {"$in": ["queued", "running"]}}, {"id": 1}).to_list(None)
+        for job in jobs:
+            self.start(job["id"])
+        return len(jobs)
+
+    async def resume(self, job_id: str) -> None:
+        """Run a job again, skipping products it already enriched."""
+        if self.active:
+            self.start(job_id)
+        else:
+            await self._update_job(job_id, {"$set": {"status": "queued"}, "$unset": {"error": ""}})
+
+    async def shutdown(self) -> None:
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ----- job execution -----
+
+    async def _update_job(self, job_id: str, update: dict) -> None:
+        update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+        await self.jobs.update_one({"id": job_id}, update)
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.jobs.find_one({"id": job_id})
+        if not job:
+            return
+        # Failures are retried on resume, so only count those of the current run
+        await self._update_job(job_id, {"$set": {"status": "running", "failed": 0, "errors": []}})
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending: List[Tuple[str, UpdateOne]] = []
+        lock = asyncio.Lock()
+        failed = 0
+
+        async def process(product: dict) -> None:
+            nonlocal failed
+            async with semaphore:
+                try:
+                    fields = await self._enrich(product, job["platforms"])
+                except LLMError as e:
+                    logger.warning(f"Enrichment of {product['id']} failed: {e}")
+                    failed += 1
+                    await self._update_job(job_id, {
+                        "$inc": {"failed": 1},
+                        "$push": {"errors": {
+                            "$each": [{"product_id": product["id"], "error": str(e)}],
+                            "$slice": -MAX_ERRORS_KEPT,
+                        }},
+                    })
+                    return
+            fields["ai_enrichment"] = {"job_id": job_id, "enriched_at": datetime.now(timezone.utc)}
+            async with lock:
+                pending.append((product["id"], UpdateOne({"id": product["id"]}, {"$set": fields})))
+                if len(pending) >= self.batch_size:
+                    await self._flush(job_id, pending)
+
+        try:
+            ids = job["product_ids"]
+            for start in range(0, len(ids), ID_CHUNK_SIZE):
+                # Skip products this job already enriched before an interruption
+                products = await self.products.find(
+                    {"id": {"$in": ids[start:start + ID_CHUNK_SIZE]}, "ai_enrichment.job_id": {"$ne": job_id}},
+                    {"_id": 0, "id": 1, "name": 1, "category": 1, "price": 1, "description": 1, "tags": 1},
+                ).to_list(None)
+                await asyncio.gather(*(process(product) for product in products))
+            async with lock:
+                await self._flush(job_id, pending)
+            status = "completed_with_errors" if failed else "completed"
+            await self._update_job(job_id, {"$set": {"status": status}})
+            logger.info(f"Enrichment job {job_id} {status.replace('_', ' ')}")
+        except asyncio.CancelledError:
+            # Leave the job as running so it is resumed on the next startup
+            async with lock:
+                await self._flush(job_id, pending)
+            raise
+        except Exception as e:
+            logger.error(f"Enrichment job {job_id} failed: {str(e)}")
+            await self._update_job(job_id, {"$set": {"status": "failed", "error": str(e)}})
+
+    async def _flush(self, job_id: str, pending: List[Tuple[str, UpdateOne]]) -> None:
+        if not pending:
+            return
+        product_ids = [product_id for product_id, _ in pending]
+        operations = [operation for _, operation in pending]
+        pending.clear()
+        await self.products.bulk_write(operations, ordered=False)
+        await self._update_job(job_id, {"$inc": {"succeeded": len(operations)}})
+        if self.on_products_updated:
+            await self.on_products_updated(product_ids)
+
+    async def _generate(self, prompt: str, session_id: str) -> str:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=1, min=1, max=30),
+            retry=retry_if_exception_type(LLMError),
+            reraise=True,
+        ):
+            with attempt:
+                return await self.llm.generate(prompt, session_id=session_id)
+
+    async def _enrich(self, product: dict, platforms: List[str]) -> dict:
+        """Generate description, tags and social posts for one product concurrently."""
+        description, tags, *posts = await asyncio.gather(
+            self._generate(description_prompt(product["name"], product["category"], product.get("tags")), "product_gen"),
+            self._generate(tags_prompt(product["name"], product["category"]), "tags_gen"),
+            *(
+                self._generate(
+                    social_post_prompt(product["name"], product["price"], product.get("description", ""), platform),
+                    "social_gen",
+                )
+                for platform in platforms
+            ),
+        )
+        return {
+            "description": description,
+            "tags": parse_tags(tags),
+            "social_posts": dict(zip(platforms, posts)),
+        }
@@ -0,0 +1,318 @@
+"""Faceted catalog browsing.
+
+Facet counts for the whole catalog live in ``facet_counts`` as one document
+per (dimension, value), for example ``{"_id": "category:Beleza",
+"count": 12}``. They are kept current from the product change feed:
+created products and stock or price moves are ``$inc``-ed in place. Changes
+to category, supplier, tags or rating can't be diffed (the feed doesn't
+carry the old values), so they schedule a debounced ``refresh`` that
+recounts everything with a single ``$facet`` aggregation. The refresh also
+writes ``categories.product_count``.
+
+When the shopper has applied filters, ``filtered_counts`` computes the
+counts for the matching products with ``$facet`` aggregations after
+index-backed ``$match``es. Counts are disjunctive: each filtered dimension
+is counted with its own filter left out, so with "Beleza" selected the
+category facet still lists the other categories and what picking them
+would add. Dimensions without a filter share one aggregation over the
+full query, and each filtered one gets its own, all run concurrently.
+"""
+import asyncio
+import bisect
+import logging
+from collections import Counter, defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from changes import ProductChange
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("category", "supplier", "tags", "price", "rating", "in_stock")
+# Lower bounds; the last bucket is open-ended
+PRICE_BUCKETS = [0, 25, 50, 100, 200, 500]
+RATING_BUCKETS = [0, 3, 4, 4.5]
+MAX_TAGS = 30
+# Fields whose old value is needed to move a product between buckets
+RECOUNT_FIELDS = {"category", "supplier", "tags", "rating"}
+# The browse_query field each dimension filters on
+FILTER_FIELDS = {
+    "category": "category", "supplier": "supplier", "tags": "tags",
+    "price": "price", "rating": "rating", "in_stock": "stock",
+}
+
+Counts = Dict[str, Dict[str, int]]
+
+
+def _bucket_label(bounds: List[float], value) -> Optional[str]:
+    if not isinstance(value, (int, float)):
+        return None
+    index = max(bisect.bisect_right(bounds, value) - 1, 0)
+    upper = bounds[index + 1] if index + 1 < len(bounds) else None
+    return f"{bounds[index]}-{upper}" if upper is not None else f"{bounds[index]}+"
+
+
+def price_bucket(price) -> Optional[str]:
+    return _bucket_label(PRICE_BUCKETS, price)
+
+
+def rating_bucket(rating) -> Optional[str]:
+    return _bucket_label(RATING_BUCKETS, rating)
+
+
+def in_stock_value(stock) -> str:
+    return "true" if isinstance(stock, (int, float)) and stock > 0 else "false"
+
+
+def product_facets(product: dict) -> List[tuple]:
+    """(dimension, value) pairs a product counts towards."""
+    pairs = [
+        ("category", product.get("category")),
+        ("supplier", product.get("supplier")),
+        ("price", price_bucket(product.get("price"))),
+        ("rating", rating_bucket(product.get("rating"))),
+        ("in_stock", in_stock_value(product.get("stock"))),
+    ]
+    pairs.extend(("tags", tag) for tag in set(product.get("tags") or []))
+    return [(dimension, value) for dimension, value in pairs if value is not None]
+
+
+def browse_query(
+    category: Optional[List[str]] = None,
+    supplier: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+) -> dict:
+    query = {}
+    if category:
+        query["category"] = {"$in": category}
+    if supplier:
+        query["supplier"] = {"$in": supplier}
+    if tags:
+        query["tags"] = {"$all": tags}
+    if min_price is not None or max_price is not None:
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if min_rating is not None:
+        query["rating"] = {"$gte": min_rating}
+    if in_stock is not None:
+        query["stock"] = {"$gt": 0} if in_stock else {"$lte": 0}
+    return query
+
+
+def _facet_stages() -> dict:
+    def bucket(field: str, bounds: List[float]) -> List[dict]:
+        return [
+            {"$match": {field: {"$type": "number"}}},
+            {"$bucket": {"groupBy": f"${field}", "boundaries": bounds + [float("inf")], "default": "other",
+                         "output": {"count": {"$sum": 1}}}},
+        ]
+
+    def group(field: str) -> dict:
+        return {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+
+    return {
+        "category": [group("category")],
+        "supplier": [group("supplier")],
+        "tags": [{"$unwind": "$tags"}, group("tags")],
+        "price": bucket("price", PRICE_BUCKETS),
+        "rating": bucket("rating", RATING_BUCKETS),
+        "in_stock": [{"$group": {"_id": {"$gt": ["$stock", 0]}, "count": {"$sum": 1}}}],
+    }
+
+
+def _label(dimension: str, value) -> Optional[str]:
+    """Turn a $facet group key into the value stored in facet_counts."""
+    if value is None or value == "other":
+        return None
+    if dimension == "price":
+        return price_bucket(value)
+    if dimension == "rating":
+        return rating_bucket(value)
+    if dimension == "in_stock":
+        return "true" if value else "false"
+    return value
+
+
+def _counts(results: List[Dict[str, list]]) -> Counts:
+    """Merge $facet results into counts by dimension and stored value."""
+    counts = defaultdict(dict)
+    for result in results:
+        for dimension, groups in result.items():
+            for group in groups:
+                value = _label(dimension, group["_id"])
+                if value is not None:
+                    counts[dimension][value] = group["count"]
+    return counts
+
+
+def format_facets(counts: Counts) -> Dict[str, List[dict]]:
+    """Counts per dimension as lists for the API: biggest first, buckets in order."""
+    result = {}
+    for dimension in DIMENSIONS:
+        values = [(value, count) for value, count in counts.get(dimension, {}).items() if count > 0]
+        if dimension in ("price", "rating"):
+            bounds = PRICE_BUCKETS if dimension == "price" else RATING_BUCKETS
+            order = {_bucket_label(bounds, bound): i for i, bound in enumerate(bounds)}
+            values.sort(key=lambda item: order.get(item[0], len(order)))
+        else:
+            values.sort(key=lambda item: (-item[1], str(item[0])))
+        if dimension == "tags":
+            values = values[:MAX_TAGS]
+        result[dimension] = [{"value": value, "count": count} for value, count in values]
+    return result
+
+
+class FacetCounts:
+    def __init__(
+        self,
+        db,
+        refresh_delay: float = 5.0,
+        on_refreshed: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.products = db.products
+        self.categories = db.categories
+        self.collection = db.facet_counts
+        self.refresh_delay = refresh_delay
+        self.on_refreshed = on_refreshed
+        self._dirty = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get(self) -> Counts:
+        counts = defaultdict(dict)
+        async for doc in self.collection.find({"count": {"$gt": 0}}, {"_id": 0, "dimension": 1, "value": 1, "count": 1}):
+            counts[doc["dimension"]][doc["value"]] = doc["count"]
+        return counts
+
+    async def browse_counts(self, query: dict) -> Tuple[Counts, int]:
+        """Facet counts and the number of matching products for a browse page."""
+        if query:
+            return await self.filtered_counts(query)
+        counts = await self.get()
+        return counts, sum(counts.get("in_stock", {}).values())
+
+    async def _count(self, query: dict, facets: dict) -> Dict[str, list]:
+        pipeline = [{"$match": query}] if query else []
+        result = await self.products.aggregate(pipeline + [{"$facet": facets}]).to_list(1)
+        return result[0] if result else {}
+
+    async def filtered_counts(self, query: dict) -> Tuple[Counts, int]:
+        """Disjunctive facet counts for ``query`` and how many products match it."""
+        stages = _facet_stages()
+        filtered = [dimension for dimension in DIMENSIONS if FILTER_FIELDS[dimension] in query]
+        shared = {dimension: stages[dimension] for dimension in DIMENSIONS if dimension not in filtered}
+        results = await asyncio.gather(
+            self._count(query, {**shared, "total": [{"$count": "count"}]}),
+            *(
+                self._count(
+                    {field: condition for field, condition in query.items() if field != FILTER_FIELDS[dimension]},
+                    {dimension: stages[dimension]},
+                )
+                for dimension in filtered
+            ),
+        )
+        total = results[0].pop("total", None)
+        return _counts(results), total[0]["count"] if total else 0
+
+    async def all_counts(self) -> Counts:
+        """Facet counts over the whole catalog, in one aggregation."""
+        return _counts([await self._count({}, _facet_stages())])
+
+    # ----- maintenance -----
+
+    async def _increment(self, increments: Counter) -> None:
+        operations = [
+            UpdateOne(
+                {"_id": f"{dimension}:{value}"},
+                {"$inc": {"count": delta}, "$setOnInsert": {"dimension": dimension, "value": value}},
+                upsert=True,
+            )
+            for (dimension, value), delta in increments.items() if delta
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        categories = [(value, delta) for (dimension, value), delta in increments.items() if dimension == "category" and delta]
+        if categories:
+            await self.categories.bulk_write(
+                [UpdateOne({"name": name}, {"$inc": {"product_count": delta}}) for name, delta in categories],
+                ordered=False,
+            )
+
+    async def apply(self, changes: Iterable[ProductChange]) -> bool:
+        """Update counts for a batch of product changes. Returns True if category counts moved."""
+        increments = Counter()
+        for change in changes:
+            if change.kind == "created":
+                for pair in product_facets(change.product):
+                    increments[pair] += 1
+                continue
+            if RECOUNT_FIELDS & set(change.changed_fields) or (change.price_changed and change.old_price is None):
+                self.schedule_refresh()
+                continue
+            if change.stock_changed and change.old_stock is not None:
+                old, new = in_stock_value(change.old_stock), in_stock_value(change.new_stock)
+                if old != new:
+                    increments[("in_stock", old)] -= 1
+                    increments[("in_stock", new)] += 1
+            if change.price_changed:
+                old, new = price_bucket(change.old_price), price_bucket(change.new_price)
+                if old != new:
+                    increments[("price", old)] -= 1
+                    increments[("price", new)] += 1
+        await self._increment(increments)
+        return any(dimension == "category" for dimension, _ in increments)
+
+    def schedule_refresh(self) -> None:
+        self._dirty = True
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_when_quiet())
+
+    async def _refresh_when_quiet(self) -> None:
+        # Coalesce a burst of changes (a supplier sync) into one recount
+        while self._dirty:
+            self._dirty = False
+            await asyncio.sleep(self.refresh_delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Facet count refresh failed: {str(e)}")
+
+    async def refresh(self) -> Counts:
+        """Recount every facet and category.product_count from the products collection."""
+        counts = await self.all_counts()
+        pairs = [(dimension, value, count) for dimension, values in counts.items() for value, count in values.items()]
+        if pairs:
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": f"{dimension}:{value}"},
+                    {"$set": {"dimension": dimension, "value": value, "count": count}},
+                    upsert=True,
+                )
+                for dimension, value, count in pairs
+            ], ordered=False)
+        current = [f"{dimension}:{value}" for dimension, value, _ in pairs]
+        await self.collection.update_many({"_id": {"$nin": current}}, {"$set": {"count": 0}})
+
+        category_counts = counts.get("category", {})
+        async for category in self.categories.find({}, {"_id": 0, "name": 1, "product_count": 1}):
+            count = category_counts.get(category["name"], 0)
+            if category.get("product_count") != count:
+                await self.categories.update_one({"name": category["name"]}, {"$set": {"product_count": count}})
+        if self.on_refreshed:
+            await self.on_refreshed()
+        return counts
+
+    async def ensure_initialized(self) -> None:
+        if not await self.collection.find_one({}, {"_id": 1}):
+            await self.refresh()
+
+    async def shutdown(self) -> None:
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
@@ -0,0 +1,41 @@
+"""Production server: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py server:app
+
+Each worker is a separate process with its own event loop, Mongo pool and
+caches. They share nothing but MongoDB, so throughput grows with the number
+of workers until the database or the CPUs run out. Background jobs run in
+one worker at a time (see ``runtime.LeaderJob``). Set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory so ``/api/metrics``
+aggregates every worker.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers import the app themselves: no Mongo client or thread pool is shared across fork
+preload_app = False
+
+# On SIGTERM workers stop accepting, finish in-flight requests, then run the
+# lifespan shutdown (lease hand-over, outbox drain); keep this above DRAIN_TIMEOUT_SECONDS
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+# Recycle workers now and then so slow leaks can't accumulate; jittered so they don't restart together
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    # The app sizes per-process caches from WEB_CONCURRENCY (default 1); pass on the real count,
+    # including a --workers given on the command line
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,342 @@
+"""Image proxy: resized, re-encoded product images served from a disk cache.
+
+``ImageProxy.variant(url, width, format)`` returns a local file for a remote
+image at one of the responsive ``WIDTHS``, encoded as WebP, AVIF or JPEG:
+
+* Each original is downloaded once (concurrent requests for the same URL
+  share the download) and stored under the SHA-256 of its bytes, so
+  identical images behind different URLs are kept once. Source URLs are
+  treated as immutable, like the supplier CDNs publish them.
+* Variants are named ``<digest>-<width>.<format>`` and rendered in a
+  process pool, so resizing and AVIF encoding don't block the event loop
+  or hold the GIL.
+* Everything lives in a ``DiskCache`` that evicts the least recently used
+  files once it grows past ``max_bytes``. Because files are named after
+  their content, responses can be served with ``immutable`` caching.
+
+Only hosts in ``allowed_hosts`` are fetched, so the endpoint can't be
+used to reach arbitrary URLs. Redirects are followed by hand, at most
+``MAX_REDIRECTS`` of them, and every ``Location`` is checked against the
+same list, so an allowed host can't bounce a request to an internal one. ``prewarm`` renders the common sizes in the
+background when products are created or their images change.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 960, 1280, 1920)
+PREWARM_WIDTHS = (320, 640, 1280)
+FORMATS = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+QUALITY = {"webp": 80, "avif": 55, "jpeg": 82}
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+
+class ImageProxyError(Exception):
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def snap_width(width: Optional[int]) -> int:
+    """Round a requested width up to the next responsive size, bounding the number of variants."""
+    if not width:
+        return WIDTHS[-1]
+    return next((size for size in WIDTHS if size >= width), WIDTHS[-1])
+
+
+def negotiate(format: str, accept: str, avif: bool) -> str:
+    """Pick the output format: an explicit one, or the best the client accepts for ``auto``."""
+    if format != "auto":
+        if format not in FORMATS or (format == "avif" and not avif):
+            raise ImageProxyError(f"Unsupported format {format!r}", 400)
+        return format
+    if avif and "image/avif" in accept:
+        return "avif"
+    if "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+
+def render_variant(source: str, target: str, width: int, format: str) -> int:
+    """Resize and encode one variant; runs in the process pool. Returns the file size."""
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by a power of two first; a no-op for other formats
+        image.draft(image.mode, (width, 1))
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if format == "jpeg" or image.mode not in ("RGB", "RGBA"):
+            has_alpha = format != "jpeg" and ("A" in image.getbands() or "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        options = {"quality": QUALITY[format]}
+        if format == "webp":
+            options["method"] = 4
+        elif format == "jpeg":
+            options.update(optimize=True, progressive=True)
+        temporary = f"{target}.{os.getpid()}.tmp"
+        image.save(temporary, format=format.upper(), **options)
+    os.replace(temporary, target)
+    return os.path.getsize(target)
+
+
+class DiskCache:
+    """Files under ``root`` keyed by name, evicted least recently used first past ``max_bytes``.
+
+    Recency is kept in memory and mirrored to file mtimes, so the order
+    survives restarts. Workers sharing the directory evict independently; a
+    file another worker removed is simply a miss.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._loaded = False
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.size += size
+        self._loaded = True
+        self._evict()
+
+    def get(self, key: str) -> Optional[Path]:
+        if key not in self._entries:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.size -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def add(self, key: str, size: int) -> None:
+        self.size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.path(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"files": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class ImageProxy:
+    def __init__(
+        self,
+        cache_dir: str,
+        allowed_hosts: Iterable[str],
+        max_bytes: int = 2 * 1024 ** 3,
+        workers: int = 2,
+        max_source_bytes: int = 20 * 1024 * 1024,
+        timeout: float = 20.0,
+        prewarm_formats: Iterable[str] = ("webp", "avif"),
+        prewarm_concurrency: int = 2,
+    ):
+        self.root = Path(cache_dir)
+        self.cache = DiskCache(str(self.root / "blobs"), max_bytes)
+        self.allowed_hosts = {host.strip().lower() for host in allowed_hosts if host.strip()}
+        self.workers = workers
+        self.max_source_bytes = max_source_bytes
+        self.timeout = timeout
+        self.avif = features.check("avif")
+        self.prewarm_formats = [format for format in prewarm_formats if format != "avif" or self.avif]
+        self._urls: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._prewarm_slots = asyncio.Semaphore(prewarm_concurrency)
+        self._prewarm_tasks: set = set()
+        # Created on first use, so importing the module starts nothing
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            return False
+        return any(host == allowed or host.endswith(f".{allowed}") for allowed in self.allowed_hosts)
+
+    async def _once(self, key: str, load: Callable[[], Awaitable]):
+        """Share one in-flight ``load`` between every caller asking for ``key``."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(load())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    # ----- originals -----
+
+    def _url_index(self, url: str) -> Path:
+        return self.root / "urls" / hashlib.sha256(url.encode()).hexdigest()
+
+    def _known_digest(self, url: str) -> Optional[str]:
+        if url not in self._urls:
+            try:
+                self._urls[url] = self._url_index(url).read_text()
+            except FileNotFoundError:
+                return None
+        return self._urls[url]
+
+    def _store(self, url: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.cache.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{digest}.{os.getpid()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        index = self._url_index(url)
+        index.parent.mkdir(parents=True, exist_ok=True)
+        index.write_text(digest)
+        return digest
+
+    async def _download(self, url: str) -> str:
+        if self._client is None:
+            # Redirects are followed in the loop below, so each hop passes allowed()
+            self._client = httpx.AsyncClient(timeout=self.timeout, follow_redirects=False)
+        chunks, total, location = [], 0, url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                async with self._client.stream("GET", location) as response:
+                    if response.status_code in REDIRECT_STATUS and "location" in response.headers:
+                        location = str(response.url.join(response.headers["location"]))
+                        if not self.allowed(location):
+                            raise ImageProxyError("Image redirected to a host that is not allowed", 403)
+                        continue
+                    if response.status_code != 200:
+                        raise ImageProxyError(
+                            f"Upstream answered {response.status_code}", 404 if response.status_code == 404 else 502
+                        )
+                    if not response.headers.get("content-type", "").startswith("image/"):
+                        raise ImageProxyError("Upstream did not return an image", 415)
+                    async for chunk in response.aiter_bytes():
+                        total += len(chunk)
+                        if total > self.max_source_bytes:
+                            raise ImageProxyError("Source image too large", 413)
+                        chunks.append(chunk)
+                    break
+            else:
+                raise ImageProxyError("Too many redirects")
+        except httpx.HTTPError as e:
+            raise ImageProxyError(f"Could not fetch image: {type(e).__name__}") from e
+        digest = await asyncio.to_thread(self._store, url, b"".join(chunks))
+        self.cache.add(digest, total)
+        self._urls[url] = digest
+        return digest
+
+    async def original(self, url: str) -> str:
+        """Digest of the original behind ``url``, downloading it if it isn't cached."""
+        if not self.allowed(url):
+            raise ImageProxyError("Image host not allowed", 403)
+        self.cache.load()
+        digest = self._known_digest(url)
+        if digest and self.cache.get(digest):
+            return digest
+        return await self._once(f"url:{url}", lambda: self._download(url))
+
+    # ----- variants -----
+
+    async def _render(self, digest: str, key: str, width: int, format: str) -> Path:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        target = self.cache.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(
+                self._pool, render_variant, str(self.cache.path(digest)), str(target), width, format
+            )
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            raise ImageProxyError(f"Could not convert image: {str(e)}", 415) from e
+        self.cache.add(key, size)
+        return target
+
+    async def variant(self, url: str, width: int, format: str) -> Tuple[Path, str]:
+        """Path of ``url`` rendered at ``width`` as ``format``, and its ETag."""
+        digest = await self.original(url)
+        key = f"{digest}-{width}.{format}"
+        path = self.cache.get(key)
+        if path is None:
+            try:
+                path = await self._once(key, lambda: self._render(digest, key, width, format))
+            except FileNotFoundError:
+                # The original was evicted (possibly by another worker) between lookup and render
+                self._urls.pop(url, None)
+                digest = await self._once(f"url:{url}", lambda: self._download(url))
+                path = await self._once(key, lambda: self._render(digest, key, width, format))
+        return path, f'"{key}"'
+
+    # ----- pre-warming -----
+
+    async def _prewarm(self, url: str) -> None:
+        async with self._prewarm_slots:
+            for width in PREWARM_WIDTHS:
+                for format in self.prewarm_formats:
+                    try:
+                        await self.variant(url, width, format)
+                    except ImageProxyError as e:
+                        logger.warning(f"Could not pre-warm {url}: {str(e)}")
+                        return
+
+    def prewarm(self, urls: Iterable[str]) -> int:
+        """Render the common sizes for ``urls`` in the background; returns how many were queued."""
+        queued = 0
+        for url in dict.fromkeys(urls):
+            if not self.allowed(url):
+                continue
+            task = asyncio.create_task(self._prewarm(url))
+            self._prewarm_tasks.add(task)
+            task.add_done_callback(self._prewarm_tasks.discard)
+            queued += 1
+        return queued
+
+    async def start(self) -> None:
+        # Scanning a large cache directory is slow; keep it off the event loop
+        await asyncio.to_thread(self.cache.load)
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "prewarming": len(self._prewarm_tasks), "avif": self.avif}
+
+    async def shutdown(self) -> None:
+        for task in list(self._prewarm_tasks):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
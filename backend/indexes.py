@@ -0,0 +1,312 @@
+"""MongoDB index declarations, startup reconciliation and the query-plan guard.
+
+Every query the API issues should be served by one of the indexes in
+``INDEXES``. ``ensure_indexes`` runs on startup and brings the database in
+line with the declarations: missing indexes are created, indexes whose key
+or options changed are rebuilt, and matching ones are left alone, so it is
+safe to run on every boot and from every worker.
+
+``QueryPlanGuard`` is for tests and staging (``QUERY_PLAN_GUARD=1``). It
+captures the commands a request sends through a pymongo command listener,
+runs ``explain`` on each of them afterwards and reports any that fell back
+to a collection scan on a collection with at least ``min_docs`` documents.
+Commands are attributed through a context variable, which Motor carries
+into its executor threads, so background tasks (the outbox poller, the
+change-feed follower, the transcript writer) are never charged to a
+request. ``QueryPlanGuardMiddleware`` runs each request, streamed body
+included, inside its own capture and fails it with a 500 on a violation.
+"""
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from pymongo.monitoring import CommandListener
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        # Listing and keyset pagination: sort field plus id as tie-breaker
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("rating", DESCENDING), ("id", DESCENDING)], name="rating_id"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="category_created_at_id"),
+        IndexModel([("category", ASCENDING), ("rating", DESCENDING), ("id", DESCENDING)], name="category_rating_id"),
+        IndexModel([("supplier", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="supplier_created_at_id"),
+        # Supplier sync: upserts by (supplier, supplier_id) and the price check keyset over id
+        IndexModel(
+            [("supplier", ASCENDING), ("supplier_id", ASCENDING)],
+            name="supplier_supplier_id",
+            unique=True,
+            partialFilterExpression={"supplier_id": {"$exists": True}},
+        ),
+        IndexModel([("supplier", ASCENDING), ("id", ASCENDING)], name="supplier_id_keyset"),
+        # Faceted browse filters and sorts
+        IndexModel([("price", DESCENDING), ("id", DESCENDING)], name="price_id"),
+        IndexModel([("tags", ASCENDING)], name="tags"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_email_created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+    ],
+    "order_summaries": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        # A customer's order history, newest first
+        IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_email_created_at_id"),
+    ],
+    "categories": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("slug", ASCENDING)], name="slug"),
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "facet_counts": [
+        IndexModel([("dimension", ASCENDING), ("count", DESCENDING)], name="dimension_count"),
+    ],
+    "chat_messages": [
+        IndexModel([("session_id", ASCENDING), ("created_at", DESCENDING)], name="session_id_created_at"),
+    ],
+    "stock_reservations": [
+        IndexModel([("order_id", ASCENDING)], name="order_id", unique=True),
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+    ],
+    "inventory_ledger": [
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING)], name="product_id_created_at"),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+    ],
+    "product_changes": [
+        IndexModel([("product_id", ASCENDING), ("changed_at", DESCENDING)], name="product_id_changed_at"),
+        # Workers following each other's changes
+        IndexModel([("changed_at", ASCENDING)], name="changed_at"),
+    ],
+    "product_recommendations": [
+        IndexModel([("product_id", ASCENDING)], name="product_id", unique=True),
+    ],
+    "enrichment_jobs": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "sync_runs": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "outbox_events": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+        IndexModel([("status", ASCENDING), ("dead_at", DESCENDING)], name="status_dead_at"),
+        # Delivered events are kept for a week; dead letters have no delivered_at and stay
+        IndexModel([("delivered_at", ASCENDING)], name="delivered_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "cache_entries": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Indexes that were replaced and must be dropped, not just reported as undeclared
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # Unique on supplier_id alone clashed when two suppliers used the same id
+    "products": ["supplier_id"],
+}
+
+# Options that make two indexes with the same key different
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _spec(index: dict) -> tuple:
+    # index_information() gives the key as a list of pairs, IndexModel.document as a SON
+    key = index["key"].items() if isinstance(index["key"], dict) else index["key"]
+    options = tuple((option, index.get(option)) for option in INDEX_OPTIONS if index.get(option) is not None)
+    return tuple((field, int(direction)) for field, direction in key), options
+
+
+async def ensure_indexes(
+    db, indexes: Dict[str, List[IndexModel]] = INDEXES, retired: Dict[str, List[str]] = RETIRED_INDEXES
+) -> Dict[str, dict]:
+    """Create missing indexes, rebuild changed ones and drop retired ones. Returns what was done per collection."""
+    report = {}
+    for collection_name, models in indexes.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        dropped = [name for name in retired.get(collection_name, []) if name in existing]
+        for name in dropped:
+            await collection.drop_index(name)
+            del existing[name]
+        to_create, rebuilt = [], []
+        for model in models:
+            document = model.document
+            current = existing.get(document["name"])
+            if current is None:
+                to_create.append(model)
+            elif _spec(current) != _spec(document):
+                await collection.drop_index(document["name"])
+                to_create.append(model)
+                rebuilt.append(document["name"])
+        declared = {model.document["name"] for model in models}
+        unknown = sorted(name for name in existing if name != "_id_" and name not in declared)
+        try:
+            if to_create:
+                await collection.create_indexes(to_create)
+        except OperationFailure as e:
+            # For example duplicate values under a new unique index; keep booting and say so
+            logger.error(f"Failed to create indexes on {collection_name}: {str(e)}")
+        report[collection_name] = {
+            "created": [model.document["name"] for model in to_create if model.document["name"] not in rebuilt],
+            "rebuilt": rebuilt,
+            "dropped": dropped,
+            "unknown": unknown,
+        }
+        if unknown:
+            logger.warning(f"Undeclared indexes on {collection_name}: {', '.join(unknown)}")
+    return report
+
+
+# ----- query-plan guard -----
+
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Session and cluster bookkeeping that explain must not receive
+COMMAND_METADATA = {"lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime", "$readPreference"}
+
+
+def _is_full_scan_by_design(name: str, command: dict) -> bool:
+    """Unfiltered, unsorted reads (exports, index rebuilds, analytics) are meant to scan."""
+    if name == "find":
+        return not command.get("filter") and not command.get("sort")
+    if name == "count":
+        return not command.get("query")
+    if name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        first = next(iter(pipeline[0]), None)
+        return first not in ("$match", "$sort") or not pipeline[0][first]
+    return False
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        return plan.get("stage") == "COLLSCAN" or any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+
+class _Capture:
+    """Commands sent by one request."""
+
+    def __init__(self):
+        self.commands: List[tuple] = []
+        # Closed when the request ends; tasks it spawned may still run in its context
+        self.open = True
+
+
+class _CaptureListener(CommandListener):
+    def __init__(self, guard: "QueryPlanGuard"):
+        self.guard = guard
+
+    def started(self, event) -> None:
+        capture = self.guard.current.get()
+        if capture is None or not capture.open:
+            return
+        name = event.command_name
+        if name not in EXPLAINABLE or _is_full_scan_by_design(name, event.command):
+            return
+        command = {key: value for key, value in event.command.items() if key not in COMMAND_METADATA}
+        capture.commands.append((event.database_name, name, command))
+
+    def succeeded(self, event) -> None:
+        pass
+
+    def failed(self, event) -> None:
+        pass
+
+
+class QueryPlanGuard:
+    """Flags queries that collection-scan collections of at least ``min_docs`` documents.
+
+    Register ``guard.listener`` on the Mongo client, run each request inside
+    ``capture()`` and pass the capture to ``check`` afterwards (or add
+    ``QueryPlanGuardMiddleware``, which does both). Concurrent requests each
+    get their own capture.
+    """
+
+    def __init__(self, min_docs: int = 1000):
+        self.min_docs = min_docs
+        self.listener = _CaptureListener(self)
+        self.current: ContextVar[Optional[_Capture]] = ContextVar("query_plan_capture", default=None)
+        self.violations: List[dict] = []
+
+    @contextmanager
+    def capture(self) -> Iterator[_Capture]:
+        """Collect the commands sent from this context (and tasks started in it) until exit."""
+        capture = _Capture()
+        token = self.current.set(capture)
+        try:
+            yield capture
+        finally:
+            capture.open = False
+            self.current.reset(token)
+
+    async def check(self, client, route: str, capture: _Capture) -> List[dict]:
+        """Explain the captured commands; returns the violations among them."""
+        found = []
+        for database_name, name, command in capture.commands:
+            database = client[database_name]
+            collection_name = command[name]
+            try:
+                plan = await database.command({"explain": command, "verbosity": "queryPlanner"})
+            except OperationFailure as e:
+                logger.warning(f"Could not explain {name} on {collection_name}: {str(e)}")
+                continue
+            if not _has_collscan(plan):
+                continue
+            size = await database[collection_name].estimated_document_count()
+            if size < self.min_docs:
+                continue
+            violation = {"route": route, "collection": collection_name, "command": name, "documents": size,
+                         "filter": command.get("filter") or command.get("query") or command.get("pipeline")}
+            logger.error(f"COLLSCAN on {collection_name} ({size} docs) from {route}: {violation['filter']}")
+            found.append(violation)
+        self.violations.extend(found)
+        return found
+
+
+class QueryPlanGuardMiddleware:
+    """ASGI middleware running each request under the guard.
+
+    The response, streamed bodies included, is produced inside the request's
+    capture and held back until its commands have been explained, so it can
+    still be replaced by a 500 listing the violations. Test mode only.
+    """
+
+    def __init__(self, app, guard: QueryPlanGuard, client):
+        self.app = app
+        self.guard = guard
+        self.client = client
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        messages = []
+
+        async def hold(message):
+            messages.append(message)
+
+        with self.guard.capture() as capture:
+            await self.app(scope, receive, hold)
+        violations = await self.guard.check(self.client, f"{scope['method']} {scope['path']}", capture)
+        if violations:
+            body = json.dumps({"detail": "Query fell back to a collection scan", "violations": violations}, default=str).encode()
+            messages = [
+                {"type": "http.response.start", "status": 500, "headers": [
+                    (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                ]},
+                {"type": "http.response.body", "body": body},
+            ]
+        for message in messages:
+            await send(message)
@@ -0,0 +1,188 @@
+"""Stock reservations and the inventory ledger.
+
+Checkout reserves stock with conditional atomic decrements
+(``{"id": ..., "stock": {"$gte": qty}}`` + ``$inc``), one per product and
+all issued concurrently. Each decrement is atomic on its own document, so
+there is no read-modify-write race and no global lock. If any product is
+short, the decrements that did succeed are put back and the whole
+reservation fails, which keeps it all-or-nothing across the order's items.
+
+Reservations are kept in ``stock_reservations``. They are committed when
+the order is confirmed, released (stock returned) when it is cancelled,
+even after it was confirmed, and expired by a periodic sweep when a
+checkout is abandoned. Every stock movement is appended to
+``inventory_ledger`` for audit.
+
+While a reservation is held its quantity is also counted in the product's
+``reserved`` field, so a supplier sync can set ``stock`` to the supplier's
+figure minus what open checkouts hold (see ``sync.SupplierSync``) without
+handing those units out again.
+"""
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from changes import ChangeFeed, ProductChange
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStockError(Exception):
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Insufficient stock for: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+
+class UnknownProductError(Exception):
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Unknown products: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+
+class Inventory:
+    def __init__(self, db, change_feed: ChangeFeed, reservation_ttl: timedelta = timedelta(hours=24)):
+        self.products = db.products
+        self.reservations = db.stock_reservations
+        self.ledger = db.inventory_ledger
+        self.change_feed = change_feed
+        self.reservation_ttl = reservation_ttl
+
+    @staticmethod
+    def quantities(items: List[dict]) -> Dict[str, int]:
+        """Total quantity per product, merging repeated lines."""
+        totals = Counter()
+        for item in items:
+            totals[item["product_id"]] += int(item["quantity"])
+        return dict(totals)
+
+    async def _adjust(self, product_id: str, delta: int, minimum: Optional[int] = None, reserved: int = 0) -> Optional[dict]:
+        query = {"id": product_id}
+        if minimum is not None:
+            query["stock"] = {"$gte": minimum}
+        increments = {"stock": delta}
+        if reserved:
+            increments["reserved"] = reserved
+        return await self.products.find_one_and_update(
+            query,
+            {"$inc": increments},
+            projection={"_id": 0, "id": 1, "name": 1, "price": 1, "stock": 1, "supplier": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _record(self, order_id: str, reason: str, movements: List[tuple]) -> None:
+        """Append ledger entries and publish stock changes for (product, delta) movements."""
+        now = datetime.now(timezone.utc)
+        await self.ledger.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "product_id": product["id"],
+                "order_id": order_id,
+                "delta": delta,
+                "stock_after": product["stock"],
+                "reason": reason,
+                "created_at": now,
+            }
+            for product, delta in movements
+        ], ordered=False)
+        await self.change_feed.publish([
+            ProductChange(
+                product_id=product["id"],
+                kind="updated",
+                old_price=product.get("price"),
+                new_price=product.get("price"),
+                old_stock=product["stock"] - delta,
+                new_stock=product["stock"],
+                changed_fields=["stock"],
+            )
+            for product, delta in movements
+        ])
+
+    async def reserve(self, order_id: str, items: List[dict]) -> Dict[str, dict]:
+        """Take stock for every item or none. Returns the reserved products (name, price) by id.
+
+        Raises UnknownProductError if any product doesn't exist, else OutOfStockError if any is short."""
+        quantities = self.quantities(items)
+        product_ids = list(quantities)
+        results = await asyncio.gather(*(
+            self._adjust(product_id, -qty, minimum=qty, reserved=qty) for product_id, qty in quantities.items()
+        ))
+        short = [product_id for product_id, product in zip(product_ids, results) if product is None]
+        if short:
+            # Put back what was taken so the reservation is all-or-nothing
+            await asyncio.gather(*(
+                self._adjust(product_id, quantities[product_id], reserved=-quantities[product_id])
+                for product_id, product in zip(product_ids, results) if product is not None
+            ))
+            existing = set(await self.products.distinct("id", {"id": {"$in": short}}))
+            unknown = [product_id for product_id in short if product_id not in existing]
+            if unknown:
+                raise UnknownProductError(unknown)
+            raise OutOfStockError(short)
+
+        now = datetime.now(timezone.utc)
+        await self.reservations.insert_one({
+            "order_id": order_id,
+            "items": [{"product_id": product_id, "quantity": qty} for product_id, qty in quantities.items()],
+            "status": "held",
+            "created_at": now,
+            "expires_at": now + self.reservation_ttl,
+        })
+        await self._record(order_id, "reserve", [
+            (product, -quantities[product["id"]]) for product in results
+        ])
+        return {product["id"]: product for product in results}
+
+    async def commit(self, order_id: str) -> bool:
+        """Make a held reservation permanent (the order went ahead); its stock stays taken."""
+        reservation = await self.reservations.find_one_and_update(
+            {"order_id": order_id, "status": "held"},
+            {"$set": {"status": "committed", "committed_at": datetime.now(timezone.utc)}},
+        )
+        if not reservation:
+            return False
+        await asyncio.gather(*(
+            self._adjust(item["product_id"], 0, reserved=-item["quantity"]) for item in reservation["items"]
+        ))
+        return True
+
+    async def release(self, order_id: str, reason: str, include_committed: bool = False) -> bool:
+        """Return a held reservation's stock, or a committed one's with ``include_committed``
+        (an order cancelled after it was confirmed). Only the first caller wins, so stock is
+        never returned twice."""
+        statuses = ["held", "committed"] if include_committed else ["held"]
+        reservation = await self.reservations.find_one_and_update(
+            {"order_id": order_id, "status": {"$in": statuses}},
+            {"$set": {"status": reason, "released_at": datetime.now(timezone.utc)}},
+        )
+        if not reservation:
+            return False
+        # A committed reservation no longer counts towards reserved
+        held = reservation["status"] == "held"
+        products = await asyncio.gather(*(
+            self._adjust(item["product_id"], item["quantity"], reserved=-item["quantity"] if held else 0)
+            for item in reservation["items"]
+        ))
+        await self._record(order_id, reason, [
+            (product, item["quantity"])
+            for product, item in zip(products, reservation["items"]) if product is not None
+        ])
+        return True
+
+    async def expire_stale(self, limit: int = 500) -> List[str]:
+        """Release held reservations past their expiry. Returns the affected order ids."""
+        stale = await self.reservations.find(
+            {"status": "held", "expires_at": {"$lt": datetime.now(timezone.utc)}},
+            {"_id": 0, "order_id": 1},
+        ).limit(limit).to_list(limit)
+        expired = []
+        for reservation in stale:
+            if await self.release(reservation["order_id"], "expired"):
+                expired.append(reservation["order_id"])
+        if expired:
+            logger.info(f"Expired {len(expired)} abandoned stock reservations")
+        return expired
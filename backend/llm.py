@@ -0,0 +1,251 @@
+"""Shared LLM client used by every AI endpoint.
+
+One ``LLMClient`` is created per process. It bounds the number of
+concurrent model calls, applies a timeout, and caches responses by a
+content hash of (model, system message, prompt) so identical prompts for
+the same product are only paid for once. Identical requests that arrive
+while the first one is still running wait for it instead of calling the
+model again.
+
+The model itself sits behind ``LLMBackend``: ``EmergentLLMBackend`` talks
+to GPT via the Emergent LLM key, ``FakeLLMBackend`` answers locally with
+no network access (development, tests and benchmarks).
+"""
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import time
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from cache import LRUCache, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful AI assistant for LuxDrop.pt, a luxury e-commerce dropshipping platform."
+
+
+class LLMError(Exception):
+    """Raised when the model call fails or times out."""
+
+
+class LLMBackend:
+    provider = "none"
+    model = "none"
+
+    async def complete(self, prompt: str, system_message: str, session_id: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, system_message: str, session_id: str) -> AsyncIterator[str]:
+        """Yield the reply in chunks. Backends without token streaming yield it whole."""
+        yield await self.complete(prompt, system_message, session_id)
+
+    def check(self) -> Optional[str]:
+        """Why the backend can't serve calls (missing key, package), or None. Makes no model call."""
+        return None
+
+
+class EmergentLLMBackend(LLMBackend):
+    def __init__(self, api_key: Optional[str], provider: str = "openai", model: str = "gpt-5"):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+        self._classes = None
+
+    def _load(self):
+        # Imported on first use: the integration pulls in litellm, which takes
+        # seconds to import and would otherwise slow every worker's cold start
+        if self._classes is None:
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+            self._classes = (LlmChat, UserMessage)
+        return self._classes
+
+    async def complete(self, prompt: str, system_message: str, session_id: str) -> str:
+        chat_cls, message_cls = self._load()
+        chat = chat_cls(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system_message
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(message_cls(text=prompt))
+
+    def check(self) -> Optional[str]:
+        if not self.api_key:
+            return "EMERGENT_LLM_KEY is not set"
+        if importlib.util.find_spec("emergentintegrations") is None:
+            return "emergentintegrations is not installed"
+        return None
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic local model for tests and benchmarks."""
+
+    provider = "fake"
+    model = "fake"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, prompt: str, system_message: str, session_id: str) -> str:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        if "comma-separated" in prompt:
+            return f"luxo, premium, elegante, {digest}, luxdrop"
+        return f"Resposta LuxDrop ({digest}): {' '.join(prompt.split()[:40])}"
+
+    async def stream(self, prompt: str, system_message: str, session_id: str) -> AsyncIterator[str]:
+        reply = await self.complete(prompt, system_message, session_id)
+        for i, word in enumerate(reply.split(" ")):
+            if self.delay:
+                await asyncio.sleep(self.delay / 10)
+            yield word if i == 0 else f" {word}"
+
+
+class LLMClient:
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_concurrency: int = 8,
+        timeout: float = 60.0,
+        cache: Optional[ResponseCache] = None,
+        on_call: Optional[Callable[[str, str, str, Optional[str], float, Optional[Exception]], None]] = None,
+    ):
+        self.backend = backend
+        # Called after every model call with (provider, model, prompt, reply, seconds, error)
+        self.on_call = on_call
+        self.timeout = timeout
+        self.cache = cache or ResponseCache(LRUCache(max_entries=1000, ttl=24 * 3600, max_bytes=16 * 1024 * 1024))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Outcome of recent model calls, reported by the readiness check
+        self.consecutive_failures = 0
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[Tuple[float, str]] = None
+
+    def cache_key(self, prompt: str, system_message: str) -> str:
+        digest = hashlib.sha256()
+        for part in (self.backend.provider, self.backend.model, system_message, prompt):
+            digest.update(part.encode())
+            digest.update(b"\x00")
+        return f"llm:{digest.hexdigest()}"
+
+    def _observe(self, prompt: str, system_message: str, reply: Optional[str], started: float, error: Optional[Exception]) -> None:
+        if error is None:
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+        else:
+            self.consecutive_failures += 1
+            self.last_error = (time.time(), str(error))
+        if self.on_call:
+            self.on_call(
+                self.backend.provider, self.backend.model, f"{system_message}\n{prompt}", reply,
+                time.perf_counter() - started, error,
+            )
+
+    async def _call(self, prompt: str, system_message: str, session_id: str) -> str:
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                reply = await asyncio.wait_for(
+                    self.backend.complete(prompt, system_message, session_id), self.timeout
+                )
+            except asyncio.TimeoutError:
+                error = LLMError(f"LLM call timed out after {self.timeout}s")
+                self._observe(prompt, system_message, None, started, error)
+                raise error
+            except LLMError as e:
+                self._observe(prompt, system_message, None, started, e)
+                raise
+            except Exception as e:
+                self._observe(prompt, system_message, None, started, e)
+                raise LLMError(str(e)) from e
+            self._observe(prompt, system_message, reply, started, None)
+            return reply
+
+    async def generate(
+        self,
+        prompt: str,
+        system_message: str = DEFAULT_SYSTEM_MESSAGE,
+        session_id: str = "default",
+        use_cache: bool = True,
+    ) -> str:
+        """Run a prompt through the model. Raises LLMError on failure."""
+        if not use_cache:
+            return await self._call(prompt, system_message, session_id)
+
+        async def load():
+            return (await self._call(prompt, system_message, session_id)).encode()
+
+        entry = await self.cache.get_or_load(self.cache_key(prompt, system_message), load)
+        return entry.body.decode()
+
+    async def stream(
+        self,
+        prompt: str,
+        system_message: str = DEFAULT_SYSTEM_MESSAGE,
+        session_id: str = "default",
+    ) -> AsyncIterator[str]:
+        """Yield reply chunks as the backend produces them. Never cached."""
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            started = time.perf_counter()
+            deadline = loop.time() + self.timeout
+            chunks = self.backend.stream(prompt, system_message, session_id).__aiter__()
+            received = []
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        self._observe(prompt, system_message, "".join(received), started, None)
+                        return
+                    except asyncio.TimeoutError:
+                        error = LLMError(f"LLM call timed out after {self.timeout}s")
+                        self._observe(prompt, system_message, "".join(received), started, error)
+                        raise error
+                    except LLMError as e:
+                        self._observe(prompt, system_message, "".join(received), started, e)
+                        raise
+                    except Exception as e:
+                        self._observe(prompt, system_message, "".join(received), started, e)
+                        raise LLMError(str(e)) from e
+                    received.append(chunk)
+                    yield chunk
+            finally:
+                # Closed early when the caller stops reading (a client that disconnected)
+                if hasattr(chunks, "aclose"):
+                    await chunks.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "backend": f"{self.backend.provider}/{self.backend.model}",
+            "cache": self.cache.stats(),
+        }
+
+    def health(self, failure_threshold: int = 3) -> dict:
+        """Backend configuration and recent call outcomes; never calls the model."""
+        problem = self.backend.check()
+        if problem is None and self.consecutive_failures >= failure_threshold:
+            problem = f"{self.consecutive_failures} consecutive calls failed"
+        health = {
+            "status": "degraded" if problem else "ok",
+            "backend": f"{self.backend.provider}/{self.backend.model}",
+            "consecutive_failures": self.consecutive_failures,
+        }
+        if problem:
+            health["problem"] = problem
+        if self.last_success is not None:
+            health["last_success_seconds_ago"] = round(time.time() - self.last_success, 1)
+        if self.last_error is not None:
+            health["last_error"] = {"seconds_ago": round(time.time() - self.last_error[0], 1), "message": self.last_error[1]}
+        return health
+
+
+def build_backend(name: str, api_key: Optional[str], fake_delay: float = 0.0) -> LLMBackend:
+    if name == "fake":
+        return FakeLLMBackend(delay=fake_delay)
+    if name == "emergent":
+        return EmergentLLMBackend(api_key)
+    raise ValueError(f"Unknown LLM backend: {name}")
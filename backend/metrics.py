@@ -0,0 +1,153 @@
+"""Prometheus metrics for HTTP routes, MongoDB commands and LLM calls.
+
+``MetricsMiddleware`` times every request by route template
+(``/api/products/{product_id}``, not the concrete URL, so label cardinality
+stays bounded) and tracks in-flight requests by method. The template is
+read from the route the router matched (``scope["route"]``) once the
+request is done, so routes aren't matched a second time. ``MongoCommandMetrics`` is a
+pymongo command listener that times each command by name and collection. ``record_llm_call`` is passed to
+``LLMClient`` as its ``on_call`` hook and records call latency, outcome and
+token usage. The backends don't return usage figures, so tokens are counted
+with tiktoken when its encodings are available, or estimated from the
+text length when they aren't.
+
+``render`` produces the Prometheus exposition served by ``/api/metrics``.
+With ``PROMETHEUS_MULTIPROC_DIR`` set, values from all worker processes are
+aggregated.
+"""
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from pymongo.monitoring import CommandListener
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to send the complete response", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_progress", "Requests being handled", ["method"], multiprocess_mode="livesum"
+)
+DB_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip", ["command", "collection"], buckets=DB_BUCKETS
+)
+DB_FAILURES = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ["command", "collection"])
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "LLM call latency", ["provider", "model", "outcome"], buckets=LLM_BUCKETS
+)
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["provider", "model", "kind"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens (counted locally)", ["provider", "model", "direction"])
+
+# Commands that aren't worth a histogram series
+IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "getMore"}
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route, and in-flight count per method."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route(scope) -> str:
+        # Set by the router on the scope it was given once a route matched
+        return getattr(scope.get("route"), "path", None) or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            route = self._route(scope)
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+class MongoCommandMetrics(CommandListener):
+    """Times Motor/pymongo commands by name and collection."""
+
+    def __init__(self):
+        # Collection names by (connection, request id) between started and finished events
+        self._pending = {}
+
+    def _key(self, event) -> Tuple:
+        return event.connection_id, event.request_id
+
+    def started(self, event) -> None:
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        self._pending[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event) -> None:
+        collection = self._pending.pop(self._key(event), None)
+        if collection is not None:
+            DB_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        collection = self._pending.pop(self._key(event), None)
+        if collection is not None:
+            DB_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+            DB_FAILURES.labels(event.command_name, collection).inc()
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, estimating LLM tokens from text length: {str(e)}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def record_llm_call(
+    provider: str, model: str, prompt: str, reply: Optional[str], seconds: float, error: Optional[Exception]
+) -> None:
+    outcome = "error" if error else "ok"
+    LLM_LATENCY.labels(provider, model, outcome).observe(seconds)
+    LLM_TOKENS.labels(provider, model, "prompt").inc(count_tokens(prompt))
+    if reply:
+        LLM_TOKENS.labels(provider, model, "completion").inc(count_tokens(reply))
+    if error:
+        kind = "timeout" if "timed out" in str(error) else type(error.__cause__ or error).__name__
+        LLM_ERRORS.labels(provider, model, kind).inc()
+
+
+def render() -> Tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
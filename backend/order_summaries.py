@@ -0,0 +1,132 @@
+"""Order summaries for the tracking page and a customer's order history.
+
+``order_summaries`` is a read model with one small document per order. It
+holds what a customer sees: status, total, item names and quantities, the
+destination city, and a timeline of status changes. ``create_order`` and
+every status change write it in the same outbox transaction as the order
+itself. Tracking an order is one read by ``id``, and a customer's history
+is one range read on ``(user_email, created_at, id)``. There are no
+customer accounts, so the history is only shown to a caller who gives one
+of the customer's order ids along with the email (``belongs_to``). Neither touches the
+full ``orders`` documents (street address, phone, supplier data), so both
+stay the same size however many orders there are.
+
+Orders placed before the read model existed are backfilled on startup.
+The backfill walks ``orders`` once, saving its position in ``backfills``
+after every batch so an interrupted walk resumes where it stopped. Once it
+reaches the end it is marked done and later startups skip it: every order
+placed since then got its summary when it was written.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from pagination import fetch_page
+
+logger = logging.getLogger(__name__)
+
+# Items shown per order in the history list; the tracking view has them all
+PREVIEW_ITEMS = 3
+BACKFILL_BATCH = 500
+BACKFILL_ID = "order_summaries"
+
+TRACKING_PROJECTION = {"_id": 0, "user_email": 0}
+HISTORY_PROJECTION = {"_id": 0, "user_email": 0, "timeline": 0, "items": {"$slice": PREVIEW_ITEMS}}
+ORDER_FIELDS = {
+    "_id": 0, "id": 1, "user_email": 1, "user_name": 1, "status": 1, "total": 1, "payment_method": 1,
+    "items": 1, "shipping_address.city": 1, "shipping_address.country": 1, "created_at": 1, "updated_at": 1,
+}
+
+
+def summarize(order: dict) -> dict:
+    """The read-model document for an order."""
+    address = order.get("shipping_address") or {}
+    items = [
+        {
+            "product_id": item.get("product_id"),
+            "name": item.get("name"),
+            "quantity": item.get("quantity", 1),
+            "price": item.get("price"),
+        }
+        for item in order.get("items", [])
+    ]
+    status = order.get("status", "pending")
+    created_at = order.get("created_at")
+    updated_at = order.get("updated_at", created_at)
+    timeline = [{"status": "pending", "at": created_at}]
+    if status != "pending":
+        # Older orders only know their current status and when it was last set
+        timeline.append({"status": status, "at": updated_at})
+    return {
+        "id": order["id"],
+        "user_email": order.get("user_email"),
+        "user_name": order.get("user_name"),
+        "status": status,
+        "total": order.get("total"),
+        "payment_method": order.get("payment_method"),
+        "item_count": sum(item["quantity"] for item in items),
+        "items": items,
+        "city": address.get("city"),
+        "country": address.get("country"),
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "timeline": timeline,
+    }
+
+
+class OrderSummaries:
+    def __init__(self, db):
+        self.collection = db.order_summaries
+        self.orders = db.orders
+        self.backfills = db.backfills
+
+    async def add(self, order: dict, session=None) -> None:
+        await self.collection.insert_one(summarize(order), session=session)
+
+    async def record_status(self, order_id: str, status: str, at: datetime, session=None) -> None:
+        """Set the current status and append it to the timeline, unless the order already has it."""
+        await self.collection.update_one(
+            {"id": order_id, "status": {"$ne": status}},
+            {"$set": {"status": status, "updated_at": at}, "$push": {"timeline": {"status": status, "at": at}}},
+            session=session,
+        )
+
+    async def tracking(self, order_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": order_id}, TRACKING_PROJECTION)
+
+    async def belongs_to(self, order_id: str, user_email: str) -> bool:
+        return await self.collection.find_one({"id": order_id, "user_email": user_email}, {"_id": 1}) is not None
+
+    async def history(self, user_email: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """A customer's orders, newest first, with the first few items of each."""
+        return await fetch_page(
+            self.collection, {"user_email": user_email}, "created_at", -1, limit, cursor, projection=HISTORY_PROJECTION
+        )
+
+    async def backfill(self) -> int:
+        """Summarize orders that have no summary yet; returns how many were added."""
+        checkpoint = await self.backfills.find_one({"_id": BACKFILL_ID}) or {}
+        if checkpoint.get("done"):
+            return 0
+        added, last_id = 0, checkpoint.get("last_id", "")
+        while True:
+            batch = await self.orders.find(
+                {"id": {"$gt": last_id}}, ORDER_FIELDS
+            ).sort("id", 1).limit(BACKFILL_BATCH).to_list(BACKFILL_BATCH)
+            if not batch:
+                break
+            result = await self.collection.bulk_write(
+                [UpdateOne({"id": order["id"]}, {"$setOnInsert": summarize(order)}, upsert=True) for order in batch],
+                ordered=False,
+            )
+            added += result.upserted_count
+            last_id = batch[-1]["id"]
+            await self.backfills.update_one({"_id": BACKFILL_ID}, {"$set": {"last_id": last_id}}, upsert=True)
+        await self.backfills.update_one(
+            {"_id": BACKFILL_ID}, {"$set": {"done": True, "finished_at": datetime.now(timezone.utc)}}, upsert=True
+        )
+        if added:
+            logger.info(f"Backfilled {added} order summaries")
+        return added
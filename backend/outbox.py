@@ -0,0 +1,377 @@
+"""Transactional outbox for order side effects.
+
+Checkout and order status changes don't call anything external. The customer
+email, supplier purchase orders and status webhooks are written as
+``outbox_events`` documents in the same Mongo transaction as the order
+write, so a request costs one transaction and an event exists if and only
+if its order change was committed. A standalone server doesn't support
+transactions, so there the events are written right after the order.
+
+A pool of workers claims due events in batches, hands each kind to its
+``Handler`` and records the outcomes with one ``bulk_write``. Failures are
+retried with exponential backoff and jitter. After ``max_attempts``, or on
+a permanent error such as a 4xx, an event is dead-lettered
+(``status: "dead"``) and can be requeued from the admin API. Claims carry a
+lease, so events held by a worker that died are picked up again once the
+lease runs out.
+
+Delivery is therefore at least once. Every event has a unique
+``idempotency_key``, which is also a unique index so the same event can't be
+enqueued twice. It is sent as the ``Idempotency-Key`` header and is the
+source of the email ``Message-ID``, so receivers can drop repeats.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import smtplib
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+MAX_ERROR_LENGTH = 500
+
+
+class PermanentDeliveryError(Exception):
+    """Retrying won't help (rejected payload, unknown event kind); dead-letter right away."""
+
+
+def new_event(kind: str, idempotency_key: str, payload: dict) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "idempotency_key": idempotency_key,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+# ----- handlers -----
+
+class Handler:
+    """Delivers a batch of events of one kind and returns the errors by event id.
+    Events missing from the result were delivered; raising fails the whole batch."""
+
+    async def deliver(self, events: List[dict]) -> Dict[str, Exception]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class LogEmailHandler(Handler):
+    """Logs emails instead of sending them, for environments without SMTP."""
+
+    async def deliver(self, events: List[dict]) -> Dict[str, Exception]:
+        for event in events:
+            logger.info(f"Email to {event['payload']['to']}: {event['payload']['subject']}")
+        return {}
+
+
+class SmtpEmailHandler(Handler):
+    """Sends each batch over a single SMTP connection."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        sender: str = "encomendas@luxdrop.pt",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _message(self, event: dict) -> EmailMessage:
+        payload = event["payload"]
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = payload["to"]
+        message["Subject"] = payload["subject"]
+        digest = hashlib.sha256(event["idempotency_key"].encode()).hexdigest()[:32]
+        message["Message-ID"] = f"<{digest}@{self.sender.rpartition('@')[2] or 'luxdrop.pt'}>"
+        message.set_content(payload["body"])
+        return message
+
+    def _send(self, events: List[dict]) -> Dict[str, Exception]:
+        errors = {}
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            for event in events:
+                try:
+                    smtp.send_message(self._message(event))
+                except smtplib.SMTPRecipientsRefused as e:
+                    errors[event["id"]] = PermanentDeliveryError(str(e))
+                except smtplib.SMTPException as e:
+                    errors[event["id"]] = e
+        return errors
+
+    async def deliver(self, events: List[dict]) -> Dict[str, Exception]:
+        return await asyncio.to_thread(self._send, events)
+
+
+class WebhookHandler(Handler):
+    """POSTs ``payload["body"]`` as JSON to ``payload["url"]``, signed with HMAC-SHA256 when a secret is set."""
+
+    def __init__(self, secret: Optional[str] = None, timeout: float = 10.0, max_connections: int = 20):
+        self.secret = secret
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # Created on first delivery, so importing the app opens no connection pool
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _post(self, event: dict) -> None:
+        body = json.dumps(event["payload"]["body"], default=str).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "Idempotency-Key": event["idempotency_key"],
+            "X-LuxDrop-Event": event["kind"],
+        }
+        if self.secret:
+            signature = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-LuxDrop-Signature"] = f"sha256={signature}"
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        response = await self._client.post(event["payload"]["url"], content=body, headers=headers)
+        if response.status_code >= 400 and response.status_code not in RETRYABLE_STATUS:
+            raise PermanentDeliveryError(f"{response.status_code} from {event['payload']['url']}")
+        response.raise_for_status()
+
+    async def deliver(self, events: List[dict]) -> Dict[str, Exception]:
+        results = await asyncio.gather(*(self._post(event) for event in events), return_exceptions=True)
+        return {event["id"]: result for event, result in zip(events, results) if isinstance(result, Exception)}
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# ----- outbox -----
+
+class Outbox:
+    def __init__(
+        self,
+        db,
+        client,
+        handlers: Dict[str, Handler],
+        workers: int = 4,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 900.0,
+        lease: float = 120.0,
+        poll_interval: float = 2.0,
+        transactions: Optional[bool] = None,
+    ):
+        self.client = client
+        self.collection = db.outbox_events
+        self.handlers = handlers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        # None: detect at start() whether the deployment supports transactions
+        self.transactions = transactions
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    # ----- enqueueing -----
+
+    async def write(
+        self,
+        operation: Callable[[Optional[object]], Awaitable[T]],
+        events: Callable[[T], List[dict]],
+    ) -> T:
+        """Run ``operation(session)`` and insert ``events(result)`` in one transaction.
+
+        With a replica set this goes through ``with_transaction``, which retries
+        transient transaction errors, so ``operation`` must be safe to re-run.
+        """
+        async def run(session) -> Tuple[T, int]:
+            result = await operation(session)
+            docs = events(result)
+            if docs:
+                await self.collection.insert_many(docs, ordered=False, session=session)
+            return result, len(docs)
+
+        if self.transactions:
+            async with await self.client.start_session() as session:
+                result, queued = await session.with_transaction(run)
+        else:
+            result, queued = await run(None)
+        if queued:
+            self.notify()
+        return result
+
+    def notify(self) -> None:
+        """Wake idle workers now rather than at their next poll."""
+        self._wake.set()
+
+    # ----- delivery -----
+
+    def _due(self, now: datetime) -> dict:
+        return {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "processing", "locked_until": {"$lte": now}},
+        ]}
+
+    async def _claim(self) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        due = self._due(now)
+        ids = [
+            doc["id"]
+            async for doc in self.collection.find(due, {"_id": 0, "id": 1}).sort("available_at", 1).limit(self.batch_size)
+        ]
+        if not ids:
+            return []
+        # The due condition is re-checked per document, so concurrent workers never share an event
+        claim = str(uuid.uuid4())
+        await self.collection.update_many(
+            {"id": {"$in": ids}, **due},
+            {"$set": {"status": "processing", "claim": claim, "locked_until": now + self.lease}},
+        )
+        return await self.collection.find({"id": {"$in": ids}, "claim": claim}, {"_id": 0}).to_list(None)
+
+    async def _deliver_kind(self, kind: str, events: List[dict]) -> Dict[str, Exception]:
+        handler = self.handlers.get(kind)
+        if handler is None:
+            return {event["id"]: PermanentDeliveryError(f"No handler for {kind!r} events") for event in events}
+        try:
+            return await handler.deliver(events)
+        except Exception as e:
+            return {event["id"]: e for event in events}
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    async def _process(self, batch: List[dict]) -> None:
+        by_kind = defaultdict(list)
+        for event in batch:
+            by_kind[event["kind"]].append(event)
+        errors = {}
+        for result in await asyncio.gather(*(self._deliver_kind(kind, events) for kind, events in by_kind.items())):
+            errors.update(result)
+
+        now = datetime.now(timezone.utc)
+        operations = []
+        for event in batch:
+            attempts = event["attempts"] + 1
+            error = errors.get(event["id"])
+            if error is None:
+                update = {"status": "delivered", "delivered_at": now}
+            else:
+                update = {"last_error": f"{type(error).__name__}: {error}"[:MAX_ERROR_LENGTH]}
+                if attempts >= self.max_attempts or isinstance(error, PermanentDeliveryError):
+                    update.update(status="dead", dead_at=now)
+                    logger.error(f"Outbox event {event['idempotency_key']} dead-lettered after {attempts} attempts: {error}")
+                else:
+                    update.update(status="pending", available_at=now + timedelta(seconds=self._retry_delay(attempts)))
+            # Matching on the claim keeps a worker whose lease ran out from overwriting the new owner
+            operations.append(UpdateOne(
+                {"id": event["id"], "claim": event["claim"]},
+                {"$set": {**update, "attempts": attempts, "updated_at": now}, "$unset": {"claim": "", "locked_until": ""}},
+            ))
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                batch = await self._claim()
+                if batch:
+                    await self._process(batch)
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox worker failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _supports_transactions(self) -> bool:
+        hello = await self.client.admin.command("hello")
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def start(self) -> None:
+        if self.transactions is None:
+            try:
+                self.transactions = await self._supports_transactions()
+            except Exception as e:
+                logger.warning(f"Could not detect transaction support, writing outbox events separately: {str(e)}")
+                self.transactions = False
+        if not self.transactions:
+            logger.warning("MongoDB transactions unavailable; outbox events are written after the order")
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def shutdown(self, drain_timeout: float = 10.0) -> None:
+        """Let in-flight batches finish (up to ``drain_timeout``), then stop the workers."""
+        self._stopping = True
+        self._wake.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+        for handler in {id(handler): handler for handler in self.handlers.values()}.values():
+            await handler.close()
+
+    # ----- admin -----
+
+    async def stats(self) -> Dict[str, Dict[str, int]]:
+        counts = defaultdict(dict)
+        async for group in self.collection.aggregate([
+            {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "count": {"$sum": 1}}},
+        ]):
+            counts[group["_id"]["kind"]][group["_id"]["status"]] = group["count"]
+        return counts
+
+    async def dead_letters(self, limit: int = 50) -> List[dict]:
+        return await self.collection.find({"status": "dead"}, {"_id": 0}).sort("dead_at", -1).limit(limit).to_list(limit)
+
+    async def requeue_dead(self, event_id: Optional[str] = None) -> int:
+        """Give dead-lettered events (or one of them) a fresh set of attempts."""
+        query = {"status": "dead"}
+        if event_id:
+            query["id"] = event_id
+        result = await self.collection.update_many(query, {
+            "$set": {"status": "pending", "attempts": 0, "available_at": datetime.now(timezone.utc)},
+            "$unset": {"dead_at": ""},
+        })
+        if result.modified_count:
+            self.notify()
+        return result.modified_count
@@ -0,0 +1,97 @@
+"""Keyset (cursor) pagination and NDJSON streaming helpers for listings."""
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+from codec import JSON_OPTIONS
+
+ASCENDING = 1
+DESCENDING = -1
+
+MAX_PAGE_SIZE = 500
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(sort_field: str, doc: dict) -> str:
+    """Build an opaque cursor pointing just after ``doc`` in the listing."""
+    payload = json.dumps([sort_field, _encode_value(doc.get(sort_field)), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = _decode_value(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if field != sort_field:
+        raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+    return value, doc_id
+
+
+def parse_sort(sort: str, order: str, allowed: List[str]) -> Tuple[str, int]:
+    if sort not in allowed:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field, use one of: {', '.join(allowed)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Order must be 'asc' or 'desc'")
+    return sort, ASCENDING if order == "asc" else DESCENDING
+
+
+def keyset_query(query: dict, sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Restrict ``query`` to documents strictly after the cursor position."""
+    if not cursor:
+        return query
+    value, doc_id = decode_cursor(cursor, sort_field)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    after = {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "id": {op: doc_id}},
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+def sort_spec(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    return [(sort_field, direction), ("id", direction)]
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, int]] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents and the cursor for the next one (or None)."""
+    docs = await collection.find(
+        keyset_query(query, sort_field, direction, cursor),
+        projection or {"_id": 0},
+    ).sort(sort_spec(sort_field, direction)).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_field, docs[-1])
+    return docs, next_cursor
+
+
+async def stream_ndjson(cursor) -> AsyncIterator[bytes]:
+    """Yield one JSON line per document as the Motor cursor produces them."""
+    async for doc in cursor:
+        yield orjson.dumps(doc, default=str, option=JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
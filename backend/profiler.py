@@ -0,0 +1,106 @@
+"""On-demand sampling profiler.
+
+``SamplingProfiler.capture`` samples the Python stack of every thread (the
+event loop thread and Motor's executor threads) from a background thread
+at a fixed interval. It returns the stacks in collapsed format, one
+``frame;frame;frame count`` line per distinct stack, which flamegraph.pl,
+speedscope and ``render_svg`` all read. Sampling costs roughly one stack
+walk per thread per interval, and nothing at all when no capture is
+running, which is why it can be enabled in production (``PROFILER_ENABLED=1``).
+"""
+import asyncio
+import html
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    def _sample(self, seconds: float, interval: float) -> Counter:
+        stacks = Counter()
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return stacks
+
+    async def capture(self, seconds: float, interval: float = 0.005) -> Counter:
+        """Sample for ``seconds`` without blocking the event loop. Only one capture runs at a time."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured")
+        try:
+            return await asyncio.to_thread(self._sample, min(seconds, self.max_seconds), interval)
+        finally:
+            self._lock.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def render_svg(stacks: Counter, width: int = 1200, row_height: int = 16, title: str = "LuxDrop.pt profile") -> str:
+    """Render collapsed stacks as a self-contained flame graph (root at the bottom)."""
+    tree: Dict = {}
+    for stack, count in stacks.items():
+        node = tree
+        for frame in stack.split(";"):
+            child = node.setdefault(frame, {"count": 0, "children": {}})
+            child["count"] += count
+            node = child["children"]
+    total = sum(stacks.values()) or 1
+    boxes: List[Tuple[str, int, float, float]] = []  # label, depth, x, width
+
+    def layout(children: Dict, depth: int, x: float) -> int:
+        deepest = depth
+        for label, child in sorted(children.items()):
+            box_width = child["count"] / total * width
+            boxes.append((label, depth, x, box_width))
+            deepest = max(deepest, layout(child["children"], depth + 1, x))
+            x += box_width
+        return deepest
+
+    depth = layout(tree, 0, 0.0) + 1
+    height = (depth + 2) * row_height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="{row_height - 4}">{html.escape(title)} ({total} samples)</text>',
+    ]
+    for label, level, x, box_width in boxes:
+        if box_width < 0.5:
+            continue
+        y = height - (level + 1) * row_height
+        samples = round(box_width / width * total)
+        hue = 10 + hash(label) % 50
+        text = html.escape(label[: int(box_width / 7)]) if box_width > 21 else ""
+        parts.append(
+            f'<g><title>{html.escape(label)} ({samples} samples, {box_width / width:.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{box_width:.1f}" height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{text}</text></g>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
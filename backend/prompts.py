@@ -0,0 +1,61 @@
+"""Prompt templates shared by the AI endpoints, the chatbot and the batch enrichment job."""
+from typing import List, Optional
+
+CHATBOT_SYSTEM_MESSAGE = """You are a helpful customer support assistant for LuxDrop.pt, a luxury dropshipping e-commerce platform.
+
+    Answer questions about:
+    - Delivery times (typically 7-14 days for Portugal, 10-21 days for Europe)
+    - Returns policy (30 days money-back guarantee)
+    - Payment methods (Stripe, PayPal, MB Way, Credit Cards)
+    - Product quality and authenticity
+    - Order tracking
+    - Shipping costs (Free shipping on orders over €50)
+
+    Be friendly, professional, and concise. If you don't know something, politely suggest contacting support@luxdrop.pt"""
+
+PLATFORM_GUIDES = {
+    "facebook": "Create an engaging Facebook post with emojis, call-to-action, and friendly tone. Max 200 words.",
+    "instagram": "Create an Instagram caption with relevant hashtags, emojis, and trendy language. Max 150 words.",
+    "tiktok": "Create a TikTok video script/caption that's fun, trendy, and encourages engagement. Max 100 words."
+}
+
+
+def description_prompt(product_name: str, category: str, keywords: Optional[List[str]] = None) -> str:
+    keywords_str = ", ".join(keywords) if keywords else ""
+    return f"""Generate a compelling, SEO-optimized product description for an e-commerce luxury dropshipping store.
+
+    Product Name: {product_name}
+    Category: {category}
+    Keywords: {keywords_str}
+
+    Create a description that:
+    - Highlights luxury and quality
+    - Is engaging and persuasive
+    - Includes relevant keywords naturally
+    - Is between 100-150 words
+    - Focuses on benefits and features
+
+    Return only the description text, no additional formatting."""
+
+
+def tags_prompt(product_name: str, category: str) -> str:
+    return f"Generate 5-7 relevant SEO tags for a product called '{product_name}' in category '{category}'. Return only comma-separated tags."
+
+
+def parse_tags(response: str) -> List[str]:
+    return [tag.strip() for tag in response.split(",") if tag.strip()]
+
+
+def social_post_prompt(product_name: str, price: float, description: str, platform: str) -> str:
+    guide = PLATFORM_GUIDES.get(platform, PLATFORM_GUIDES["facebook"])
+    return f"""Create a social media post for {platform} to promote this product:
+
+    Product: {product_name}
+    Price: €{price}
+    Description: {description}
+
+    Guidelines: {guide}
+
+    Make it compelling, luxury-focused, and include a clear call-to-action to visit LuxDrop.pt
+
+    Return only the post content."""
@@ -0,0 +1,297 @@
+"""Related products and "frequently bought together".
+
+Two signals feed the precomputed ``product_recommendations`` table (one
+document per product, looked up by ``product_id``):
+
+* Co-occurrence. ``C = Bᵀ B`` is built from the binary order × product
+  matrix ``B`` of non-cancelled orders. It is scored as the cosine
+  ``C[i, j] / sqrt(n_i * n_j)``, where ``n_i`` is the number of orders
+  containing product i.
+* Content similarity. This is the cosine between TF-IDF vectors of each
+  product's name and description tokens (``search.tokenize``), its tags
+  and its category, computed block by block as ``X[block] @ Xᵀ``.
+
+Only one worker maintains the table (the holder of the recommendations
+lease, see ``runtime.LeaderJob``), running ``Recommender.run``. It polls
+for orders created since its last pass, whichever worker took them, adds
+their item pairs to ``C`` as one sparse delta and re-ranks and rewrites
+only the rows they touch. Catalog edits change the vocabulary and IDF
+weights, so they schedule a debounced full rebuild instead, and a
+periodic full rebuild picks up cancellations.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+from scipy import sparse
+
+from search import tokenize
+
+logger = logging.getLogger(__name__)
+
+CONTENT_FIELDS = {"name", "description", "tags", "category"}
+# Relative weight of each feature family in the content vectors
+TAG_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.5
+# Dense similarity block budget (rows x catalog size) for the content pass
+BLOCK_ELEMENTS = 4_000_000
+# Orders are polled by created_at, which is stamped before the insert commits;
+# re-reading this much history catches orders that land slightly out of order
+ORDER_OVERLAP = timedelta(seconds=60)
+ORDER_FIELDS = {"_id": 0, "id": 1, "items.product_id": 1, "status": 1, "created_at": 1}
+WRITE_BATCH = 1000
+
+
+def _top_k(indices: np.ndarray, scores: np.ndarray, k: int, exclude: int) -> List[Tuple[int, float]]:
+    keep = (indices != exclude) & (scores > 0)
+    indices, scores = indices[keep], scores[keep]
+    if len(scores) > k:
+        part = np.argpartition(-scores, k)[:k]
+        indices, scores = indices[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(indices[i]), float(scores[i])) for i in order]
+
+
+def content_matrix(products: Sequence[dict]) -> sparse.csr_matrix:
+    """Row-normalized TF-IDF matrix over text tokens, tags and category."""
+    vocabulary: Dict[str, int] = {}
+    rows, cols, values = [], [], []
+    for row, product in enumerate(products):
+        features = Counter(tokenize(f"{product.get('name', '')} {product.get('description', '')}"))
+        for tag in product.get("tags") or []:
+            features[f"tag:{tag.casefold()}"] += TAG_WEIGHT
+        if product.get("category"):
+            features[f"category:{product['category']}"] += CATEGORY_WEIGHT
+        for feature, weight in features.items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(feature, len(vocabulary)))
+            values.append(weight)
+    shape = (len(products), max(len(vocabulary), 1))
+    matrix = sparse.csr_matrix((np.array(values, dtype=np.float32), (rows, cols)), shape=shape)
+    document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+    idf = np.log((1 + shape[0]) / (1 + document_frequency)).astype(np.float32) + 1
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def content_neighbours(matrix: sparse.csr_matrix, k: int) -> List[List[Tuple[int, float]]]:
+    count = matrix.shape[0]
+    if count == 0:
+        return []
+    block = max(1, BLOCK_ELEMENTS // count)
+    transposed = matrix.T.tocsc()
+    all_indices = np.arange(count)
+    neighbours = []
+    for start in range(0, count, block):
+        similarities = (matrix[start:start + block] @ transposed).toarray()
+        for offset, row in enumerate(similarities):
+            neighbours.append(_top_k(all_indices, row, k, exclude=start + offset))
+    return neighbours
+
+
+class Recommender:
+    def __init__(self, db, top_k: int = 8, rebuild_delay: float = 30.0):
+        self.products = db.products
+        self.orders = db.orders
+        self.table = db.product_recommendations
+        self.top_k = top_k
+        self.rebuild_delay = rebuild_delay
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._cooccurrence = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self._order_counts = np.zeros(0, dtype=np.float32)
+        # Newest order created_at applied so far, and the ids applied within the overlap window
+        self._watermark: Optional[datetime] = None
+        self._seen: Dict[str, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._dirty = False
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # True while this worker runs the maintenance loop
+        self.active = False
+
+    # ----- scoring -----
+
+    def _bought_together(self, row: int) -> List[Tuple[int, float]]:
+        start, end = self._cooccurrence.indptr[row], self._cooccurrence.indptr[row + 1]
+        indices = self._cooccurrence.indices[start:end]
+        counts = self._cooccurrence.data[start:end]
+        scores = counts / np.sqrt(self._order_counts[row] * self._order_counts[indices])
+        return _top_k(indices, scores, self.top_k, exclude=row)
+
+    def _order_matrix(self, baskets: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        rows, cols = [], []
+        for row, basket in enumerate(baskets):
+            for product_id in set(basket):
+                index = self._index.get(product_id)
+                if index is not None:
+                    rows.append(row)
+                    cols.append(index)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(baskets), len(self._ids)))
+
+    def _apply_baskets(self, baskets: Sequence[Sequence[str]]) -> np.ndarray:
+        """Add baskets to the co-occurrence matrix; returns the rows that changed."""
+        orders = self._order_matrix(baskets)
+        self._order_counts = self._order_counts + np.asarray(orders.sum(axis=0)).ravel()
+        delta = (orders.T @ orders).tocsr()
+        delta.setdiag(0)
+        delta.eliminate_zeros()
+        self._cooccurrence = (self._cooccurrence + delta).tocsr()
+        return np.unique(orders.indices)
+
+    def _compute(self, products: List[dict], baskets: List[List[str]]) -> List[dict]:
+        """Full rebuild, run in a worker thread."""
+        self._ids = [product["id"] for product in products]
+        self._index = {product_id: i for i, product_id in enumerate(self._ids)}
+        count = len(self._ids)
+        self._cooccurrence = sparse.csr_matrix((count, count), dtype=np.float32)
+        self._order_counts = np.zeros(count, dtype=np.float32)
+        if not count:
+            return []
+        self._apply_baskets(baskets)
+        similar = content_neighbours(content_matrix(products), self.top_k)
+        return [self._document(row, similar[row]) for row in range(count)]
+
+    def _document(self, row: int, similar: Optional[List[Tuple[int, float]]] = None) -> dict:
+        bought = self._bought_together(row)
+        doc = {"bought_together": [{"id": self._ids[i], "score": round(score, 4)} for i, score in bought]}
+        if similar is not None:
+            taken = {i for i, _ in bought}
+            doc["similar"] = [{"id": self._ids[i], "score": round(score, 4)} for i, score in similar if i not in taken]
+        return doc
+
+    async def _write(self, docs: Dict[str, dict]) -> None:
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne({"product_id": product_id}, {"$set": {**doc, "updated_at": now}}, upsert=True)
+            for product_id, doc in docs.items()
+        ]
+        for start in range(0, len(operations), WRITE_BATCH):
+            await self.table.bulk_write(operations[start:start + WRITE_BATCH], ordered=False)
+
+    # ----- maintenance -----
+
+    def _track(self, order: dict) -> bool:
+        """Remember an order as applied; False if it already was."""
+        created_at = order.get("created_at")
+        if not isinstance(created_at, datetime) or order["id"] in self._seen:
+            return False
+        self._seen[order["id"]] = created_at
+        self._watermark = max(self._watermark, created_at) if self._watermark else created_at
+        return True
+
+    async def rebuild(self) -> int:
+        """Recompute every product's recommendations from the catalog and order history."""
+        async with self._lock:
+            started = datetime.now(timezone.utc)
+            products = await self.products.find(
+                {}, {"_id": 0, "id": 1, "name": 1, "description": 1, "tags": 1, "category": 1}
+            ).to_list(None)
+            self._seen.clear()
+            self._watermark = None
+            baskets = []
+            async for order in self.orders.find({}, ORDER_FIELDS):
+                self._track(order)
+                if order.get("status") != "cancelled":
+                    baskets.append([item.get("product_id") for item in order.get("items", [])])
+            self._watermark = max(self._watermark or started, started)
+            self._prune_seen()
+            docs = await asyncio.to_thread(self._compute, products, baskets)
+            await self._write({self._ids[row]: doc for row, doc in enumerate(docs)})
+        logger.info(f"Recommendations rebuilt for {len(docs)} products from {len(baskets)} orders")
+        return len(docs)
+
+    def _prune_seen(self) -> None:
+        horizon = self._watermark - ORDER_OVERLAP
+        self._seen = {order_id: at for order_id, at in self._seen.items() if at > horizon}
+
+    async def apply_new_orders(self) -> int:
+        """Add orders created since the last pass to the co-occurrence counts; returns how many."""
+        async with self._lock:
+            if self._watermark is None or not self._ids:
+                return 0
+            baskets = []
+            cursor = self.orders.find({"created_at": {"$gt": self._watermark - ORDER_OVERLAP}}, ORDER_FIELDS)
+            async for order in cursor.sort("created_at", 1):
+                if self._track(order) and order.get("status") != "cancelled":
+                    baskets.append([item.get("product_id") for item in order.get("items", [])])
+            self._prune_seen()
+            if not baskets:
+                return 0
+            touched = self._apply_baskets(baskets)
+            # Re-rank the products whose co-occurrence rows changed, keeping their content neighbours
+            await self._write({self._ids[row]: self._document(row) for row in touched})
+        return len(baskets)
+
+    def schedule_rebuild(self) -> None:
+        if not self.active:
+            return
+        self._dirty = True
+        task = self._tasks.get("rebuild")
+        if task is None or task.done():
+            self._tasks["rebuild"] = asyncio.create_task(self._rebuild_when_quiet())
+
+    async def _rebuild_when_quiet(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            await asyncio.sleep(self.rebuild_delay)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Recommendation rebuild failed: {str(e)}")
+
+    async def run(self, rebuild_interval: float, poll_interval: float) -> None:
+        """Maintenance loop: a full rebuild now and every ``rebuild_interval``, new orders every ``poll_interval``."""
+        loop = asyncio.get_running_loop()
+        self.active = True
+        rebuilt_at = None
+        try:
+            while True:
+                try:
+                    if rebuilt_at is None or loop.time() - rebuilt_at >= rebuild_interval:
+                        rebuilt_at = loop.time()
+                        await self.rebuild()
+                    else:
+                        await self.apply_new_orders()
+                except Exception as e:
+                    logger.error(f"Recommendation refresh failed: {str(e)}")
+                await asyncio.sleep(poll_interval)
+        finally:
+            self.active = False
+            await self.shutdown()
+
+    async def shutdown(self) -> None:
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+    # ----- serving -----
+
+    async def related(self, product_id: str) -> Optional[dict]:
+        """The stored recommendations joined to their products, in one indexed aggregation."""
+        result = await self.table.aggregate([
+            {"$match": {"product_id": product_id}},
+            {"$project": {
+                "bought_together": "$bought_together.id",
+                "similar": "$similar.id",
+                "ids": {"$concatArrays": [
+                    {"$ifNull": ["$bought_together.id", []]}, {"$ifNull": ["$similar.id", []]},
+                ]},
+            }},
+            {"$lookup": {"from": "products", "localField": "ids", "foreignField": "id", "as": "products"}},
+        ]).to_list(1)
+        if not result:
+            return None
+        products = {product["id"]: product for product in result[0]["products"] if product.get("stock", 0) > 0}
+        for product in products.values():
+            product.pop("_id", None)
+        bought = [products[i] for i in result[0].get("bought_together") or [] if i in products]
+        shown = {product["id"] for product in bought}
+        similar = [products[i] for i in result[0].get("similar") or [] if i in products and i not in shown]
+        return {"frequently_bought_together": bought, "similar": similar}
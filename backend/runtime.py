@@ -0,0 +1,257 @@
+"""Process runtime for running the API under several workers.
+
+``MongoConnection`` owns the Motor client. Nothing connects at import:
+``server.py`` builds its services against ``database()`` handles, which
+resolve collections on first use, and the app lifespan calls ``open()``
+on startup and ``close()`` after draining. Pool sizes come from the
+environment (``pool_options``) and apply per worker, so a deployment of
+``WEB_CONCURRENCY`` workers opens up to that many times
+``MONGO_MAX_POOL_SIZE`` connections.
+
+``LeaderLease`` is a lease document in ``leases``: the worker that holds
+an unexpired lease renews it, any other worker may take it over once it
+expires. ``LeaderJob`` runs a background job (supplier syncs, the
+reservation sweeper, recommendation upkeep) only while this worker holds
+its lease, so each runs exactly once across workers and moves to another
+worker within ``ttl`` seconds when its holder dies.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Mapping, Optional
+
+from motor import motor_asyncio
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Environment variable -> (client option, default). Per worker.
+POOL_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", 50),
+    # Kept open while idle, so the first requests after a quiet spell skip the TLS/auth handshake
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", 5),
+    "MONGO_MAX_IDLE_MS": ("maxIdleTimeMS", 60_000),
+    # Fail a request that can't get a connection instead of queueing it indefinitely
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", 5_000),
+    # Readiness checks and requests fail fast when the primary is unreachable
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", 5_000),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", 5_000),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", 2),
+}
+
+
+def pool_options(environ: Mapping[str, str] = os.environ) -> dict:
+    return {option: int(environ.get(name, default)) for name, (option, default) in POOL_SETTINGS.items()}
+
+
+def worker_id() -> str:
+    """Unique per process start: host, pid and a random suffix (pids are reused across restarts)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# ----- lifespan-managed client -----
+
+class CollectionHandle:
+    """Stands in for a Motor collection until the client is open."""
+
+    __slots__ = ("_connection", "_database", "_name", "_generation", "_collection")
+
+    def __init__(self, connection: "MongoConnection", database: str, name: str):
+        self._connection = connection
+        self._database = database
+        self._name = name
+        self._generation = -1
+        self._collection = None
+
+    def _resolve(self):
+        connection = self._connection
+        if self._generation != connection.generation:
+            self._collection = connection.client[self._database][self._name]
+            self._generation = connection.generation
+        return self._collection
+
+    def __getattr__(self, name: str):
+        return getattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        return f"CollectionHandle({self._database}.{self._name})"
+
+
+class DatabaseHandle:
+    """Stands in for a Motor database; ``db.products`` and ``db["products"]`` give collection handles."""
+
+    def __init__(self, connection: "MongoConnection", name: str):
+        self._connection = connection
+        self._collections: Dict[str, CollectionHandle] = {}
+        self.name = name
+
+    def __getitem__(self, name: str) -> CollectionHandle:
+        handle = self._collections.get(name)
+        if handle is None:
+            handle = self._collections[name] = CollectionHandle(self._connection, self.name, name)
+        return handle
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        # Database methods (command, list_collection_names, ...) go to the open client
+        if hasattr(motor_asyncio.AsyncIOMotorDatabase, name):
+            return getattr(self._connection.client[self.name], name)
+        return self[name]
+
+
+class MongoConnection:
+    def __init__(self, url: str, **options):
+        self.url = url
+        self.options = options
+        # Bumped on every open(), so handles drop collections bound to a closed client
+        self.generation = 0
+        self._client: Optional[motor_asyncio.AsyncIOMotorClient] = None
+
+    def open(self) -> motor_asyncio.AsyncIOMotorClient:
+        if self._client is None:
+            # Looked up at call time so tests can swap the client class
+            self._client = motor_asyncio.AsyncIOMotorClient(self.url, **self.options)
+            self.generation += 1
+        return self._client
+
+    @property
+    def client(self) -> motor_asyncio.AsyncIOMotorClient:
+        if self._client is None:
+            raise RuntimeError("MongoDB client is not open; it is opened by the app lifespan")
+        return self._client
+
+    def database(self, name: str) -> DatabaseHandle:
+        return DatabaseHandle(self, name)
+
+    def __getitem__(self, name: str):
+        return self.client[name]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    async def ping(self, timeout: float) -> float:
+        """Round-trip a ping to the deployment; returns milliseconds. Raises on failure or timeout."""
+        started = time.perf_counter()
+        await asyncio.wait_for(self.client.admin.command("ping"), timeout)
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+# ----- leader election -----
+
+class LeaderLease:
+    def __init__(self, collection, name: str, owner: str, ttl: float):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = timedelta(seconds=ttl)
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free or expired, or extend it if we hold it."""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl, "renewed_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The lease exists and another worker holds it
+            self.held = False
+        else:
+            self.held = True
+        return self.held
+
+    async def release(self) -> None:
+        if self.held:
+            self.held = False
+            await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+
+class LeaderJob:
+    """Runs ``job()`` while this worker holds ``lease``, renewing it every ``renew_every`` seconds.
+
+    The job is cancelled if the lease is lost or can't be renewed before it
+    would expire. A job that returns is finished for the life of the worker
+    (one-off work such as migrations); one that raises is started again on
+    the next renewal.
+    """
+
+    def __init__(self, lease: LeaderLease, job: Callable[[], Awaitable[None]], renew_every: float):
+        self.lease = lease
+        self.job = job
+        self.renew_every = renew_every
+        self.finished = False
+        self._loop_task: Optional[asyncio.Task] = None
+        self._job_task: Optional[asyncio.Task] = None
+
+    @property
+    def name(self) -> str:
+        return self.lease.name
+
+    def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def _stop_job(self) -> None:
+        task, self._job_task = self._job_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        renewed_at = None
+        while True:
+            try:
+                held = await self.lease.acquire()
+                renewed_at = loop.time() if held else None
+            except Exception as e:
+                logger.warning(f"Could not renew lease {self.name}: {str(e)}")
+                # Keep going only while the last renewal is certain to still be valid
+                ttl = self.lease.ttl.total_seconds()
+                held = renewed_at is not None and loop.time() - renewed_at < ttl - self.renew_every
+
+            task = self._job_task
+            if task is not None and task.done():
+                self._job_task = None
+                if task.cancelled() or task.exception() is None:
+                    self.finished = True
+                else:
+                    logger.error(f"Leader job {self.name} failed, restarting: {str(task.exception())}")
+            if held and self._job_task is None and not self.finished:
+                logger.info(f"Worker {self.lease.owner} took the {self.name} lease")
+                self._job_task = asyncio.create_task(self.job())
+            elif not held and self._job_task is not None:
+                logger.warning(f"Worker {self.lease.owner} lost the {self.name} lease, stopping the job")
+                await self._stop_job()
+            await asyncio.sleep(self.renew_every)
+
+    async def stop(self) -> None:
+        """Stop the job and hand the lease over right away instead of letting it expire."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+        await self._stop_job()
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.warning(f"Could not release lease {self.name}: {str(e)}")
+
+    def status(self) -> dict:
+        return {
+            "held": self.lease.held,
+            "running": self._job_task is not None and not self._job_task.done(),
+            "finished": self.finished,
+        }
@@ -0,0 +1,42 @@
+import os
+from typing import Dict
+
+from scrapers.aliexpress_scraper import AliExpressScraper
+from scrapers.base_scraper import BaseScraper, HttpSupplierScraper
+from scrapers.rate_limit import TokenBucket
+from scrapers.shein_scraper import SheinScraper
+from scrapers.temu_scraper import TemuScraper
+
+SCRAPER_CLASSES = {
+    "temu": TemuScraper,
+    "shein": SheinScraper,
+    "aliexpress": AliExpressScraper,
+}
+
+
+def build_scrapers() -> Dict[str, BaseScraper]:
+    """Create a scraper for every supplier whose <SUPPLIER>_API_URL is set."""
+    scrapers = {}
+    for supplier, scraper_cls in SCRAPER_CLASSES.items():
+        prefix = supplier.upper()
+        base_url = os.environ.get(f"{prefix}_API_URL")
+        if not base_url:
+            continue
+        scrapers[supplier] = scraper_cls(
+            base_url,
+            api_key=os.environ.get(f"{prefix}_API_KEY"),
+            rate=float(os.environ.get(f"{prefix}_RATE_LIMIT", "5")),
+            max_connections=int(os.environ.get(f"{prefix}_MAX_CONNECTIONS", "10")),
+        )
+    return scrapers
+
+
+__all__ = [
+    "AliExpressScraper",
+    "BaseScraper",
+    "HttpSupplierScraper",
+    "SheinScraper",
+    "TemuScraper",
+    "TokenBucket",
+    "build_scrapers",
+]
@@ -0,0 +1,7 @@
+from scrapers.base_scraper import HttpSupplierScraper
+
+
+class AliExpressScraper(HttpSupplierScraper):
+    """AliExpress catalog, configured through ALIEXPRESS_API_URL / ALIEXPRESS_API_KEY."""
+
+    supplier = "aliexpress"
@@ -0,0 +1,152 @@
+"""Supplier scraper interface and the shared HTTP implementation.
+
+Every supplier is reached through a JSON catalog API (the official partner
+API, or an adapter in front of a scraper) exposing:
+
+    GET {base_url}/products?category=&page=&page_size=
+        -> {"products": [...], "next_page": int | null}
+    GET {base_url}/products/changes?since=&page=&page_size=
+        -> {"products": [...], "next_page": int | null, "cursor": str}
+    GET {base_url}/products/{supplier_id}          -> product (ETag header)
+    GET {base_url}/products/{supplier_id}/stock    -> {"stock": int}
+
+Products use the supplier's ``supplier_id`` and ``version`` plus the
+``Product`` fields (name, description, price, original_price, category,
+images, stock, tags, rating, reviews_count). ``/products/changes`` lists
+products modified after the ``since`` cursor returned by a previous call;
+product details honour ``If-None-Match`` and answer 304 when unchanged.
+``/products/changes`` is optional: a supplier without it (404 or 405) is
+synced with full catalog walks instead.
+"""
+import logging
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from scrapers.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# How a supplier API without an endpoint answers
+UNSUPPORTED_STATUS = {404, 405}
+
+
+class BaseScraper(ABC):
+    supplier: str = ""
+
+    @abstractmethod
+    async def scrape_products(self, category: str, page: int = 1) -> Tuple[List[dict], Optional[int]]:
+        """Return one page of products and the next page number (None when done)."""
+
+    @abstractmethod
+    async def scrape_product_details(self, product_id: str, etag: Optional[str] = None) -> Optional[dict]:
+        """Return the product (with its ``etag``), or None if ``etag`` is still current."""
+
+    async def scrape_changes(self, since: Optional[str], page: int = 1) -> Tuple[List[dict], Optional[int], str]:
+        """Return products changed after ``since``, the next page and the cursor for the next run."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def check_stock(self, product_id: str) -> int:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+class HttpSupplierScraper(BaseScraper):
+    """Talks to a supplier catalog API over a pooled, rate-limited HTTP client."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        rate: float = 5.0,
+        burst: Optional[float] = None,
+        max_connections: int = 10,
+        page_size: int = 100,
+        max_attempts: int = 5,
+        timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.bucket = TokenBucket(rate, burst)
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        # Created on first request: building an SSL context per supplier would slow every worker's startup
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def _get(self, path: str, params: Optional[dict] = None, etag: Optional[str] = None) -> Optional[httpx.Response]:
+        headers = {"If-None-Match": etag} if etag else None
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=0.5, min=0.5, max=30),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True,
+        ):
+            with attempt:
+                await self.bucket.acquire()
+                response = await self.client.get(path, params=params, headers=headers)
+                if response.status_code == 304:
+                    return None
+                response.raise_for_status()
+                return response
+
+    async def scrape_products(self, category: str, page: int = 1) -> Tuple[List[dict], Optional[int]]:
+        params = {"page": page, "page_size": self.page_size}
+        if category and category != "all":
+            params["category"] = category
+        data = (await self._get("/products", params)).json()
+        return data.get("products", []), data.get("next_page")
+
+    async def scrape_changes(self, since: Optional[str], page: int = 1) -> Tuple[List[dict], Optional[int], str]:
+        params = {"page": page, "page_size": self.page_size}
+        if since:
+            params["since"] = since
+        try:
+            response = await self._get("/products/changes", params)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in UNSUPPORTED_STATUS:
+                raise NotImplementedError(f"{self.base_url} has no change listing") from e
+            raise
+        data = response.json()
+        return data.get("products", []), data.get("next_page"), data["cursor"]
+
+    async def scrape_product_details(self, product_id: str, etag: Optional[str] = None) -> Optional[dict]:
+        response = await self._get(f"/products/{product_id}", etag=etag)
+        if response is None:
+            return None
+        product = response.json()
+        product["etag"] = response.headers.get("ETag")
+        return product
+
+    async def check_stock(self, product_id: str) -> int:
+        data = (await self._get(f"/products/{product_id}/stock")).json()
+        return int(data["stock"])
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
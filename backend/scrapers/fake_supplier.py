@@ -0,0 +1,120 @@
+"""Local stand-in for a supplier catalog API, for development and tests.
+
+Serves a deterministic catalog with the API contract described in
+``base_scraper``. Run one per supplier, for example:
+
+    FAKE_SUPPLIER_NAME=temu FAKE_SUPPLIER_PRODUCTS=5000 \
+        uvicorn scrapers.fake_supplier:app --port 9001
+    TEMU_API_URL=http://localhost:9001
+
+Set FAKE_SUPPLIER_FAILURE_RATE (0-1) to make a share of requests answer
+503, which exercises the retry path. Every FAKE_SUPPLIER_CHANGE_SECONDS
+about 5% of the catalog gets a new version with a new price and stock, so
+delta syncs have something to pick up.
+"""
+import os
+import random
+import time
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request, Response
+
+SUPPLIER = os.environ.get("FAKE_SUPPLIER_NAME", "temu")
+PRODUCT_COUNT = int(os.environ.get("FAKE_SUPPLIER_PRODUCTS", "1000"))
+FAILURE_RATE = float(os.environ.get("FAKE_SUPPLIER_FAILURE_RATE", "0"))
+CHANGE_SECONDS = float(os.environ.get("FAKE_SUPPLIER_CHANGE_SECONDS", "60"))
+CHANGE_PERIOD = 20
+
+CATEGORIES = ["Moda Feminina", "Moda Masculina", "Acessórios", "Beleza", "Electrónicos", "Casa & Decoração"]
+NOUNS = ["Relógio", "Bolsa", "Óculos", "Vestido", "Perfume", "Smartwatch", "Casaco", "Velas"]
+ADJECTIVES = ["Luxury", "Premium", "Elegante", "Gold", "Clássico", "Moderno"]
+
+app = FastAPI()
+
+
+def current_epoch() -> int:
+    return int(time.time() // CHANGE_SECONDS)
+
+
+def product_version(index: int, epoch: int) -> int:
+    # Product i changes in every epoch where (i + epoch) is a multiple of CHANGE_PERIOD
+    return epoch - (index + epoch) % CHANGE_PERIOD
+
+
+def make_product(index: int, epoch: Optional[int] = None) -> dict:
+    version = product_version(index, current_epoch() if epoch is None else epoch)
+    rng = random.Random(f"{SUPPLIER}:{index}")
+    versioned = random.Random(f"{SUPPLIER}:{index}:{version}")
+    price = round(versioned.uniform(9.99, 299.99), 2)
+    noun = rng.choice(NOUNS)
+    return {
+        "supplier_id": f"{SUPPLIER}-{index}",
+        "version": str(version),
+        "name": f"{noun} {rng.choice(ADJECTIVES)} {index}",
+        "description": f"{noun} de alta qualidade do fornecedor {SUPPLIER}.",
+        "price": price,
+        "original_price": round(price * versioned.uniform(1.2, 2.0), 2),
+        "category": rng.choice(CATEGORIES),
+        "images": [f"https://images.example.com/{SUPPLIER}/{index}.jpg"],
+        "stock": versioned.randint(0, 200),
+        "tags": [noun.lower(), SUPPLIER],
+        "rating": round(rng.uniform(3.5, 5.0), 1),
+        "reviews_count": rng.randint(0, 500),
+    }
+
+
+def maybe_fail() -> None:
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated supplier outage")
+
+
+def parse_index(supplier_id: str) -> int:
+    prefix = f"{SUPPLIER}-"
+    if not supplier_id.startswith(prefix) or not supplier_id[len(prefix):].isdigit():
+        raise HTTPException(status_code=404, detail="Product not found")
+    index = int(supplier_id[len(prefix):])
+    if index >= PRODUCT_COUNT:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return index
+
+
+@app.get("/products")
+async def list_products(page: int = 1, page_size: int = 100, category: Optional[str] = None):
+    maybe_fail()
+    start = (page - 1) * page_size
+    products = [make_product(i) for i in range(start, min(start + page_size, PRODUCT_COUNT))]
+    if category:
+        products = [p for p in products if p["category"] == category]
+    next_page = page + 1 if start + page_size < PRODUCT_COUNT else None
+    return {"products": products, "next_page": next_page}
+
+
+@app.get("/products/changes")
+async def list_changes(since: Optional[str] = None, page: int = 1, page_size: int = 100):
+    maybe_fail()
+    epoch = current_epoch()
+    changed = [
+        i for i in range(PRODUCT_COUNT)
+        if since is None or product_version(i, epoch) > int(since)
+    ]
+    start = (page - 1) * page_size
+    products = [make_product(i, epoch) for i in changed[start:start + page_size]]
+    next_page = page + 1 if start + page_size < len(changed) else None
+    return {"products": products, "next_page": next_page, "cursor": str(epoch)}
+
+
+@app.get("/products/{supplier_id}")
+async def product_details(supplier_id: str, request: Request, response: Response):
+    maybe_fail()
+    product = make_product(parse_index(supplier_id))
+    etag = f'"{product["version"]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return product
+
+
+@app.get("/products/{supplier_id}/stock")
+async def product_stock(supplier_id: str):
+    maybe_fail()
+    return {"stock": make_product(parse_index(supplier_id))["stock"]}
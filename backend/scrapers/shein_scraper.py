@@ -0,0 +1,7 @@
+from scrapers.base_scraper import HttpSupplierScraper
+
+
+class SheinScraper(HttpSupplierScraper):
+    """Shein catalog, configured through SHEIN_API_URL / SHEIN_API_KEY."""
+
+    supplier = "shein"
@@ -0,0 +1,7 @@
+from scrapers.base_scraper import HttpSupplierScraper
+
+
+class TemuScraper(HttpSupplierScraper):
+    """Temu catalog, configured through TEMU_API_URL / TEMU_API_KEY."""
+
+    supplier = "temu"
@@ -0,0 +1,213 @@
+"""In-memory full-text search over the product catalog.
+
+Replaces the unanchored ``$regex`` scan in ``get_products`` with an inverted
+index that is built once at startup and kept up to date as products are
+written. Scoring is BM25 over a few weighted fields; the last query term is
+also matched as a prefix (search-as-you-type) and terms that match nothing
+fall back to trigram similarity so small typos still find results.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Field weights used when computing term frequencies (a light BM25F)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.0,
+    "category": 1.5,
+    "description": 1.0,
+}
+
+STOPWORDS = {
+    "a", "as", "o", "os", "e", "de", "da", "das", "do", "dos", "em", "na", "nas",
+    "no", "nos", "um", "uma", "com", "para", "por", "ao", "que", "the", "and", "of",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents ("Relógio" -> "relogio")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.casefold()
+
+
+def _stem(token: str) -> str:
+    # Very light Portuguese plural folding so "velas" matches "vela"
+    if len(token) > 4 and token.endswith(("oes", "aes")):
+        return token[:-3] + "ao"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized, stemmed search terms."""
+    return [
+        _stem(tok)
+        for tok in _TOKEN_RE.findall(normalize(text))
+        if tok not in STOPWORDS and (len(tok) > 1 or tok.isdigit())
+    ]
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """Inverted index with BM25 ranking, prefix and trigram lookup."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_expansions: int = 50):
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._total_len = 0.0
+        self._terms: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    # ----- indexing -----
+
+    def add(self, product: dict) -> None:
+        """Index (or re-index) a product document."""
+        doc_id = product["id"]
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+
+        weighted: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field) or ""
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            for term in tokenize(value):
+                weighted[term] += weight
+
+        for term, tf in weighted.items():
+            if term not in self._postings:
+                insort(self._terms, term)
+                for gram in trigrams(term):
+                    self._trigrams[gram].add(term)
+            self._postings[term][doc_id] = tf
+
+        length = sum(weighted.values())
+        self._doc_terms[doc_id] = set(weighted)
+        self._doc_len[doc_id] = length
+        self._meta[doc_id] = (product.get("category", ""), product.get("supplier", ""))
+        self._total_len += length
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                idx = bisect_left(self._terms, term)
+                if idx < len(self._terms) and self._terms[idx] == term:
+                    self._terms.pop(idx)
+                for gram in trigrams(term):
+                    self._trigrams[gram].discard(term)
+        self._total_len -= self._doc_len.pop(doc_id)
+        self._meta.pop(doc_id, None)
+
+    async def rebuild(self, collection) -> int:
+        """Rebuild the whole index from a products collection."""
+        self._reset()
+        projection = {"_id": 0, "id": 1, "supplier": 1, **{field: 1 for field in FIELD_WEIGHTS}}
+        async for product in collection.find({}, projection):
+            self.add(product)
+        return len(self)
+
+    # ----- querying -----
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self._terms, prefix)
+        matches = []
+        for term in self._terms[start:start + self.max_expansions]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _fuzzy_terms(self, term: str, threshold: float = 0.45) -> List[str]:
+        grams = trigrams(term)
+        overlap: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+        scored = []
+        for candidate, shared in overlap.items():
+            similarity = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if similarity >= threshold:
+                scored.append((similarity, candidate))
+        return [candidate for _, candidate in heapq.nlargest(self.max_expansions, scored)]
+
+    def _expand(self, term: str, is_last: bool, prefix: bool, fuzzy: bool) -> List[Tuple[str, float]]:
+        """Map a query term to (index term, boost) pairs."""
+        expansions = []
+        if term in self._postings:
+            expansions.append((term, 1.0))
+        if prefix and is_last:
+            expansions.extend((t, 0.7) for t in self._prefix_terms(term) if t != term)
+        if not expansions and fuzzy and len(term) > 2:
+            expansions.extend((t, 0.5) for t in self._fuzzy_terms(term))
+        return expansions
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        supplier: Optional[str] = None,
+        limit: int = 100,
+        prefix: bool = True,
+        fuzzy: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` (product id, score) pairs, best first."""
+        terms = tokenize(query)
+        n_docs = len(self._doc_len)
+        if not terms or not n_docs:
+            return []
+
+        avg_len = self._total_len / n_docs
+        scores: Dict[str, float] = defaultdict(float)
+        for pos, term in enumerate(terms):
+            for index_term, boost in self._expand(term, pos == len(terms) - 1, prefix, fuzzy):
+                postings = self._postings[index_term]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] += boost * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if category or supplier:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if (not category or self._meta[doc_id][0] == category)
+                and (not supplier or self._meta[doc_id][1] == supplier)
+            }
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def search_ids(self, query: str, **kwargs) -> List[str]:
+        return [doc_id for doc_id, _ in self.search(query, **kwargs)]
+
+
+def order_by_ids(docs: Iterable[dict], ids: List[str]) -> List[dict]:
+    """Reorder documents fetched with ``$in`` to follow the ranking in ``ids``."""
+    by_id = {doc["id"]: doc for doc in docs}
+    return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
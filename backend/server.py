@@ -1,32 +1,212 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import tempfile
+from datetime import datetime, timedelta, timezone
+from enum import Enum
 import json
 import asyncio
+from contextlib import aclosing, asynccontextmanager
+from search import ProductSearchIndex, order_by_ids
+from stats import StatsService
+from llm import LLMClient, LLMError, build_backend
+from prompts import CHATBOT_SYSTEM_MESSAGE, description_prompt, parse_tags, social_post_prompt, tags_prompt
+from enrichment import EnrichmentJobs
+from chat import ChatHistory, TranscriptWriter, build_chat_prompt
+from scrapers import build_scrapers
+from sync import RUN_KINDS, SupplierSync
+from changes import ChangeFeed, ProductChange
+from inventory import Inventory, OutOfStockError, UnknownProductError
+from indexes import QueryPlanGuard, QueryPlanGuardMiddleware, ensure_indexes
+from bulk import FORMATS as BULK_FORMATS, ProductImporter, export_csv, export_ndjson, rows_for
+from facets import FacetCounts, browse_query, format_facets
+from metrics import MetricsMiddleware, MongoCommandMetrics, record_llm_call, render as render_metrics
+from profiler import ProfilerBusy, SamplingProfiler, collapsed, render_svg
+from images import CACHE_CONTROL as IMAGE_CACHE_CONTROL, FORMATS as IMAGE_FORMATS, ImageProxy, ImageProxyError, negotiate, snap_width
+from order_summaries import OrderSummaries
+from outbox import LogEmailHandler, Outbox, SmtpEmailHandler, WebhookHandler, new_event
+from recommendations import CONTENT_FIELDS as RECOMMENDATION_FIELDS, Recommender
+from runtime import LeaderJob, LeaderLease, MongoConnection, pool_options, worker_id
+from codec import CLIENT_OPTIONS, dump_rows, dumps, migrate_string_dates, model_defaults, model_projection, utcnow
+from search import FIELD_WEIGHTS as SEARCH_FIELDS
+from cache import LRUCache, LocalCacheBackend, MongoCacheBackend, ResponseCache, cached_response
+from pagination import MAX_PAGE_SIZE, fetch_page, keyset_query, parse_sort, sort_spec, stream_ndjson
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection: the lifespan opens and closes the client, nothing connects at import
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Test mode: explain every query a request runs and fail it on large collection scans
+query_plan_guard = (
+    QueryPlanGuard(min_docs=int(os.environ.get('QUERY_PLAN_GUARD_MIN_DOCS', '1000')))
+    if os.environ.get('QUERY_PLAN_GUARD') == '1' else None
+)
+# Prometheus metrics for routes, Mongo commands and LLM calls (METRICS_ENABLED=0 to turn off)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+command_listeners = [MongoCommandMetrics()] if METRICS_ENABLED else []
+if query_plan_guard:
+    command_listeners.append(query_plan_guard.listener)
+client = MongoConnection(mongo_url, **CLIENT_OPTIONS, **pool_options(), event_listeners=command_listeners)
+db = client.database(os.environ['DB_NAME'])
+
+# Workers per host; several workers coordinate background jobs through leases in db.leases
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+LEASE_TTL_SECONDS = float(os.environ.get('LEASE_TTL_SECONDS', '30'))
+LEASE_RENEW_SECONDS = float(os.environ.get('LEASE_RENEW_SECONDS', '10'))
+JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', '5'))
+CHANGE_FEED_POLL_SECONDS = float(os.environ.get('CHANGE_FEED_POLL_SECONDS', '1'))
+READINESS_TIMEOUT_SECONDS = float(os.environ.get('READINESS_TIMEOUT_SECONDS', '2'))
+DRAIN_TIMEOUT_SECONDS = float(os.environ.get('DRAIN_TIMEOUT_SECONDS', '20'))
 
 # LLM Configuration
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 
+# Product search index (rebuilt on startup, updated on writes)
+search_index = ProductSearchIndex()
+
+# Catalog response cache: in-process LRU in front of an optional shared backend.
+# Writes clear this worker's LRU and the shared backend; other workers drop product
+# entries as the change feed reaches them and everything else (categories) when its
+# local TTL runs out, so with several workers the TTL defaults to a few seconds
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'none')
+if CACHE_BACKEND == 'mongo':
+    shared_cache = MongoCacheBackend(db.cache_entries)
+elif CACHE_BACKEND == 'local':
+    shared_cache = LocalCacheBackend()
+else:
+    shared_cache = None
+catalog_cache = ResponseCache(
+    LRUCache(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', '2048')),
+        ttl=float(os.environ.get('CACHE_TTL_SECONDS', '60' if WEB_CONCURRENCY == 1 else '5')),
+    ),
+    shared=shared_cache,
+    shared_ttl=float(os.environ.get('CACHE_SHARED_TTL_SECONDS', '300')),
+)
+
+# Shared LLM client (bounded concurrency, timeout, prompt-response cache)
+llm_client = LLMClient(
+    build_backend(
+        os.environ.get('LLM_BACKEND', 'emergent'),
+        EMERGENT_LLM_KEY,
+        fake_delay=float(os.environ.get('FAKE_LLM_DELAY_SECONDS', '0')),
+    ),
+    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+    timeout=float(os.environ.get('LLM_TIMEOUT_SECONDS', '60')),
+    cache=ResponseCache(LRUCache(
+        max_entries=int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '1000')),
+        ttl=float(os.environ.get('LLM_CACHE_TTL_SECONDS', str(24 * 3600))),
+        max_bytes=int(os.environ.get('LLM_CACHE_MAX_BYTES', str(16 * 1024 * 1024))),
+    )),
+    on_call=record_llm_call if METRICS_ENABLED else None,
+)
+
+# Chatbot session history window and batched transcript writer
+# (a session's turns can land on any worker, so with several workers history is always read from the db)
+chat_history = ChatHistory(
+    db.chat_messages,
+    window=int(os.environ.get('CHAT_HISTORY_WINDOW', '10')),
+    max_sessions=int(os.environ.get('CHAT_CACHE_SESSIONS', '5000' if WEB_CONCURRENCY == 1 else '0')),
+)
+transcript_writer = TranscriptWriter(
+    db.chat_messages,
+    batch_size=int(os.environ.get('CHAT_WRITE_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('CHAT_WRITE_FLUSH_SECONDS', '1.0')),
+)
+
+# Product change feed: writers publish, search/cache/stats subscribe
+product_changes = ChangeFeed(db.product_changes)
+
+# Pre-aggregated dashboard counters and rollups
+stats_service = StatsService(db, recount_delay=float(os.environ.get('STATS_RECOUNT_SECONDS', '5')))
+
+# Facet counts for catalog browsing, also the source of Category.product_count
+facet_counts = FacetCounts(
+    db,
+    refresh_delay=float(os.environ.get('FACET_REFRESH_SECONDS', '5')),
+    on_refreshed=lambda: catalog_cache.invalidate("categories"),
+)
+
+# Stock reservations for checkout; unpaid pending orders release their stock after the TTL
+inventory = Inventory(
+    db,
+    product_changes,
+    reservation_ttl=timedelta(minutes=int(os.environ.get('RESERVATION_TTL_MINUTES', str(24 * 60)))),
+)
+# Compact per-order read model behind order tracking and customer order history
+order_summaries = OrderSummaries(db)
+RESERVATION_SWEEP_SECONDS = float(os.environ.get('RESERVATION_SWEEP_SECONDS', '60'))
+FREE_SHIPPING_THRESHOLD = 50.0
+SHIPPING_FEE = 5.99
+
+# Precomputed "bought together" and similar products behind /api/products/{id}/related
+recommender = Recommender(
+    db,
+    top_k=int(os.environ.get('RECOMMENDATIONS_TOP_K', '8')),
+    rebuild_delay=float(os.environ.get('RECOMMENDATIONS_REBUILD_DELAY_SECONDS', '30')),
+)
+RECOMMENDATIONS_REBUILD_SECONDS = float(os.environ.get('RECOMMENDATIONS_REBUILD_HOURS', '6')) * 3600
+RECOMMENDATIONS_POLL_SECONDS = float(os.environ.get('RECOMMENDATIONS_POLL_SECONDS', '5'))
+
+# Order side effects (emails, supplier purchase orders, status webhooks) go through the outbox
+email_handler = (
+    SmtpEmailHandler(
+        os.environ['SMTP_HOST'],
+        port=int(os.environ.get('SMTP_PORT', '25')),
+        sender=os.environ.get('SMTP_FROM', 'encomendas@luxdrop.pt'),
+        username=os.environ.get('SMTP_USERNAME'),
+        password=os.environ.get('SMTP_PASSWORD'),
+        starttls=os.environ.get('SMTP_STARTTLS') == '1',
+    )
+    if os.environ.get('SMTP_HOST') else LogEmailHandler()
+)
+webhook_handler = WebhookHandler(secret=os.environ.get('OUTBOX_WEBHOOK_SECRET'))
+OUTBOX_TRANSACTIONS = os.environ.get('OUTBOX_TRANSACTIONS', 'auto')
+outbox = Outbox(
+    db,
+    client,
+    {"order_email": email_handler, "supplier_order": webhook_handler, "status_webhook": webhook_handler},
+    workers=int(os.environ.get('OUTBOX_WORKERS', '4')),
+    batch_size=int(os.environ.get('OUTBOX_BATCH_SIZE', '20')),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8')),
+    base_delay=float(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', '2')),
+    transactions=None if OUTBOX_TRANSACTIONS == 'auto' else OUTBOX_TRANSACTIONS == '1',
+)
+SUPPLIER_ORDER_URL = os.environ.get('SUPPLIER_ORDER_URL')
+ORDER_WEBHOOK_URLS = [url for url in os.environ.get('ORDER_WEBHOOK_URLS', '').split(',') if url]
+
+# Resized/re-encoded product and category images behind /api/images
+image_proxy = ImageProxy(
+    os.environ.get('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'luxdrop-images')),
+    allowed_hosts=os.environ.get(
+        'IMAGE_ALLOWED_HOSTS', 'images.unsplash.com,img.ltwebstatic.com,alicdn.com,kwcdn.com'
+    ).split(','),
+    max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_MB', '2048')) * 1024 * 1024,
+    workers=int(os.environ.get('IMAGE_WORKERS', '2')),
+)
+
+# Opt-in sampling profiler behind /api/admin/profile
+profiler = SamplingProfiler() if os.environ.get('PROFILER_ENABLED') == '1' else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 # =============== MODELS ===============
@@ -73,12 +253,28 @@ class Order(BaseModel):
     user_name: str
     items: List[dict]
     total: float
-    status: str = "pending"  # pending, confirmed, shipped, delivered
+    status: str = "pending"  # pending, confirmed, shipped, delivered, cancelled
     payment_method: str
     shipping_address: dict
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class OrderStatus(str, Enum):
+    pending = "pending"
+    confirmed = "confirmed"
+    shipped = "shipped"
+    delivered = "delivered"
+    cancelled = "cancelled"
+
+# Statuses an order can move to from each status; delivered and cancelled are final
+ORDER_TRANSITIONS = {
+    "pending": {"confirmed", "cancelled"},
+    "confirmed": {"shipped", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
 class OrderCreate(BaseModel):
     user_email: str
     user_name: str
@@ -110,57 +306,266 @@ class SocialPostRequest(BaseModel):
     description: str
     platform: str  # facebook, instagram, tiktok
 
+class EnrichmentRequest(BaseModel):
+    product_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    supplier: Optional[str] = None
+    platforms: List[str] = ["facebook", "instagram", "tiktok"]
+
 # =============== AI FUNCTIONS ===============
 
 async def generate_with_ai(prompt: str, session_id: str = "default") -> str:
     """Generate text using OpenAI GPT-5 via Emergent LLM Key"""
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message="You are a helpful AI assistant for LuxDrop.pt, a luxury e-commerce dropshipping platform."
-        ).with_model("openai", "gpt-5")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        return response
-    except Exception as e:
+        return await llm_client.generate(prompt, session_id=session_id)
+    except LLMError as e:
         logger.error(f"AI generation error: {str(e)}")
         return f"Error generating content: {str(e)}"
 
+# =============== CACHE HELPERS ===============
+
+product_list_adapter = TypeAdapter(List[Product])
+category_list_adapter = TypeAdapter(List[Category])
+
+# Fast path for hot listings: projected documents straight to JSON bytes
+PRODUCT_PROJECTION = model_projection(Product)
+PRODUCT_DEFAULTS = model_defaults(Product)
+ORDER_PROJECTION = model_projection(Order)
+ORDER_DEFAULTS = model_defaults(Order)
+
+async def invalidate_product_cache(*product_ids: str):
+    """Drop cached responses that may contain these products"""
+    await catalog_cache.invalidate(*(f"product:{product_id}" for product_id in product_ids), "products:featured")
+
+# =============== PRODUCT CHANGE SUBSCRIBERS ===============
+
+@product_changes.subscribe(every_worker=True)
+async def refresh_search_and_cache(changes: List[ProductChange]):
+    """Re-index products whose searchable text changed and drop their cached responses"""
+    reindex = []
+    for change in changes:
+        if change.kind == "created":
+            search_index.add(change.product)
+        elif set(change.changed_fields) & {*SEARCH_FIELDS, "supplier"}:
+            reindex.append(change.product_id)
+    if reindex:
+        async for product in db.products.find({"id": {"$in": reindex}}, {"_id": 0}):
+            search_index.add(product)
+    await invalidate_product_cache(*(change.product_id for change in changes))
+
+@product_changes.subscribe
+async def count_products(changes: List[ProductChange]):
+    await stats_service.apply_product_changes(changes)
+
+@product_changes.subscribe
+async def update_facet_counts(changes: List[ProductChange]):
+    if await facet_counts.apply(changes):
+        await catalog_cache.invalidate("categories")
+
+@product_changes.subscribe(every_worker=True)
+async def refresh_recommendations(changes: List[ProductChange]):
+    if any(change.kind == "created" or RECOMMENDATION_FIELDS & set(change.changed_fields) for change in changes):
+        recommender.schedule_rebuild()
+
+@product_changes.subscribe
+async def prewarm_product_images(changes: List[ProductChange]):
+    urls = [url for change in changes if change.kind == "created" for url in change.product.get("images", [])]
+    updated = [change.product_id for change in changes if change.kind != "created" and "images" in change.changed_fields]
+    if updated:
+        async for product in db.products.find({"id": {"$in": updated}}, {"_id": 0, "images": 1}):
+            urls.extend(product.get("images", []))
+    image_proxy.prewarm(urls)
+
+async def publish_enriched_products(product_ids: List[str]):
+    await product_changes.publish([
+        ProductChange(product_id=product_id, kind="updated", changed_fields=["description", "social_posts", "tags"])
+        for product_id in product_ids
+    ])
+
+async def save_chat_turn(request: ChatRequest, response: str):
+    """Remember the turn for the session and queue the transcript for a bulk write"""
+    chat_history.append(request.session_id, request.message, response)
+    chat_doc = ChatMessage(
+        session_id=request.session_id,
+        message=request.message,
+        response=response
+    ).model_dump()
+    await transcript_writer.write(chat_doc)
+
+enrichment_jobs = EnrichmentJobs(
+    db,
+    llm_client,
+    concurrency=int(os.environ.get('ENRICHMENT_CONCURRENCY', '8')),
+    batch_size=int(os.environ.get('ENRICHMENT_BATCH_SIZE', '50')),
+    on_products_updated=publish_enriched_products,
+)
+
+supplier_sync = SupplierSync(
+    db,
+    build_scrapers(),
+    product_changes,
+    batch_size=int(os.environ.get('SYNC_BATCH_SIZE', '200')),
+    details_concurrency=int(os.environ.get('SYNC_DETAILS_CONCURRENCY', '10')),
+)
+
 # =============== ROUTES ===============
 
 @api_router.get("/")
 async def root():
     return {"message": "Welcome to LuxDrop.pt API"}
 
+@api_router.get("/health/live")
+async def liveness():
+    """The worker is up and its event loop answers; no dependency checks"""
+    return {"status": "ok", "worker": worker, "leases": {job.name: job.status() for job in leader_jobs}}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Whether this worker should get traffic: MongoDB must answer a ping,
+    LLM backend problems only mark it degraded (the shop works without AI)"""
+    checks = {"llm": llm_client.health()}
+    try:
+        checks["mongo"] = {"status": "ok", "latency_ms": await client.ping(READINESS_TIMEOUT_SECONDS)}
+    except Exception as e:
+        checks["mongo"] = {"status": "down", "error": str(e) or type(e).__name__}
+    ready = checks["mongo"]["status"] == "ok"
+    status = ("ok" if checks["llm"]["status"] == "ok" else "degraded") if ready else "unavailable"
+    return Response(
+        content=dumps({"status": status, "worker": worker, "checks": checks}),
+        status_code=200 if ready else 503,
+        media_type="application/json",
+    )
+
 # ===== PRODUCTS =====
 
 @api_router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None, search: Optional[str] = None):
+async def get_products(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    supplier: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+):
+    """List products. Pages are chained through the X-Next-Cursor header;
+    format=ndjson streams every matching product instead."""
+    if search:
+        # Search results are ranked by relevance, so there is no keyset to page on or other order to apply
+        if sort or cursor or format == "ndjson":
+            raise HTTPException(status_code=400, detail="search can't be combined with sort, cursor or format=ndjson")
+        ids = search_index.search_ids(search, category=category, supplier=supplier, limit=limit)
+        products = await db.products.find({"id": {"$in": ids}}, PRODUCT_PROJECTION).to_list(len(ids))
+        products = order_by_ids(products, ids)
+        headers = {}
+    else:
+        sort_field, direction = parse_sort(sort or "created_at", order, ["created_at", "rating"])
+        query = {}
+        if category:
+            query["category"] = category
+        if supplier:
+            query["supplier"] = supplier
+        if format == "ndjson":
+            db_cursor = db.products.find(
+                keyset_query(query, sort_field, direction, cursor), PRODUCT_PROJECTION
+            ).sort(sort_spec(sort_field, direction))
+            return StreamingResponse(stream_ndjson(db_cursor), media_type="application/x-ndjson")
+        products, next_cursor = await fetch_page(
+            db.products, query, sort_field, direction, limit, cursor, projection=PRODUCT_PROJECTION
+        )
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    
+    return Response(content=dump_rows(products, PRODUCT_DEFAULTS), media_type="application/json", headers=headers)
+
+@api_router.post("/products/import")
+async def import_products(request: Request, format: Optional[str] = None):
+    """Bulk create or update products from an NDJSON or CSV request body.
+    Rows with an id are upserted; the response lists per-row errors by line."""
+    format = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(BULK_FORMATS)}")
+    importer = ProductImporter(
+        db.products,
+        product_changes,
+        ProductCreate,
+        Product,
+        chunk_size=int(os.environ.get('IMPORT_CHUNK_SIZE', '1000')),
+    )
+    return await importer.run(rows_for(format, request.stream()))
+
+@api_router.get("/products/export")
+async def export_products(format: str = "ndjson", category: Optional[str] = None, supplier: Optional[str] = None):
+    """Stream the catalog as NDJSON or CSV (the import formats)"""
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(BULK_FORMATS)}")
     query = {}
     if category:
         query["category"] = category
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
-    products = await db.products.find(query, {"_id": 0}).to_list(100)
-    for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return products
+    if supplier:
+        query["supplier"] = supplier
+    db_cursor = db.products.find(query, PRODUCT_PROJECTION, batch_size=1000)
+    if format == "csv":
+        body, media_type = export_csv(db_cursor), "text/csv; charset=utf-8"
+    else:
+        body, media_type = export_ndjson(db_cursor), "application/x-ndjson"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+@api_router.get("/products/browse")
+async def browse_products(
+    category: Optional[List[str]] = Query(None),
+    supplier: Optional[List[str]] = Query(None),
+    tags: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    in_stock: Optional[bool] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Filtered product page plus facet counts for every filter dimension, each
+    counted without its own filter. Without filters the counts come from the
+    maintained facet_counts."""
+    sort_field, direction = parse_sort(sort, order, ["created_at", "rating", "price"])
+    query = browse_query(category, supplier, tags, min_price, max_price, min_rating, in_stock)
+    (products, next_cursor), (counts, total) = await asyncio.gather(
+        fetch_page(db.products, query, sort_field, direction, limit, cursor, projection=PRODUCT_PROJECTION),
+        facet_counts.browse_counts(query),
+    )
+    body = {
+        "products": [{**PRODUCT_DEFAULTS, **product} for product in products],
+        "facets": format_facets(counts),
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=dumps(body), media_type="application/json", headers=headers)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return product
+async def get_product(product_id: str, request: Request):
+    async def load():
+        product = await db.products.find_one({"id": product_id}, {"_id": 0})
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return Product(**product).model_dump_json().encode()
+    
+    entry = await catalog_cache.get_or_load(f"product:{product_id}", load)
+    return cached_response(request, entry)
+
+@api_router.get("/products/{product_id}/related")
+async def get_related_products(product_id: str):
+    """Frequently bought together and similar products, from the precomputed table.
+    Empty lists until the first rebuild has covered the product."""
+    related = await recommender.related(product_id) or {"frequently_bought_together": [], "similar": []}
+    body = {
+        key: [{**PRODUCT_DEFAULTS, **{k: v for k, v in product.items() if k in PRODUCT_PROJECTION}} for product in products]
+        for key, products in related.items()
+    }
+    return Response(content=dumps(body), media_type="application/json")
 
 @api_router.post("/products", response_model=Product)
 async def create_product(input: ProductCreate):
@@ -168,83 +573,250 @@ async def create_product(input: ProductCreate):
     product_obj = Product(**product_dict)
     
     doc = product_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.products.insert_one(doc)
+    await product_changes.publish([ProductChange.created(doc)])
     return product_obj
 
 @api_router.get("/products/featured/list", response_model=List[Product])
-async def get_featured_products():
-    products = await db.products.find({}, {"_id": 0}).sort("rating", -1).limit(8).to_list(8)
-    for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
-    return products
+async def get_featured_products(request: Request):
+    async def load():
+        products = await db.products.find({}, {"_id": 0}).sort("rating", -1).limit(8).to_list(8)
+        return product_list_adapter.dump_json(product_list_adapter.validate_python(products))
+    
+    entry = await catalog_cache.get_or_load("products:featured", load)
+    return cached_response(request, entry)
+
+# ===== IMAGES =====
+
+@api_router.get("/images")
+async def get_image(
+    request: Request,
+    url: str,
+    w: Optional[int] = Query(None, ge=1, le=4096),
+    format: str = "auto",
+):
+    """An allowed remote image resized to the next responsive width and re-encoded.
+    format=auto picks AVIF or WebP from the Accept header."""
+    try:
+        output = negotiate(format, request.headers.get("accept", ""), image_proxy.avif)
+        path, etag = await image_proxy.variant(url, snap_width(w), output)
+    except ImageProxyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag}
+    if format == "auto":
+        headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=IMAGE_FORMATS[output], headers=headers)
 
 # ===== CATEGORIES =====
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(50)
-    return categories
+async def get_categories(request: Request):
+    async def load():
+        categories = await db.categories.find({}, {"_id": 0}).to_list(50)
+        return category_list_adapter.dump_json(category_list_adapter.validate_python(categories))
+    
+    entry = await catalog_cache.get_or_load("categories", load)
+    return cached_response(request, entry)
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category: Category):
     doc = category.model_dump()
     await db.categories.insert_one(doc)
+    await catalog_cache.invalidate("categories")
     return category
 
 # ===== ORDERS =====
 
+def order_events(order: dict, products: dict) -> List[dict]:
+    """Outbox events for a new order: the confirmation email and one purchase order per supplier"""
+    lines = "\n".join(f"  {item['quantity']}x {item['name']} - €{item['price'] * item['quantity']:.2f}" for item in order['items'])
+    events = [new_event("order_email", f"order_email:{order['id']}:confirmation", {
+        "to": order['user_email'],
+        "subject": f"LuxDrop.pt - Encomenda #{order['id'][:8]} recebida",
+        "body": (
+            f"Olá {order['user_name']},\n\nRecebemos a sua encomenda #{order['id'][:8]}.\n\n"
+            f"{lines}\n\nTotal: €{order['total']:.2f}\n\nObrigado por comprar na LuxDrop.pt!"
+        ),
+    })]
+    if SUPPLIER_ORDER_URL:
+        by_supplier = {}
+        for item in order['items']:
+            supplier = products[item['product_id']].get('supplier') or 'unknown'
+            by_supplier.setdefault(supplier, []).append(
+                {"product_id": item['product_id'], "name": item['name'], "quantity": item['quantity']}
+            )
+        events.extend(
+            new_event("supplier_order", f"supplier_order:{order['id']}:{supplier}", {"url": SUPPLIER_ORDER_URL, "body": {
+                "order_id": order['id'],
+                "supplier": supplier,
+                "items": items,
+                "customer": order['user_name'],
+                "shipping_address": order['shipping_address'],
+            }})
+            for supplier, items in by_supplier.items()
+        )
+    return events
+
+def status_events(order_id: str, previous: Optional[str], status: str, changed_at: datetime) -> List[dict]:
+    """Outbox events notifying each configured webhook of a status change; none if it didn't change"""
+    if previous == status:
+        return []
+    body = {
+        "event": "order.status_changed",
+        "order_id": order_id,
+        "status": status,
+        "previous_status": previous,
+        "changed_at": changed_at.isoformat(),
+    }
+    return [
+        new_event("status_webhook", f"status_webhook:{order_id}:{status}:{changed_at.isoformat()}:{i}", {"url": url, "body": body})
+        for i, url in enumerate(ORDER_WEBHOOK_URLS)
+    ]
+
 @api_router.post("/orders", response_model=Order)
 async def create_order(input: OrderCreate):
     order_dict = input.model_dump()
+    if not order_dict['items']:
+        raise HTTPException(status_code=400, detail="An order needs at least one item")
+    for item in order_dict['items']:
+        if not item.get('product_id') or not isinstance(item.get('quantity'), int) or item['quantity'] < 1:
+            raise HTTPException(status_code=400, detail="Each item needs a product_id and a positive integer quantity")
     order_obj = Order(**order_dict)
     
+    # Take the stock first; concurrent checkouts can never push it below zero
+    try:
+        reserved = await inventory.reserve(order_obj.id, order_obj.items)
+    except UnknownProductError as e:
+        raise HTTPException(status_code=404, detail={"message": "Product not found", "product_ids": e.product_ids})
+    except OutOfStockError as e:
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock", "product_ids": e.product_ids})
+    
+    # Price from the catalog, not from the client
+    for item in order_obj.items:
+        product = reserved[item['product_id']]
+        item['name'] = product['name']
+        item['price'] = product['price']
+    subtotal = sum(item['price'] * item['quantity'] for item in order_obj.items)
+    shipping = 0.0 if subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_FEE
+    order_obj.total = round(subtotal + shipping, 2)
+    
     doc = order_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
     
-    await db.orders.insert_one(doc)
+    async def insert_order(session):
+        await db.orders.insert_one(doc, session=session)
+        await order_summaries.add(doc, session=session)
     
-    # Send notification email (mocked)
-    logger.info(f"Order notification sent to {order_obj.user_email}")
+    # The order, its summary and its notification/supplier events commit together; delivery happens in the background
+    try:
+        await outbox.write(insert_order, lambda _: order_events(doc, reserved))
+    except Exception:
+        await inventory.release(order_obj.id, "failed")
+        raise
+    await stats_service.record_order(doc)
     
     return order_obj
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(user_email: Optional[str] = None):
+async def get_orders(
+    user_email: Optional[str] = None,
+    order: str = "desc",
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+):
+    """List orders newest first by default. Pages are chained through the
+    X-Next-Cursor header; format=ndjson streams the whole order history."""
+    sort_field, direction = parse_sort("created_at", order, ["created_at"])
     query = {}
     if user_email:
         query["user_email"] = user_email
     
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order.get('updated_at'), str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
-    return orders
+    if format == "ndjson":
+        db_cursor = db.orders.find(
+            keyset_query(query, sort_field, direction, cursor), ORDER_PROJECTION
+        ).sort(sort_spec(sort_field, direction))
+        return StreamingResponse(stream_ndjson(db_cursor), media_type="application/x-ndjson")
+    
+    orders, next_cursor = await fetch_page(
+        db.orders, query, sort_field, direction, limit, cursor, projection=ORDER_PROJECTION
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=dump_rows(orders, ORDER_DEFAULTS), media_type="application/json", headers=headers)
+
+@api_router.get("/orders/history")
+async def get_order_history(
+    user_email: str,
+    order_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """A customer's orders newest first, as compact summaries (status, total,
+    first items). The email alone isn't enough: order_id must be one of the
+    customer's orders. Pages are chained through the X-Next-Cursor header."""
+    if not await order_summaries.belongs_to(order_id, user_email):
+        # Same answer for an unknown order and someone else's, so neither leaks
+        raise HTTPException(status_code=404, detail="Order not found")
+    summaries, next_cursor = await order_summaries.history(user_email, limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=dumps(summaries), media_type="application/json", headers=headers)
+
+@api_router.get("/orders/{order_id}/tracking")
+async def get_order_tracking(order_id: str):
+    """Status, status timeline and item summary of an order, for the tracking page"""
+    summary = await order_summaries.tracking(order_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return Response(content=dumps(summary), media_type="application/json")
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    if isinstance(order.get('created_at'), str):
-        order['created_at'] = datetime.fromisoformat(order['created_at'])
-    if isinstance(order.get('updated_at'), str):
-        order['updated_at'] = datetime.fromisoformat(order['updated_at'])
     return order
 
 @api_router.patch("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str):
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+async def update_order_status(order_id: str, status: OrderStatus):
+    status = status.value
+    now = utcnow()
+    # Matched in the update itself, so concurrent changes can't both pass the check
+    allowed_from = [current for current, targets in ORDER_TRANSITIONS.items() if status in targets]
+    
+    async def set_status(session):
+        previous = await db.orders.find_one_and_update(
+            {"id": order_id, "status": {"$in": allowed_from}},
+            {"$set": {"status": status, "updated_at": now}},
+            projection={"_id": 0, "status": 1, "total": 1, "created_at": 1},
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+        if previous:
+            await order_summaries.record_status(order_id, status, now, session=session)
+        return previous
+    
+    previous = await outbox.write(
+        set_status,
+        lambda previous: status_events(order_id, previous.get("status"), status, now) if previous else [],
     )
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found")
+    if not previous:
+        current = await db.orders.find_one({"id": order_id}, {"_id": 0, "status": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if current.get("status") == status:
+            # A retried update: nothing changed, so no webhooks, stats or stock moves
+            return {"message": "Order status unchanged", "status": status}
+        raise HTTPException(status_code=409, detail=f"An order can't go from {current.get('status')} to {status}")
+    if previous.get("status") == status:
+        return {"message": "Order status unchanged", "status": status}
+    await stats_service.record_status_change(previous.get("status", "pending"), status, previous)
+    if status == "cancelled":
+        # Also returns stock taken by an order that was already confirmed
+        await inventory.release(order_id, "cancelled", include_committed=True)
+    elif status != "pending":
+        await inventory.commit(order_id)
     return {"message": "Order status updated", "status": status}
 
 # ===== AI ENDPOINTS =====
@@ -252,118 +824,209 @@ async def update_order_status(order_id: str, status: str):
 @api_router.post("/ai/generate-description")
 async def generate_description(request: AIGenerateRequest):
     """Generate product description using AI"""
-    keywords_str = ", ".join(request.keywords) if request.keywords else ""
-    prompt = f"""Generate a compelling, SEO-optimized product description for an e-commerce luxury dropshipping store.
-    
-    Product Name: {request.product_name}
-    Category: {request.category}
-    Keywords: {keywords_str}
-    
-    Create a description that:
-    - Highlights luxury and quality
-    - Is engaging and persuasive
-    - Includes relevant keywords naturally
-    - Is between 100-150 words
-    - Focuses on benefits and features
-    
-    Return only the description text, no additional formatting."""
-    
-    description = await generate_with_ai(prompt, session_id="product_gen")
-    
-    # Generate SEO tags
-    tags_prompt = f"Generate 5-7 relevant SEO tags for a product called '{request.product_name}' in category '{request.category}'. Return only comma-separated tags."
-    tags_response = await generate_with_ai(tags_prompt, session_id="tags_gen")
-    tags = [tag.strip() for tag in tags_response.split(",")]
+    description, tags_response = await asyncio.gather(
+        generate_with_ai(description_prompt(request.product_name, request.category, request.keywords), session_id="product_gen"),
+        generate_with_ai(tags_prompt(request.product_name, request.category), session_id="tags_gen")
+    )
     
     return {
         "description": description,
-        "tags": tags
+        "tags": parse_tags(tags_response)
     }
 
 @api_router.post("/ai/chatbot")
 async def chatbot(request: ChatRequest):
     """AI Chatbot for customer support"""
-    system_message = """You are a helpful customer support assistant for LuxDrop.pt, a luxury dropshipping e-commerce platform.
-    
-    Answer questions about:
-    - Delivery times (typically 7-14 days for Portugal, 10-21 days for Europe)
-    - Returns policy (30 days money-back guarantee)
-    - Payment methods (Stripe, PayPal, MB Way, Credit Cards)
-    - Product quality and authenticity
-    - Order tracking
-    - Shipping costs (Free shipping on orders over €50)
-    
-    Be friendly, professional, and concise. If you don't know something, politely suggest contacting support@luxdrop.pt"""
-    
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
+        history = await chat_history.get(request.session_id)
+        # Conversations are stateful, so chatbot replies bypass the response cache
+        response = await llm_client.generate(
+            build_chat_prompt(request.message, history),
+            system_message=CHATBOT_SYSTEM_MESSAGE,
             session_id=request.session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-5")
-        
-        user_message = UserMessage(text=request.message)
-        response = await chat.send_message(user_message)
-        
-        # Save chat to database
-        chat_doc = ChatMessage(
-            session_id=request.session_id,
-            message=request.message,
-            response=response
-        ).model_dump()
-        chat_doc['created_at'] = chat_doc['created_at'].isoformat()
-        await db.chat_messages.insert_one(chat_doc)
+            use_cache=False
+        )
         
+        await save_chat_turn(request, response)
         return {"response": response}
     except Exception as e:
         logger.error(f"Chatbot error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
 
+@api_router.post("/ai/chatbot/stream")
+async def chatbot_stream(request: ChatRequest):
+    """AI Chatbot that streams the reply as server-sent events"""
+    history = await chat_history.get(request.session_id)
+    
+    async def events():
+        chunks = []
+        try:
+            # Closes the LLM stream as soon as the client goes away; the partial reply isn't saved
+            async with aclosing(llm_client.stream(
+                build_chat_prompt(request.message, history),
+                system_message=CHATBOT_SYSTEM_MESSAGE,
+                session_id=request.session_id
+            )) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield f"data: {json.dumps({'token': chunk})}\n\n"
+        except LLMError as e:
+            logger.error(f"Chatbot error: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'detail': f'Chatbot error: {str(e)}'})}\n\n"
+            return
+        await save_chat_turn(request, "".join(chunks))
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/ai/social-post")
 async def generate_social_post(request: SocialPostRequest):
     """Generate social media post using AI"""
-    platform_guides = {
-        "facebook": "Create an engaging Facebook post with emojis, call-to-action, and friendly tone. Max 200 words.",
-        "instagram": "Create an Instagram caption with relevant hashtags, emojis, and trendy language. Max 150 words.",
-        "tiktok": "Create a TikTok video script/caption that's fun, trendy, and encourages engagement. Max 100 words."
-    }
-    
-    guide = platform_guides.get(request.platform, platform_guides["facebook"])
-    
-    prompt = f"""Create a social media post for {request.platform} to promote this product:
-    
-    Product: {request.product_name}
-    Price: €{request.price}
-    Description: {request.description}
-    
-    Guidelines: {guide}
-    
-    Make it compelling, luxury-focused, and include a clear call-to-action to visit LuxDrop.pt
-    
-    Return only the post content."""
-    
+    prompt = social_post_prompt(request.product_name, request.price, request.description, request.platform)
     post = await generate_with_ai(prompt, session_id="social_gen")
     return {"post": post, "platform": request.platform}
 
+@api_router.post("/ai/enrich")
+async def create_enrichment_job(request: EnrichmentRequest):
+    """Start a background job that enriches many products with AI content"""
+    if request.product_ids:
+        product_ids = request.product_ids
+    else:
+        query = {}
+        if request.category:
+            query["category"] = request.category
+        if request.supplier:
+            query["supplier"] = request.supplier
+        if not query:
+            raise HTTPException(status_code=400, detail="Provide product_ids or a category/supplier filter")
+        product_ids = await db.products.distinct("id", query)
+    return await enrichment_jobs.create(product_ids, request.platforms)
+
+@api_router.get("/ai/enrich/{job_id}")
+async def get_enrichment_job(job_id: str):
+    """Get progress of an enrichment job"""
+    job = await enrichment_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Enrichment job not found")
+    return job
+
+@api_router.post("/ai/enrich/{job_id}/resume")
+async def resume_enrichment_job(job_id: str):
+    """Resume an interrupted or failed enrichment job, or retry the products that failed
+    in a completed_with_errors one; products already done are skipped"""
+    job = await enrichment_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Enrichment job not found")
+    if job["status"] == "completed":
+        return job
+    await enrichment_jobs.resume(job_id)
+    return await enrichment_jobs.get(job_id)
+
+# ===== SUPPLIER SYNC =====
+
+@api_router.post("/sync/{kind}")
+async def start_supplier_sync(kind: str, category: str = "all"):
+    """Start a background supplier sync: full catalog (products), conditional price/stock
+    refresh (prices) or only what changed since the last delta run (delta)"""
+    if kind not in RUN_KINDS:
+        raise HTTPException(status_code=404, detail="Unknown sync kind")
+    if not supplier_sync.scrapers:
+        raise HTTPException(status_code=400, detail="No suppliers configured")
+    return await supplier_sync.start(kind, category)
+
+@api_router.get("/sync/runs/{run_id}")
+async def get_supplier_sync_run(run_id: str):
+    """Get progress of a supplier sync run"""
+    run = await supplier_sync.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Sync run not found")
+    return run
+
 # ===== ADMIN & ANALYTICS =====
 
 @api_router.get("/admin/stats")
 async def get_admin_stats():
-    """Get dashboard statistics"""
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    
-    # Calculate total revenue
-    orders = await db.orders.find({}, {"_id": 0, "total": 1}).to_list(1000)
-    total_revenue = sum(order.get("total", 0) for order in orders)
-    
-    return {
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "total_revenue": total_revenue
-    }
+    """Get dashboard statistics from the maintained counters"""
+    return await stats_service.get_counters()
+
+@api_router.get("/admin/stats/rollups")
+async def get_admin_stats_rollups(granularity: str = "day", limit: int = Query(30, ge=1, le=24 * 90)):
+    """Revenue, order count and average basket per hour or day, newest first"""
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="Granularity must be 'hour' or 'day'")
+    return await stats_service.get_rollups(granularity, limit)
+
+@api_router.post("/admin/stats/reconcile")
+async def reconcile_admin_stats():
+    """Rebuild counters, rollups and facet counts from the orders and products collections"""
+    counters = await stats_service.reconcile()
+    await facet_counts.refresh()
+    return {"message": "Stats reconciled", "total_orders": counters["total_orders"]}
+
+@api_router.get("/admin/outbox")
+async def get_outbox_stats():
+    """Outbox event counts by kind and status, and the latest dead letters"""
+    stats, dead = await asyncio.gather(outbox.stats(), outbox.dead_letters(limit=20))
+    return Response(content=dumps({"counts": stats, "dead_letters": dead}), media_type="application/json")
+
+@api_router.post("/admin/outbox/requeue")
+async def requeue_outbox_events(event_id: Optional[str] = None):
+    """Retry dead-lettered events: one by id, or all of them"""
+    requeued = await outbox.requeue_dead(event_id)
+    return {"message": "Outbox events requeued", "requeued": requeued}
+
+@api_router.post("/admin/recommendations/rebuild")
+async def rebuild_recommendations():
+    """Recompute the related-products table from the catalog and the full order history"""
+    products = await recommender.rebuild()
+    return {"message": "Recommendations rebuilt", "products": products}
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats():
+    """Catalog cache hit/miss/eviction counters"""
+    return catalog_cache.stats()
+
+@api_router.get("/admin/images/stats")
+async def get_image_cache_stats():
+    """Image proxy disk cache usage and pending pre-warm jobs"""
+    return image_proxy.stats()
+
+@api_router.get("/admin/llm/stats")
+async def get_llm_stats():
+    """LLM backend and response cache counters"""
+    return llm_client.stats()
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus exposition of route, MongoDB and LLM metrics"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@api_router.get("/admin/profile")
+async def capture_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(5, ge=1, le=100),
+    format: str = "svg",
+):
+    """Sample every thread's stack for a while and return a flame graph
+    (svg) or collapsed stacks for flamegraph.pl / speedscope (collapsed)"""
+    if not profiler:
+        raise HTTPException(status_code=404, detail="Profiler is disabled; set PROFILER_ENABLED=1")
+    if format not in ("svg", "collapsed"):
+        raise HTTPException(status_code=400, detail="Format must be 'svg' or 'collapsed'")
+    try:
+        stacks = await profiler.capture(seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return Response(content=collapsed(stacks), media_type="text/plain")
+    return Response(content=render_svg(stacks, title=f"LuxDrop.pt {seconds:g}s profile"), media_type="image/svg+xml")
 
 # ===== SEED DATA =====
 
@@ -378,16 +1041,17 @@ async def seed_data():
     
     # Create categories
     categories = [
-        Category(id="cat1", name="Moda Feminina", slug="moda-feminina", image="https://images.unsplash.com/photo-1490481651871-ab68de25d43d?w=400", product_count=12),
-        Category(id="cat2", name="Moda Masculina", slug="moda-masculina", image="https://images.unsplash.com/photo-1617127365659-c47fa864d8bc?w=400", product_count=8),
-        Category(id="cat3", name="Acessórios", slug="acessorios", image="https://images.unsplash.com/photo-1523293182086-7651a899d37f?w=400", product_count=15),
-        Category(id="cat4", name="Beleza", slug="beleza", image="https://images.unsplash.com/photo-1596462502278-27bfdc403348?w=400", product_count=10),
-        Category(id="cat5", name="Electrónicos", slug="electronicos", image="https://images.unsplash.com/photo-1498049794561-7780e7231661?w=400", product_count=6),
-        Category(id="cat6", name="Casa & Decoração", slug="casa-decoracao", image="https://images.unsplash.com/photo-1513694203232-719a280e022f?w=400", product_count=9)
+        Category(id="cat1", name="Moda Feminina", slug="moda-feminina", image="https://images.unsplash.com/photo-1490481651871-ab68de25d43d?w=400"),
+        Category(id="cat2", name="Moda Masculina", slug="moda-masculina", image="https://images.unsplash.com/photo-1617127365659-c47fa864d8bc?w=400"),
+        Category(id="cat3", name="Acessórios", slug="acessorios", image="https://images.unsplash.com/photo-1523293182086-7651a899d37f?w=400"),
+        Category(id="cat4", name="Beleza", slug="beleza", image="https://images.unsplash.com/photo-1596462502278-27bfdc403348?w=400"),
+        Category(id="cat5", name="Electrónicos", slug="electronicos", image="https://images.unsplash.com/photo-1498049794561-7780e7231661?w=400"),
+        Category(id="cat6", name="Casa & Decoração", slug="casa-decoracao", image="https://images.unsplash.com/photo-1513694203232-719a280e022f?w=400")
     ]
     
-    for cat in categories:
-        await db.categories.insert_one(cat.model_dump())
+    # Upsert so a half-seeded database (categories but no products) can be re-seeded
+    await db.categories.bulk_write([ReplaceOne({"id": cat.id}, cat.model_dump(), upsert=True) for cat in categories])
+    image_proxy.prewarm(cat.image for cat in categories if cat.image)
     
     # Create sample products
     products = [
@@ -505,11 +1169,11 @@ async def seed_data():
         )
     ]
     
-    for product in products:
-        doc = product.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.products.insert_one(doc)
+    docs = [product.model_dump() for product in products]
+    await db.products.insert_many(docs)
     
+    await product_changes.publish([ProductChange.created(doc) for doc in docs])
+    await catalog_cache.invalidate("categories")
     return {"message": "Database seeded successfully", "products": len(products), "categories": len(categories)}
 
 # Include router
@@ -521,8 +1185,15 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+if query_plan_guard:
+    app.add_middleware(QueryPlanGuardMiddleware, guard=query_plan_guard, client=client)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -530,6 +1201,117 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# =============== LIFECYCLE ===============
+
+async def bootstrap():
+    """One-off database upkeep, run by whichever worker gets the bootstrap lease"""
+    report = await ensure_indexes(db)
+    changed = {name: r for name, r in report.items() if r["created"] or r["rebuilt"] or r["dropped"]}
+    if changed:
+        logger.info(f"Indexes reconciled: {changed}")
+    await stats_service.ensure_initialized()
+    await facet_counts.ensure_initialized()
+    # Runs alongside traffic; reads already cope with either representation
+    converted = await migrate_string_dates(db)
+    if converted:
+        logger.info(f"Converted string dates to BSON dates: {converted}")
+    # After the migration, so backfilled summaries carry BSON dates
+    await order_summaries.backfill()
+
+async def run_background_jobs():
+    """Run supplier syncs and enrichment jobs, including ones recorded by other workers"""
+    supplier_sync.active = enrichment_jobs.active = True
+    try:
+        while True:
+            try:
+                await supplier_sync.resume_interrupted()
+                await enrichment_jobs.resume_interrupted()
+            except Exception as e:
+                logger.error(f"Checking for queued jobs failed: {str(e)}")
+            await asyncio.sleep(JOBS_POLL_SECONDS)
+    finally:
+        # Lost the lease or shutting down: the runs stay running/queued and resume from their checkpoints elsewhere
+        supplier_sync.active = enrichment_jobs.active = False
+        await supplier_sync.stop_runs()
+        await enrichment_jobs.shutdown()
+
+async def expire_reservations():
+    """Cancel pending orders whose stock reservation ran out, putting the stock back"""
+    while True:
+        try:
+            for order_id in await inventory.expire_stale():
+                now = utcnow()
+
+                async def cancel(session):
+                    previous = await db.orders.find_one_and_update(
+                        {"id": order_id, "status": "pending"},
+                        {"$set": {"status": "cancelled", "updated_at": now}},
+                        projection={"_id": 0, "status": 1, "total": 1, "created_at": 1},
+                        session=session,
+                    )
+                    if previous:
+                        await order_summaries.record_status(order_id, "cancelled", now, session=session)
+                    return previous
+
+                previous = await outbox.write(
+                    cancel,
+                    lambda previous: status_events(order_id, "pending", "cancelled", now) if previous else [],
+                )
+                if previous:
+                    await stats_service.record_status_change("pending", "cancelled", previous)
+        except Exception as e:
+            logger.error(f"Reservation sweep failed: {str(e)}")
+        await asyncio.sleep(RESERVATION_SWEEP_SECONDS)
+
+async def maintain_recommendations():
+    await recommender.run(RECOMMENDATIONS_REBUILD_SECONDS, RECOMMENDATIONS_POLL_SECONDS)
+
+# Background work that must run in exactly one worker, by lease name
+LEADER_JOBS = {
+    "bootstrap": bootstrap,
+    "jobs": run_background_jobs,
+    "reservations": expire_reservations,
+    "recommendations": maintain_recommendations,
+}
+
+worker: Optional[str] = None
+leader_jobs: List[LeaderJob] = []
+change_follower: Optional[asyncio.Task] = None
+
+async def startup():
+    global worker, leader_jobs, change_follower
+    worker = worker_id()
+    client.open()
+    # Until this worker takes the jobs lease, new runs are only recorded
+    supplier_sync.active = enrichment_jobs.active = False
+    # Follow other workers' product changes from before the search index reads the catalog
+    change_follower = asyncio.create_task(product_changes.follow(db.products, interval=CHANGE_FEED_POLL_SECONDS))
+    indexed = await search_index.rebuild(db.products)
+    logger.info(f"Search index built with {indexed} products")
+    transcript_writer.start()
+    await image_proxy.start()
+    await outbox.start()
+    leader_jobs = [
+        LeaderJob(LeaderLease(db.leases, name, worker, ttl=LEASE_TTL_SECONDS), job, renew_every=LEASE_RENEW_SECONDS)
+        for name, job in LEADER_JOBS.items()
+    ]
+    for job in leader_jobs:
+        job.start()
+    logger.info(f"Worker {worker} started")
+
+async def shutdown():
+    """Drain after the server has stopped taking requests: hand over leases, flush queued writes, close the client"""
+    # Released rather than left to expire, so another worker resumes syncs and sweeps right away
+    await asyncio.gather(*(job.stop() for job in leader_jobs))
+    if change_follower and not change_follower.done():
+        change_follower.cancel()
+    await facet_counts.shutdown()
+    await stats_service.shutdown()
+    await recommender.shutdown()
+    await outbox.shutdown(drain_timeout=DRAIN_TIMEOUT_SECONDS)
+    await image_proxy.shutdown()
+    await supplier_sync.shutdown()
+    await enrichment_jobs.shutdown()
+    await transcript_writer.stop()
+    client.close()
+    logger.info(f"Worker {worker} stopped")
@@ -0,0 +1,251 @@
+"""Pre-aggregated dashboard statistics.
+
+Running counters live in a single ``stats_counters`` document and are
+updated with ``$inc`` as orders and products are written, so the admin
+dashboard reads them in O(1). Revenue and order counts are also rolled up
+into hourly and daily buckets in ``stats_rollups``. Revenue leaves out
+cancelled orders. ``reconcile`` rebuilds everything from the source
+collections in case the counters ever drift.
+
+Product counts by category and supplier are ``$inc``-ed for new products.
+A change to an existing product's category or supplier can't be diffed
+(the change feed doesn't carry the old values), so it schedules a
+debounced ``recount_products`` instead, as ``facets.FacetCounts`` does.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from changes import ProductChange
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_ID = "global"
+CANCELLED = "cancelled"
+# Product fields the per-category/per-supplier counters are keyed on
+RECOUNT_FIELDS = {"category", "supplier"}
+
+# granularity -> (number of ISO-8601 characters in the bucket key, $dateToString format)
+GRANULARITIES = {
+    "hour": (13, "%Y-%m-%dT%H"),
+    "day": (10, "%Y-%m-%d"),
+}
+
+
+def _key(name: str) -> str:
+    """Make a category/supplier/status name safe to use as a field name."""
+    return str(name).replace(".", "_").replace("$", "_") or "unknown"
+
+
+def _bucket(created_at, granularity: str) -> str:
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    return created_at[:GRANULARITIES[granularity][0]]
+
+
+def _revenue(status_field: str = "$status", total_field: str = "$total") -> dict:
+    """Aggregation expression for an order's contribution to revenue."""
+    return {"$cond": [{"$eq": [status_field, CANCELLED]}, 0, total_field]}
+
+
+class StatsService:
+    def __init__(self, db, recount_delay: float = 5.0):
+        self.counters = db.stats_counters
+        self.rollups = db.stats_rollups
+        self.orders = db.orders
+        self.products = db.products
+        self.recount_delay = recount_delay
+        self._dirty = False
+        self._recount_task: Optional[asyncio.Task] = None
+
+    # ----- incremental updates -----
+
+    async def record_order(self, order: dict) -> None:
+        total = order.get("total", 0)
+        await self.counters.update_one(
+            {"_id": COUNTERS_ID},
+            {"$inc": {
+                "total_orders": 1,
+                "total_revenue": total,
+                f"orders_by_status.{_key(order.get('status', 'pending'))}": 1,
+            }},
+            upsert=True,
+        )
+        await self.rollups.bulk_write([
+            UpdateOne(
+                {"_id": f"{granularity}:{_bucket(order['created_at'], granularity)}"},
+                {
+                    "$inc": {"orders": 1, "revenue": total},
+                    "$setOnInsert": {"granularity": granularity, "bucket": _bucket(order["created_at"], granularity)},
+                },
+                upsert=True,
+            )
+            for granularity in GRANULARITIES
+        ], ordered=False)
+
+    async def record_status_change(self, old_status: str, new_status: str, order: Optional[dict] = None) -> None:
+        """Move an order between status counts; with the order (``total``, ``created_at``),
+        also take cancelled orders out of revenue and put them back if un-cancelled."""
+        if old_status == new_status:
+            return
+        increments = {
+            f"orders_by_status.{_key(old_status)}": -1,
+            f"orders_by_status.{_key(new_status)}": 1,
+        }
+        revenue = 0
+        if order is not None and CANCELLED in (old_status, new_status):
+            revenue = order.get("total", 0) if old_status == CANCELLED else -order.get("total", 0)
+            increments["total_revenue"] = revenue
+        await self.counters.update_one({"_id": COUNTERS_ID}, {"$inc": increments}, upsert=True)
+        if revenue and order.get("created_at"):
+            await self.rollups.bulk_write([
+                UpdateOne(
+                    {"_id": f"{granularity}:{_bucket(order['created_at'], granularity)}"},
+                    {"$inc": {"revenue": revenue}},
+                )
+                for granularity in GRANULARITIES
+            ], ordered=False)
+
+    async def record_products(self, products: Iterable[dict]) -> None:
+        """Count newly inserted products by category and supplier."""
+        increments = Counter()
+        for product in products:
+            increments["products_total"] += 1
+            increments[f"products_by_category.{_key(product.get('category', ''))}"] += 1
+            increments[f"products_by_supplier.{_key(product.get('supplier', ''))}"] += 1
+        if increments:
+            await self.counters.update_one({"_id": COUNTERS_ID}, {"$inc": dict(increments)}, upsert=True)
+
+    async def apply_product_changes(self, changes: Iterable[ProductChange]) -> None:
+        """Count created products; recount after category or supplier edits."""
+        changes = list(changes)
+        await self.record_products([change.product for change in changes if change.kind == "created"])
+        if any(change.kind != "created" and RECOUNT_FIELDS & set(change.changed_fields) for change in changes):
+            self.schedule_recount()
+
+    def schedule_recount(self) -> None:
+        self._dirty = True
+        if self._recount_task is None or self._recount_task.done():
+            self._recount_task = asyncio.create_task(self._recount_when_quiet())
+
+    async def _recount_when_quiet(self) -> None:
+        # Coalesce a burst of edits (a supplier sync or an import) into one recount
+        while self._dirty:
+            self._dirty = False
+            await asyncio.sleep(self.recount_delay)
+            try:
+                await self.recount_products()
+            except Exception as e:
+                logger.error(f"Product counter recount failed: {str(e)}")
+
+    async def recount_products(self) -> dict:
+        """Set the product counters from the products collection, leaving order counters alone."""
+        product_totals = await self.products.aggregate([
+            {"$facet": {
+                "by_category": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}],
+                "by_supplier": [{"$group": {"_id": "$supplier", "count": {"$sum": 1}}}],
+            }},
+        ]).to_list(1)
+        products = product_totals[0]
+        counts = {
+            "products_total": sum(row["count"] for row in products["by_category"]),
+            "products_by_category": {_key(row["_id"]): row["count"] for row in products["by_category"]},
+            "products_by_supplier": {_key(row["_id"]): row["count"] for row in products["by_supplier"]},
+        }
+        await self.counters.update_one({"_id": COUNTERS_ID}, {"$set": counts}, upsert=True)
+        return counts
+
+    async def shutdown(self) -> None:
+        if self._recount_task and not self._recount_task.done():
+            self._recount_task.cancel()
+
+    # ----- reads -----
+
+    async def get_counters(self) -> dict:
+        doc = await self.counters.find_one({"_id": COUNTERS_ID}) or {}
+        total_orders = doc.get("total_orders", 0)
+        total_revenue = round(doc.get("total_revenue", 0), 2)
+        return {
+            "total_products": doc.get("products_total", 0),
+            "total_orders": total_orders,
+            "pending_orders": doc.get("orders_by_status", {}).get("pending", 0),
+            "total_revenue": total_revenue,
+            "average_basket": round(total_revenue / total_orders, 2) if total_orders else 0.0,
+            "orders_by_status": doc.get("orders_by_status", {}),
+            "products_by_category": doc.get("products_by_category", {}),
+            "products_by_supplier": doc.get("products_by_supplier", {}),
+            "reconciled_at": doc.get("reconciled_at"),
+        }
+
+    async def get_rollups(self, granularity: str, limit: int) -> List[dict]:
+        docs = await self.rollups.find(
+            {"granularity": granularity}, {"_id": 0}
+        ).sort("bucket", -1).limit(limit).to_list(limit)
+        for doc in docs:
+            doc["revenue"] = round(doc["revenue"], 2)
+            doc["average_basket"] = round(doc["revenue"] / doc["orders"], 2) if doc["orders"] else 0.0
+        return docs
+
+    # ----- reconciliation -----
+
+    async def reconcile(self) -> dict:
+        """Rebuild counters and rollups from the orders and products collections."""
+        order_totals = await self.orders.aggregate([
+            {"$facet": {
+                "totals": [{"$group": {"_id": None, "orders": {"$sum": 1}, "revenue": {"$sum": _revenue()}}}],
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            }},
+        ]).to_list(1)
+        orders = order_totals[0]
+        totals = orders["totals"][0] if orders["totals"] else {"orders": 0, "revenue": 0}
+        await self.counters.update_one({"_id": COUNTERS_ID}, {"$set": {
+            "total_orders": totals["orders"],
+            "total_revenue": totals["revenue"],
+            "orders_by_status": {_key(row["_id"]): row["count"] for row in orders["by_status"]},
+            "reconciled_at": datetime.now(timezone.utc),
+        }}, upsert=True)
+        await self.recount_products()
+        counters = await self.counters.find_one({"_id": COUNTERS_ID}, {"_id": 0})
+        await self.rebuild_rollups()
+        logger.info(f"Stats reconciled: {totals['orders']} orders, {counters['products_total']} products")
+        return counters
+
+    async def rebuild_rollups(self) -> None:
+        """Recompute every hourly and daily bucket with one pipeline that $merges into stats_rollups.
+
+        Buckets are replaced in place, so readers never see the rollups empty
+        (orders aren't deleted, so no bucket goes away)."""
+        facets = {}
+        for granularity, (length, fmt) in GRANULARITIES.items():
+            bucket = {"$cond": [
+                {"$eq": [{"$type": "$created_at"}, "string"]},
+                {"$substrCP": ["$created_at", 0, length]},
+                {"$dateToString": {"date": "$created_at", "format": fmt, "timezone": "UTC"}},
+            ]}
+            facets[granularity] = [
+                {"$group": {"_id": bucket, "orders": {"$sum": 1}, "revenue": {"$sum": _revenue()}}},
+                {"$project": {
+                    "_id": {"$concat": [granularity, ":", "$_id"]},
+                    "granularity": {"$literal": granularity},
+                    "bucket": "$_id",
+                    "orders": 1,
+                    "revenue": 1,
+                }},
+            ]
+        await self.orders.aggregate([
+            {"$project": {"total": 1, "status": 1, "created_at": 1}},
+            {"$facet": facets},
+            {"$project": {"rows": {"$concatArrays": [f"${granularity}" for granularity in GRANULARITIES]}}},
+            {"$unwind": "$rows"},
+            {"$replaceRoot": {"newRoot": "$rows"}},
+            {"$merge": {"into": self.rollups.name, "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]).to_list(None)
+
+    async def ensure_initialized(self) -> None:
+        if not await self.counters.find_one({"_id": COUNTERS_ID}, {"_id": 1}):
+            await self.reconcile()
+
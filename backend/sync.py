@@ -0,0 +1,404 @@
+"""Supplier catalog and price synchronisation.
+
+A sync run starts one worker per configured supplier and runs them
+concurrently. Each worker goes through its supplier's API under that
+supplier's rate limit (see ``scrapers``). After every batch it records a
+checkpoint in ``sync_checkpoints``, so a run interrupted by a crash or
+redeploy continues from the last completed batch instead of starting over.
+
+Only real differences are written. Each synced product keeps a content
+hash of its supplier fields (``sync_hash``) plus the supplier's
+``version`` and detail ``ETag``. Products whose version or hash did not
+change are skipped, and changed products get a ``$set`` of only the fields
+that differ. Every write is published on the product change feed.
+
+A product's ``stock`` is the supplier's figure (kept as ``supplier_stock``)
+minus the units open checkouts hold (``reserved``, see ``inventory``). It
+is computed in the update itself, so a reservation made while the sync
+runs still counts.
+
+Run kinds:
+
+* ``products`` - walk the full supplier catalog
+* ``prices``   - conditional GET (``If-None-Match``) of every synced product
+* ``delta``    - only products the supplier reports as changed since the
+  previous delta run (falls back to ``products`` for suppliers without a
+  change listing)
+
+Run progress is stored in ``sync_runs``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from changes import ChangeFeed, ProductChange
+from scrapers import BaseScraper
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = [
+    "name", "description", "price", "original_price", "category",
+    "images", "stock", "tags", "rating", "reviews_count",
+]
+
+RUN_KINDS = ("products", "prices", "delta")
+
+COUNTERS = ("pages", "upserted", "modified", "unchanged", "invalid", "errors")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def validate_supplier_product(raw: dict) -> Optional[str]:
+    """Return why a supplier product can't be imported, or None if it is valid."""
+    if not raw.get("supplier_id"):
+        return "missing supplier_id"
+    if not raw.get("name"):
+        return "missing name"
+    price = raw.get("price")
+    if not isinstance(price, (int, float)) or price <= 0:
+        return "invalid price"
+    images = raw.get("images") or []
+    if not images or not all(isinstance(url, str) and url.startswith(("http://", "https://")) for url in images):
+        return "invalid images"
+    if not isinstance(raw.get("stock", 0), int) or raw.get("stock", 0) < 0:
+        return "invalid stock"
+    return None
+
+
+def available_stock(supplier_stock: int) -> dict:
+    """Update expression for the stock left after open reservations."""
+    return {"$max": [0, {"$subtract": [supplier_stock, {"$max": [0, {"$ifNull": ["$reserved", 0]}]}]}]}
+
+
+def content_hash(raw: dict) -> str:
+    payload = json.dumps({field: raw.get(field) for field in PRODUCT_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SupplierSync:
+    def __init__(
+        self,
+        db,
+        scrapers: Dict[str, BaseScraper],
+        change_feed: ChangeFeed,
+        batch_size: int = 200,
+        details_concurrency: int = 10,
+    ):
+        self.products = db.products
+        self.runs = db.sync_runs
+        self.checkpoints = db.sync_checkpoints
+        self.scrapers = scrapers
+        self.change_feed = change_feed
+        self.batch_size = batch_size
+        self.details_concurrency = details_concurrency
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # With several workers only the one holding the jobs lease runs syncs;
+        # the others just record the run and it picks it up on its next poll
+        self.active = True
+
+    # ----- run management -----
+
+    async def start(self, kind: str, category: str = "all") -> dict:
+        run = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "category": category,
+            "status": "running",
+            "suppliers": {
+                supplier: {"status": "pending", **{counter: 0 for counter in COUNTERS}}
+                for supplier in self.scrapers
+            },
+            "started_at": _now(),
+            "finished_at": None,
+        }
+        await self.runs.insert_one(run)
+        self._launch(run["id"])
+        return await self.get_run(run["id"])
+
+    async def get_run(self, run_id: str) -> Optional[dict]:
+        return await self.runs.find_one({"id": run_id}, {"_id": 0})
+
+    def _launch(self, run_id: str) -> None:
+        if not self.active:
+            return
+        task = self._tasks.get(run_id)
+        if task and not task.done():
+            return
+        self._tasks[run_id] = asyncio.create_task(self._run(run_id))
+
+    async def resume_interrupted(self) -> int:
+        runs = await self.runs.find({"status": "running"}, {"id": 1}).to_list(None)
+        for run in runs:
+            self._launch(run["id"])
+        return len(runs)
+
+    async def stop_runs(self) -> None:
+        """Cancel running syncs; they stay "running" and resume from their checkpoints."""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        await self.stop_runs()
+        for scraper in self.scrapers.values():
+            await scraper.close()
+
+    async def _run(self, run_id: str) -> None:
+        run = await self.get_run(run_id)
+        worker = {
+            "products": self._sync_catalog,
+            "prices": self._sync_prices,
+            "delta": self._sync_delta,
+        }[run["kind"]]
+        results = await asyncio.gather(
+            *(worker(run, supplier, scraper) for supplier, scraper in self.scrapers.items()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                # Shutting down: leave the run as running so it is resumed on startup
+                raise result
+        failed = [supplier for supplier, result in zip(self.scrapers, results) if isinstance(result, Exception)]
+        await self.runs.update_one(
+            {"id": run_id},
+            {"$set": {"status": "failed" if failed else "completed", "finished_at": _now()}},
+        )
+        logger.info(f"Sync run {run_id} ({run['kind']}) finished, failed suppliers: {failed or 'none'}")
+
+    async def _progress(self, run_id: str, supplier: str, inc: Optional[dict] = None, status: Optional[str] = None) -> None:
+        update = {}
+        if inc:
+            update["$inc"] = {f"suppliers.{supplier}.{key}": value for key, value in inc.items()}
+        if status:
+            update["$set"] = {f"suppliers.{supplier}.status": status}
+        if update:
+            await self.runs.update_one({"id": run_id}, update)
+
+    async def _checkpoint(self, key: str, run_id: str, **fields) -> None:
+        await self.checkpoints.update_one(
+            {"_id": key},
+            {"$set": {"run_id": run_id, "updated_at": _now(), **fields}},
+            upsert=True,
+        )
+
+    async def _resume_point(self, key: str, run_id: str) -> Optional[dict]:
+        checkpoint = await self.checkpoints.find_one({"_id": key})
+        if checkpoint and checkpoint.get("run_id") == run_id:
+            return checkpoint
+        return None
+
+    # ----- change detection and writes -----
+
+    async def _apply(self, supplier: str, raw_products: List[dict]) -> dict:
+        """Write only the supplier products that actually changed and publish the changes."""
+        counts = {"upserted": 0, "modified": 0, "unchanged": 0, "invalid": 0}
+        valid = []
+        for raw in raw_products:
+            reason = validate_supplier_product(raw)
+            if reason:
+                counts["invalid"] += 1
+                logger.warning(f"Skipping {supplier} product {raw.get('supplier_id')}: {reason}")
+            else:
+                valid.append(raw)
+        if not valid:
+            return counts
+
+        projection = {"_id": 0, "id": 1, "supplier_id": 1, "sync_hash": 1, "supplier_version": 1, "reserved": 1}
+        projection.update({field: 1 for field in PRODUCT_FIELDS})
+        # Supplier ids are only unique within a supplier
+        existing = {
+            doc["supplier_id"]: doc
+            async for doc in self.products.find(
+                {"supplier": supplier, "supplier_id": {"$in": [raw["supplier_id"] for raw in valid]}}, projection
+            )
+        }
+
+        operations, new_docs, changes = [], {}, []
+        now = _now()
+        for raw in valid:
+            current = existing.get(raw["supplier_id"])
+            version = raw.get("version")
+            tracking = {"supplier_version": version, "synced_at": now}
+            if raw.get("etag"):
+                tracking["supplier_etag"] = raw["etag"]
+
+            if current is None:
+                doc = {
+                    "id": str(uuid.uuid4()),
+                    "tags": [],
+                    "rating": 5.0,
+                    "reviews_count": 0,
+                    "original_price": None,
+                    **{field: raw[field] for field in PRODUCT_FIELDS if field in raw},
+                    "supplier": supplier,
+                    "supplier_id": raw["supplier_id"],
+                    "supplier_stock": raw.get("stock"),
+                    "sync_hash": content_hash(raw),
+                    "created_at": now,
+                    **tracking,
+                }
+                new_docs[len(operations)] = doc
+                operations.append(UpdateOne(
+                    {"supplier": supplier, "supplier_id": raw["supplier_id"]}, {"$setOnInsert": doc}, upsert=True
+                ))
+                continue
+
+            if version is not None and version == current.get("supplier_version"):
+                counts["unchanged"] += 1
+                continue
+            new_hash = content_hash(raw)
+            if new_hash == current.get("sync_hash"):
+                counts["unchanged"] += 1
+                continue
+
+            expected = {field: raw[field] for field in PRODUCT_FIELDS if field in raw}
+            if "stock" in expected:
+                expected["stock"] = max(raw["stock"] - max(current.get("reserved") or 0, 0), 0)
+            diff = {field: value for field, value in expected.items() if value != current.get(field)}
+            fields = {**diff, **tracking, "sync_hash": new_hash}
+            if "stock" in raw:
+                fields.pop("stock", None)
+                fields["supplier_stock"] = raw["stock"]
+                update = [{"$set": {
+                    **{field: {"$literal": value} for field, value in fields.items()},
+                    "stock": available_stock(raw["stock"]),
+                }}]
+            else:
+                update = {"$set": fields}
+            operations.append(UpdateOne({"id": current["id"]}, update))
+            if diff:
+                changes.append(ProductChange(
+                    product_id=current["id"],
+                    kind="updated",
+                    old_price=current.get("price"),
+                    new_price=diff.get("price", current.get("price")),
+                    old_stock=current.get("stock"),
+                    new_stock=diff.get("stock", current.get("stock")),
+                    changed_fields=sorted(diff),
+                ))
+            else:
+                # Only the hash/version bookkeeping was stale
+                counts["unchanged"] += 1
+
+        if not operations:
+            return counts
+        result = await self.products.bulk_write(operations, ordered=False)
+        changes.extend(ProductChange.created(new_docs[index]) for index in result.upserted_ids)
+        counts["upserted"] += result.upserted_count
+        counts["modified"] += len(changes) - result.upserted_count
+        await self.change_feed.publish(changes)
+        return counts
+
+    # ----- workers -----
+
+    async def _sync_catalog(self, run: dict, supplier: str, scraper: BaseScraper) -> None:
+        run_id = run["id"]
+        key = f"products:{supplier}"
+        checkpoint = await self._resume_point(key, run_id)
+        if checkpoint and checkpoint.get("status") == "done":
+            return
+        page = checkpoint["next_page"] if checkpoint else 1
+        await self._progress(run_id, supplier, status="running")
+        try:
+            while page:
+                raw_products, next_page = await scraper.scrape_products(run["category"], page)
+                counts = await self._apply(supplier, raw_products)
+                await self._checkpoint(key, run_id, next_page=next_page, status="running" if next_page else "done")
+                await self._progress(run_id, supplier, inc={"pages": 1, **counts})
+                page = next_page
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Catalog sync for {supplier} failed on page {page}: {str(e)}")
+            await self._progress(run_id, supplier, inc={"errors": 1}, status="failed")
+            raise
+        await self._progress(run_id, supplier, status="completed")
+
+    async def _sync_delta(self, run: dict, supplier: str, scraper: BaseScraper) -> None:
+        run_id = run["id"]
+        key = f"delta:{supplier}"
+        checkpoint = await self.checkpoints.find_one({"_id": key}) or {}
+        since = checkpoint.get("since")
+        resuming = checkpoint.get("run_id") == run_id
+        if resuming and checkpoint.get("status") == "done":
+            return
+        page = checkpoint["next_page"] if resuming else 1
+        next_since = checkpoint.get("pending_since") if resuming else None
+
+        await self._progress(run_id, supplier, status="running")
+        try:
+            while page:
+                try:
+                    raw_products, next_page, cursor = await scraper.scrape_changes(since, page)
+                except NotImplementedError:
+                    logger.info(f"{supplier} has no change listing, running a full catalog sync instead")
+                    await self._sync_catalog(run, supplier, scraper)
+                    return
+                # The cursor from the first page marks where the next delta run starts
+                next_since = next_since or cursor
+                counts = await self._apply(supplier, raw_products)
+                await self._checkpoint(key, run_id, next_page=next_page, pending_since=next_since, status="running")
+                await self._progress(run_id, supplier, inc={"pages": 1, **counts})
+                page = next_page
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Delta sync for {supplier} failed since {since}: {str(e)}")
+            await self._progress(run_id, supplier, inc={"errors": 1}, status="failed")
+            raise
+        await self._checkpoint(key, run_id, since=next_since or since, next_page=None, status="done")
+        await self._progress(run_id, supplier, status="completed")
+
+    async def _sync_prices(self, run: dict, supplier: str, scraper: BaseScraper) -> None:
+        run_id = run["id"]
+        key = f"prices:{supplier}"
+        checkpoint = await self._resume_point(key, run_id)
+        if checkpoint and checkpoint.get("status") == "done":
+            return
+        last_id = checkpoint["last_id"] if checkpoint else ""
+        semaphore = asyncio.Semaphore(self.details_concurrency)
+
+        async def fetch(product: dict):
+            async with semaphore:
+                try:
+                    return await scraper.scrape_product_details(product["supplier_id"], product.get("supplier_etag")), False
+                except Exception as e:
+                    logger.warning(f"Price check for {supplier} {product['supplier_id']} failed: {str(e)}")
+                    return None, True
+
+        await self._progress(run_id, supplier, status="running")
+        try:
+            while True:
+                # Keyset over id so each batch is a short indexed query and the checkpoint is just the last id
+                batch = await self.products.find(
+                    {"supplier": supplier, "supplier_id": {"$exists": True}, "id": {"$gt": last_id}},
+                    {"_id": 0, "id": 1, "supplier_id": 1, "supplier_etag": 1},
+                ).sort("id", 1).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                results = await asyncio.gather(*(fetch(product) for product in batch))
+                changed = [details for details, _ in results if details is not None]
+                errors = sum(1 for _, failed in results if failed)
+                counts = await self._apply(supplier, changed)
+                # Products answered with 304 Not Modified were never transferred
+                counts["unchanged"] += len(batch) - len(changed) - errors
+                last_id = batch[-1]["id"]
+                await self._checkpoint(key, run_id, last_id=last_id, status="running")
+                await self._progress(run_id, supplier, inc={"pages": 1, "errors": errors, **counts})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Price sync for {supplier} failed after {last_id or 'start'}: {str(e)}")
+            await self._progress(run_id, supplier, inc={"errors": 1}, status="failed")
+            raise
+        await self._checkpoint(key, run_id, last_id=last_id, status="done")
+        await self._progress(run_id, supplier, status="completed")
@@ -1,5 +1,6 @@
 import { Link } from "react-router-dom";
 import { X, Plus, Minus, ShoppingBag } from "lucide-react";
+import ProductImage from "./ProductImage";
 
 const Cart = ({ cart, isOpen, onClose, removeFromCart, updateQuantity }) => {
   const total = cart.reduce((sum, item) => sum + item.price * item.quantity, 0);
@@ -41,9 +42,11 @@ const Cart = ({ cart, isOpen, onClose, removeFromCart, updateQuantity }) => {
               cart.map((item) => (
                 <div key={item.id} className="glass rounded-lg p-4" data-testid={`cart-item-${item.id}`}>
                   <div className="flex space-x-4">
-                    <img 
-                      src={item.images[0]} 
+                    <ProductImage
+                      src={item.images[0]}
                       alt={item.name}
+                      width={160}
+                      sizes="80px"
                       className="w-20 h-20 object-cover rounded-lg"
                       data-testid={`cart-item-image-${item.id}`}
                     />
@@ -1,6 +1,5 @@
 import { useState, useEffect, useRef } from "react";
 import { MessageCircle, X, Send } from "lucide-react";
-import axios from "axios";
 import { API } from "../App";
 
 const Chatbot = ({ isOpen, onClose }) => {
@@ -29,18 +28,64 @@ const Chatbot = ({ isOpen, onClose }) => {
     setLoading(true);
 
     try {
-      const response = await axios.post(`${API}/ai/chatbot`, {
-        message: userMessage,
-        session_id: sessionId
+      const response = await fetch(`${API}/ai/chatbot/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ message: userMessage, session_id: sessionId })
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Chatbot request failed with status ${response.status}`);
+      }
 
-      setMessages(prev => [...prev, { role: "assistant", content: response.data.response }]);
+      // Show an empty assistant bubble and grow it as tokens arrive
+      setMessages(prev => [...prev, { role: "assistant", content: "" }]);
+
+      const appendToken = (token) => {
+        setMessages(prev => {
+          const updated = [...prev];
+          const last = updated[updated.length - 1];
+          updated[updated.length - 1] = { ...last, content: last.content + token };
+          return updated;
+        });
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let streamDone = false;
+      while (!streamDone) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-sent events are separated by a blank line
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          const lines = event.split("\n");
+          const type = lines.find(line => line.startsWith("event: "))?.slice(7) || "message";
+          const data = lines.find(line => line.startsWith("data: "))?.slice(6);
+          if (type === "error") {
+            throw new Error(JSON.parse(data).detail);
+          }
+          if (type === "done") {
+            streamDone = true;
+            break;
+          }
+          if (data) {
+            appendToken(JSON.parse(data).token);
+          }
+        }
+      }
     } catch (error) {
       console.error("Chatbot error:", error);
-      setMessages(prev => [...prev, { 
-        role: "assistant", 
-        content: "Desculpe, ocorreu um erro. Por favor, tente novamente ou contacte support@luxdrop.pt" 
-      }]);
+      setMessages(prev => {
+        const withoutEmpty = prev[prev.length - 1]?.content === "" ? prev.slice(0, -1) : prev;
+        return [...withoutEmpty, {
+          role: "assistant",
+          content: "Desculpe, ocorreu um erro. Por favor, tente novamente ou contacte support@luxdrop.pt"
+        }];
+      });
     } finally {
       setLoading(false);
     }
@@ -101,7 +146,7 @@ const Chatbot = ({ isOpen, onClose }) => {
             </div>
           </div>
         ))}
-        {loading && (
+        {loading && messages[messages.length - 1]?.role === "user" && (
           <div className="flex justify-start" data-testid="chatbot-loading">
             <div className="bg-white/10 rounded-lg p-3">
               <div className="flex space-x-2">
@@ -0,0 +1,29 @@
+import { useState } from "react";
+import { API } from "../App";
+
+const WIDTHS = [160, 320, 640, 960, 1280, 1920];
+
+export const proxiedImage = (src, width) => `${API}/images?url=${encodeURIComponent(src)}&w=${width}`;
+
+// Remote images go through /api/images, which resizes them, picks AVIF/WebP and caches them.
+// If the proxy can't serve one (host not allowed, upstream down) the original URL is used instead.
+const ProductImage = ({ src, alt, width = 640, sizes = "100vw", ...props }) => {
+  const [failedSrc, setFailedSrc] = useState(null);
+
+  if (!/^https?:\/\//.test(src || "") || failedSrc === src) {
+    return <img src={src} alt={alt} {...props} />;
+  }
+
+  return (
+    <img
+      src={proxiedImage(src, width)}
+      srcSet={WIDTHS.filter((w) => w <= width * 2).map((w) => `${proxiedImage(src, w)} ${w}w`).join(", ")}
+      sizes={sizes}
+      alt={alt}
+      onError={() => setFailedSrc(src)}
+      {...props}
+    />
+  );
+};
+
+export default ProductImage;
@@ -4,6 +4,7 @@ import axios from "axios";
 import { API } from "../App";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
+import ProductImage from "../components/ProductImage";
 import { CreditCard, Truck, CheckCircle } from "lucide-react";
 import { toast, Toaster } from "sonner";
 
@@ -71,7 +72,11 @@ const Checkout = ({ cart, clearCart, removeFromCart, updateQuantity }) => {
       }, 1500);
     } catch (error) {
       console.error("Error creating order:", error);
-      toast.error("Erro ao processar pedido. Tente novamente.");
+      if (error.response?.status === 409) {
+        toast.error("Stock insuficiente para um ou mais produtos do carrinho.");
+      } else {
+        toast.error("Erro ao processar pedido. Tente novamente.");
+      }
     } finally {
       setLoading(false);
     }
@@ -273,7 +278,7 @@ const Checkout = ({ cart, clearCart, removeFromCart, updateQuantity }) => {
                 <div className="space-y-4 mb-6">
                   {cart.map((item) => (
                     <div key={item.id} className="flex space-x-3" data-testid={`summary-item-${item.id}`}>
-                      <img src={item.images[0]} alt={item.name} className="w-16 h-16 object-cover rounded-lg" />
+                      <ProductImage src={item.images[0]} alt={item.name} width={160} sizes="64px" className="w-16 h-16 object-cover rounded-lg" />
                       <div className="flex-1">
                         <h3 className="font-semibold text-sm">{item.name}</h3>
                         <p className="text-gray-400 text-sm">Qtd: {item.quantity}</p>
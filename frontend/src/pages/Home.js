@@ -5,6 +5,7 @@ import { API } from "../App";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
 import Chatbot from "../components/Chatbot";
+import ProductImage from "../components/ProductImage";
 import { Star, TrendingUp, Sparkles, Package, CreditCard, Truck } from "lucide-react";
 import { toast, Toaster } from "sonner";
 
@@ -124,9 +125,11 @@ const Home = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen, setCh
                 data-testid={`category-${category.slug}`}
               >
                 <div className="aspect-square relative overflow-hidden">
-                  <img
+                  <ProductImage
                     src={category.image}
                     alt={category.name}
+                    width={320}
+                    sizes="(min-width: 1024px) 16vw, (min-width: 768px) 33vw, 50vw"
                     className="w-full h-full object-cover group-hover:scale-110 transition-transform duration-300"
                   />
                   <div className="absolute inset-0 bg-gradient-to-t from-black/80 to-transparent flex items-end p-4">
@@ -152,9 +155,10 @@ const Home = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen, setCh
               <div key={product.id} className="glass rounded-xl overflow-hidden card-hover" data-testid={`product-card-${product.id}`}>
                 <Link to={`/product/${product.id}`}>
                   <div className="aspect-square relative overflow-hidden">
-                    <img
+                    <ProductImage
                       src={product.images[0]}
                       alt={product.name}
+                      sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw"
                       className="w-full h-full object-cover hover:scale-110 transition-transform duration-300"
                     />
                     {product.original_price && (
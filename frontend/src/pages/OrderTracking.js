@@ -4,7 +4,7 @@ import axios from "axios";
 import { API } from "../App";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
-import { Package, Truck, CheckCircle, Clock } from "lucide-react";
+import { Package, Truck, CheckCircle, Clock, XCircle } from "lucide-react";
 
 const OrderTracking = () => {
   const { orderId } = useParams();
@@ -17,7 +17,8 @@ const OrderTracking = () => {
 
   const loadOrder = async () => {
     try {
-      const response = await axios.get(`${API}/orders/${orderId}`);
+      // Compact summary with the status timeline; the full order (address, phone) isn't needed here
+      const response = await axios.get(`${API}/orders/${orderId}/tracking`);
       setOrder(response.data);
     } catch (error) {
       console.error("Error loading order:", error);
@@ -32,6 +33,7 @@ const OrderTracking = () => {
       case "confirmed": return <CheckCircle className="w-8 h-8 text-blue-500" />;
       case "shipped": return <Truck className="w-8 h-8 text-purple-500" />;
       case "delivered": return <Package className="w-8 h-8 text-green-500" />;
+      case "cancelled": return <XCircle className="w-8 h-8 text-red-500" />;
       default: return <Clock className="w-8 h-8 text-gray-500" />;
     }
   };
@@ -42,10 +44,13 @@ const OrderTracking = () => {
       case "confirmed": return "Confirmado";
       case "shipped": return "Enviado";
       case "delivered": return "Entregue";
+      case "cancelled": return "Cancelado";
       default: return status;
     }
   };
 
+  const formatDate = (date) => new Date(date).toLocaleString("pt-PT", { dateStyle: "medium", timeStyle: "short" });
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
@@ -89,9 +94,28 @@ const OrderTracking = () => {
             <p className="text-gray-400">Estado atual do seu pedido</p>
           </div>
 
+          {/* Status Timeline */}
+          <div className="glass rounded-2xl p-8 mb-8" data-testid="order-timeline">
+            <h2 className="text-2xl font-bold mb-6">Histórico do Pedido</h2>
+            <ol className="space-y-4">
+              {order.timeline.map((entry, idx) => (
+                <li key={idx} className="flex items-center gap-4" data-testid={`timeline-entry-${idx}`}>
+                  <div className="shrink-0">{getStatusIcon(entry.status)}</div>
+                  <div>
+                    <p className="font-semibold">{getStatusText(entry.status)}</p>
+                    <p className="text-gray-400 text-sm">{formatDate(entry.at)}</p>
+                  </div>
+                </li>
+              ))}
+            </ol>
+          </div>
+
           {/* Order Details */}
           <div className="glass rounded-2xl p-8 mb-8" data-testid="order-details">
             <h2 className="text-2xl font-bold mb-6">Detalhes do Pedido</h2>
+            <p className="text-gray-400 mb-4">
+              {order.item_count} {order.item_count === 1 ? "artigo" : "artigos"} · Encomendado em {formatDate(order.created_at)}
+            </p>
             
             <div className="space-y-4 mb-6">
               {order.items.map((item, idx) => (
@@ -118,13 +142,9 @@ const OrderTracking = () => {
             <h2 className="text-2xl font-bold mb-6">Informação de Envio</h2>
             <div className="space-y-2 text-gray-300">
               <p><strong>Nome:</strong> {order.user_name}</p>
-              <p><strong>Email:</strong> {order.user_email}</p>
-              <p><strong>Morada:</strong> {order.shipping_address.address}</p>
-              <p><strong>Cidade:</strong> {order.shipping_address.city}</p>
-              <p><strong>Código Postal:</strong> {order.shipping_address.postal_code}</p>
-              <p><strong>País:</strong> {order.shipping_address.country}</p>
-              <p><strong>Telefone:</strong> {order.shipping_address.phone}</p>
-              <p><strong>Método de Pagamento:</strong> {order.payment_method.toUpperCase()}</p>
+              <p><strong>Cidade:</strong> {order.city}</p>
+              <p><strong>País:</strong> {order.country}</p>
+              <p><strong>Método de Pagamento:</strong> {(order.payment_method || "").toUpperCase()}</p>
             </div>
           </div>
 
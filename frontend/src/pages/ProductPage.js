@@ -5,6 +5,7 @@ import { API } from "../App";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
 import Chatbot from "../components/Chatbot";
+import ProductImage from "../components/ProductImage";
 import { Star, ShoppingCart, Truck, Shield, RotateCcw } from "lucide-react";
 import { toast, Toaster } from "sonner";
 
@@ -15,6 +16,7 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
   const [quantity, setQuantity] = useState(1);
   const [loading, setLoading] = useState(true);
   const [recommendations, setRecommendations] = useState([]);
+  const [boughtTogether, setBoughtTogether] = useState([]);
 
   useEffect(() => {
     loadProduct();
@@ -25,9 +27,15 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
       const response = await axios.get(`${API}/products/${id}`);
       setProduct(response.data);
       
-      // Load recommendations from same category
-      const recsResponse = await axios.get(`${API}/products?category=${response.data.category}`);
-      setRecommendations(recsResponse.data.filter(p => p.id !== id).slice(0, 4));
+      // Load precomputed recommendations; fall back to the same category until they exist
+      const relatedResponse = await axios.get(`${API}/products/${id}/related`);
+      setBoughtTogether(relatedResponse.data.frequently_bought_together.slice(0, 4));
+      if (relatedResponse.data.similar.length > 0) {
+        setRecommendations(relatedResponse.data.similar.slice(0, 4));
+      } else {
+        const recsResponse = await axios.get(`${API}/products?category=${response.data.category}`);
+        setRecommendations(recsResponse.data.filter(p => p.id !== id).slice(0, 4));
+      }
     } catch (error) {
       console.error("Error loading product:", error);
       toast.error("Erro ao carregar produto");
@@ -81,9 +89,11 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
             {/* Images */}
             <div data-testid="product-images">
               <div className="glass rounded-2xl overflow-hidden mb-4">
-                <img
+                <ProductImage
                   src={product.images[selectedImage]}
                   alt={product.name}
+                  width={960}
+                  sizes="(min-width: 1024px) 50vw, 100vw"
                   className="w-full aspect-square object-cover"
                   data-testid="product-main-image"
                 />
@@ -98,7 +108,7 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
                     }`}
                     data-testid={`product-thumbnail-${idx}`}
                   >
-                    <img src={img} alt={`${product.name} ${idx + 1}`} className="w-full aspect-square object-cover" />
+                    <ProductImage src={img} alt={`${product.name} ${idx + 1}`} width={160} sizes="12vw" className="w-full aspect-square object-cover" />
                   </button>
                 ))}
               </div>
@@ -189,6 +199,24 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
             </div>
           </div>
 
+          {/* Frequently bought together */}
+          {boughtTogether.length > 0 && (
+            <div className="mb-16" data-testid="bought-together-section">
+              <h2 className="text-3xl font-bold mb-8 gold-text">Frequentemente comprados juntos</h2>
+              <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
+                {boughtTogether.map((rec) => (
+                  <Link key={rec.id} to={`/product/${rec.id}`} className="glass rounded-xl overflow-hidden card-hover" data-testid={`bought-together-${rec.id}`}>
+                    <ProductImage src={rec.images[0]} alt={rec.name} sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw" className="w-full aspect-square object-cover" />
+                    <div className="p-4">
+                      <h3 className="font-semibold mb-2">{rec.name}</h3>
+                      <p className="text-2xl font-bold gold-text">€{rec.price.toFixed(2)}</p>
+                    </div>
+                  </Link>
+                ))}
+              </div>
+            </div>
+          )}
+
           {/* Recommendations */}
           {recommendations.length > 0 && (
             <div data-testid="recommendations-section">
@@ -196,7 +224,7 @@ const ProductPage = ({ cart, addToCart, removeFromCart, updateQuantity, chatOpen
               <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6">
                 {recommendations.map((rec) => (
                   <Link key={rec.id} to={`/product/${rec.id}`} className="glass rounded-xl overflow-hidden card-hover" data-testid={`recommendation-${rec.id}`}>
-                    <img src={rec.images[0]} alt={rec.name} className="w-full aspect-square object-cover" />
+                    <ProductImage src={rec.images[0]} alt={rec.name} sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw" className="w-full aspect-square object-cover" />
                     <div className="p-4">
                       <h3 className="font-semibold mb-2">{rec.name}</h3>
                       <p className="text-2xl font-bold gold-text">€{rec.price.toFixed(2)}</p>
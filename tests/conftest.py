@@ -0,0 +1,51 @@
+"""Shared fixtures. The backend modules import as top-level modules (as
+under uvicorn in ``backend/``); MongoDB is mongomock-motor and the LLM the
+fake backend, so the suite needs no services."""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "luxdrop_test")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Route every Motor client the code opens to an in-memory mongomock one"""
+    from mongomock_motor import AsyncMongoMockClient
+    from motor import motor_asyncio
+
+    from codec import CLIENT_OPTIONS
+
+    monkeypatch.setattr(motor_asyncio, "AsyncIOMotorClient", AsyncMongoMockClient)
+    # Dates come back timezone-aware, as from the app's client
+    return AsyncMongoMockClient(**CLIENT_OPTIONS)
+
+
+@pytest.fixture
+def app(mongo):
+    """``server`` with an open, empty database; requests go through ``api(server)``"""
+    import server
+
+    server.client.open()
+    try:
+        yield server
+    finally:
+        server.client.close()
+
+
+def api(server) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from bulk import ProductImporter, export_csv, rows_for
+from changes import ChangeFeed
+from server import Product, ProductCreate
+from tests.conftest import run
+
+PRODUCT = {
+    "id": "p1", "name": "Relógio, \"Gold\"", "description": "Aço\ninoxidável", "price": 129.9, "original_price": 199.0,
+    "category": "Acessórios", "images": ["https://img.example.com/1.jpg", "https://img.example.com/2.jpg"],
+    "stock": 4, "supplier": "temu", "tags": ["luxo", "relógio"], "rating": 4.3, "reviews_count": 87,
+    "created_at": datetime(2025, 11, 2, 9, 15, tzinfo=timezone.utc),
+}
+
+
+async def body(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def importer(collection, feed=None):
+    return ProductImporter(collection, feed or ChangeFeed(), ProductCreate, Product)
+
+
+def test_csv_export_imports_back_unchanged(mongo):
+    db = mongo.luxdrop_test
+
+    async def scenario():
+        await db.products.insert_one(dict(PRODUCT))
+        exported = [chunk async for chunk in export_csv(db.products.find({}, {"_id": 0}))]
+        report = await importer(db.restored).run(rows_for("csv", body(exported)))
+        return report, await db.restored.find_one({}, {"_id": 0})
+
+    report, restored = run(scenario())
+    assert (report["inserted"], report["failed"]) == (1, 0)
+    # mongomock hands datetimes back naive, as pymongo does without tz_aware
+    assert {**restored, "created_at": restored["created_at"].replace(tzinfo=timezone.utc)} == PRODUCT
+
+
+def test_updates_publish_the_previous_price_and_stock(mongo):
+    db = mongo.luxdrop_test
+    feed = ChangeFeed()
+    published = []
+
+    @feed.subscribe
+    async def collect(changes):
+        published.extend(changes)
+
+    async def scenario():
+        await db.products.insert_one(dict(PRODUCT))
+        row = b'{"id": "p1", "name": "Rel\xc3\xb3gio", "description": "", "price": 99.0, "category": "Acess\xc3\xb3rios", "images": [], "stock": 9, "supplier": "temu"}\n'
+        return await importer(db.products, feed).run(rows_for("ndjson", body([row])))
+
+    report = run(scenario())
+    assert report["updated"] == 1
+    change = published[0]
+    assert (change.old_price, change.new_price, change.old_stock, change.new_stock) == (129.9, 99.0, 4, 9)
@@ -0,0 +1,122 @@
+import asyncio
+
+from cache import CacheEntry, LRUCache, LocalCacheBackend, ResponseCache
+from tests.conftest import api, run
+
+
+def test_lru_evicts_oldest_and_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    lru = LRUCache(max_entries=2, ttl=10)
+    lru.set("a", b"1")
+    lru.set("b", b"2")
+    assert lru.get("a") == b"1"
+    lru.set("c", b"3")
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == (b"1", None, b"3")
+    now[0] += 11
+    assert lru.get("a") is None
+    assert lru.evictions == 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache(LRUCache(), shared=LocalCacheBackend())
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return b"[1]"
+
+    async def scenario():
+        entries = await asyncio.gather(*(cache.get_or_load("k", load) for _ in range(5)))
+        cache.local.clear()
+        # The shared backend still has it
+        return entries, await cache.get_or_load("k", load)
+
+    entries, again = run(scenario())
+    assert len(loads) == 1
+    assert {entry.etag for entry in entries} == {again.etag}
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["shared_hits"] == 1
+
+
+def invalidated_mid_load(invalidate):
+    """Invalidate while the first load is in flight; return what it got and what is cached after."""
+    cache = ResponseCache(LRUCache(), shared=LocalCacheBackend())
+    version = ["old"]
+    started = asyncio.Event()
+
+    async def load():
+        body = version[0].encode()
+        started.set()
+        await asyncio.sleep(0.01)
+        return body
+
+    async def scenario():
+        stale = asyncio.create_task(cache.get_or_load("product:1", load))
+        await started.wait()
+        version[0] = "new"
+        await invalidate(cache)
+        # A caller arriving after the write must not join the stale load
+        fresh = await cache.get_or_load("product:1", load)
+        first = await stale
+        return first, fresh, await cache.get_or_load("product:1", load), await cache.shared.get("product:1")
+
+    return run(scenario())
+
+
+def test_an_invalidation_during_a_load_keeps_the_stale_body_out():
+    first, fresh, cached, shared = invalidated_mid_load(lambda cache: cache.invalidate("product:1"))
+    assert first.body == b"old"
+    assert fresh.body == cached.body == shared.body == b"new"
+
+
+def test_a_prefix_invalidation_during_a_load_keeps_the_stale_body_out():
+    first, fresh, cached, shared = invalidated_mid_load(lambda cache: cache.invalidate_prefix("product:"))
+    assert first.body == b"old"
+    assert fresh.body == cached.body == shared.body == b"new"
+
+
+def test_failed_loads_are_not_cached():
+    cache = ResponseCache(LRUCache())
+    calls = []
+
+    async def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+        return b"ok"
+
+    async def scenario():
+        try:
+            await cache.get_or_load("k", load)
+        except RuntimeError:
+            pass
+        return await cache.get_or_load("k", load)
+
+    assert run(scenario()).body == b"ok"
+    assert cache._inflight == {} and cache._generations == {}
+
+
+def test_categories_answer_304_until_a_write_changes_them(app):
+    async def scenario():
+        async with api(app) as http:
+            first = await http.get("/api/categories")
+            etag = first.headers["etag"]
+            unchanged = await http.get("/api/categories", headers={"If-None-Match": etag})
+            weak = await http.get("/api/categories", headers={"If-None-Match": f"W/{etag}"})
+            await http.post("/api/categories", json={"name": "Beleza", "slug": "beleza", "image": "https://x/y.jpg"})
+            changed = await http.get("/api/categories", headers={"If-None-Match": etag})
+        return first, unchanged, weak, changed
+
+    first, unchanged, weak, changed = run(scenario())
+    assert first.status_code == 200 and first.json() == []
+    assert unchanged.status_code == weak.status_code == 304
+    assert unchanged.content == b""
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert [category["slug"] for category in changed.json()] == ["beleza"]
+
+
+def test_cache_entry_etag_follows_the_body():
+    assert CacheEntry.from_body(b"a").etag == CacheEntry.from_body(b"a").etag != CacheEntry.from_body(b"b").etag
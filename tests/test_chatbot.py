@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+from llm import LLMBackend, LLMError
+from tests.conftest import api, run
+
+
+class ScriptedBackend(LLMBackend):
+    """Streams ``chunks``, pausing before each until ``proceed`` is set when ``gated``;
+    raises ``error`` after them if given."""
+
+    provider = model = "scripted"
+
+    def __init__(self, chunks, error=None, gated=False):
+        self.chunks = chunks
+        self.error = error
+        self.gated = gated
+        self.proceed = asyncio.Event()
+        self.closed = False
+
+    async def stream(self, prompt, system_message, session_id):
+        try:
+            for chunk in self.chunks:
+                if self.gated:
+                    await self.proceed.wait()
+                    self.proceed.clear()
+                yield chunk
+            if self.error:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+def events(body: str):
+    """(event, data) pairs of a server-sent event stream."""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        parsed.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return parsed
+
+
+def start_stream(app, session_id="s1", message="Olá"):
+    return app.chatbot_stream(app.ChatRequest(message=message, session_id=session_id))
+
+
+def test_reply_is_streamed_token_by_token_then_saved(app, monkeypatch):
+    backend = ScriptedBackend(["Olá", ", ", "bem-vinda"], gated=True)
+    monkeypatch.setattr(app.llm_client, "backend", backend)
+
+    async def scenario():
+        body = (await start_stream(app)).body_iterator
+        received = []
+        for _ in backend.chunks:
+            # Nothing is sent until the model produces the next chunk
+            pending = asyncio.ensure_future(body.__anext__())
+            await asyncio.sleep(0.01)
+            assert not pending.done()
+            backend.proceed.set()
+            received.append(await pending)
+        received.append(await body.__anext__())
+        await app.transcript_writer.stop()
+        saved = await app.db.chat_messages.find({}, {"_id": 0, "message": 1, "response": 1}).to_list(None)
+        return received, await app.chat_history.get("s1"), saved
+
+    received, history, saved = run(scenario())
+    assert events("".join(received)) == [
+        ("message", {"token": "Olá"}), ("message", {"token": ", "}), ("message", {"token": "bem-vinda"}), ("done", {}),
+    ]
+    assert history == [{"message": "Olá", "response": "Olá, bem-vinda"}]
+    assert saved == [{"message": "Olá", "response": "Olá, bem-vinda"}]
+
+
+def test_a_client_that_disconnects_closes_the_llm_stream_and_saves_nothing(app, monkeypatch):
+    backend = ScriptedBackend(["Olá", ", ", "bem-vinda"])
+    monkeypatch.setattr(app.llm_client, "backend", backend)
+
+    async def scenario():
+        body = (await start_stream(app, session_id="gone")).body_iterator
+        first = await body.__anext__()
+        await body.aclose()
+        closed = backend.closed
+        await app.transcript_writer.stop()
+        return first, closed, await app.chat_history.get("gone"), await app.db.chat_messages.count_documents({})
+
+    first, closed, history, saved = run(scenario())
+    assert events(first) == [("message", {"token": "Olá"})]
+    assert closed
+    assert history == []
+    assert saved == 0
+
+
+def test_an_llm_error_ends_the_stream_with_an_error_event(app, monkeypatch):
+    monkeypatch.setattr(app.llm_client, "backend", ScriptedBackend(["Olá"], error=LLMError("quota exceeded")))
+
+    async def scenario():
+        async with api(app) as http:
+            response = await http.post("/api/ai/chatbot/stream", json={"message": "Olá", "session_id": "s2"})
+        await app.transcript_writer.stop()
+        return response, await app.chat_history.get("s2"), await app.db.chat_messages.count_documents({})
+
+    response, history, saved = run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert events(response.text) == [
+        ("message", {"token": "Olá"}), ("error", {"detail": "Chatbot error: quota exceeded"}),
+    ]
+    assert history == []
+    assert saved == 0
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from codec import dump_rows, dumps, migrate_string_dates, parse_date
+from tests.conftest import api, run
+
+CREATED = datetime(2026, 3, 1, 10, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+def legacy_product(**fields) -> dict:
+    return {
+        "id": "p1", "name": "Relógio", "description": "", "price": 30.0, "category": "Acessórios",
+        "images": [], "stock": 3, "supplier": "temu", **fields,
+    }
+
+
+def test_fast_path_encodes_dates_like_the_response_model_path(app):
+    """dump_rows over a BSON-date document gives the JSON the old fromisoformat + response_model path gave."""
+    stored = legacy_product(created_at=CREATED)
+    legacy = legacy_product(created_at=CREATED.isoformat())
+    legacy["created_at"] = datetime.fromisoformat(legacy["created_at"])
+    old = app.product_list_adapter.dump_json(app.product_list_adapter.validate_python([legacy]))
+
+    projected = {key: value for key, value in stored.items() if key in app.PRODUCT_PROJECTION}
+    new = dump_rows([projected], app.PRODUCT_DEFAULTS)
+
+    assert json.loads(new) == json.loads(old)
+    assert json.loads(new)[0]["created_at"] == "2026-03-01T10:30:15.123000Z"
+
+
+def test_dumps_writes_utc_with_z_and_keeps_other_offsets():
+    lisbon_summer = timezone(timedelta(hours=1))
+    assert json.loads(dumps({"at": CREATED})) == {"at": "2026-03-01T10:30:15.123000Z"}
+    assert json.loads(dumps({"at": CREATED.astimezone(lisbon_summer)}))["at"].endswith("+01:00")
+
+
+def test_listing_serves_stored_dates_in_the_model_format(app):
+    async def scenario():
+        await app.db.products.insert_one(legacy_product(created_at=CREATED))
+        async with api(app) as http:
+            listed = await http.get("/api/products")
+            single = await http.get("/api/products/p1")
+        return listed.json()[0]["created_at"], single.json()["created_at"]
+
+    listed, single = run(scenario())
+    assert listed == single == "2026-03-01T10:30:15.123000Z"
+
+
+def test_parse_date_reads_legacy_formats():
+    assert parse_date("2026-03-01T10:30:15.123000+00:00") == CREATED
+    assert parse_date("2026-03-01T10:30:15.123Z") == CREATED
+    # Naive values were written in UTC
+    assert parse_date("2026-03-01T10:30:15.123") == CREATED
+    assert parse_date("2026-03-01T11:30:15.123+01:00") == CREATED
+    assert parse_date("last tuesday") is None
+
+
+def test_migration_converts_iso_strings_and_is_idempotent(mongo):
+    db = mongo.luxdrop_test
+    fields = {"products": ("created_at",), "orders": ("created_at", "updated_at")}
+
+    async def scenario():
+        await db.products.insert_many([
+            legacy_product(id="a", created_at="2026-03-01T10:30:15.123000+00:00"),
+            legacy_product(id="b", created_at="2026-03-01T10:30:15.123Z"),
+            legacy_product(id="c", created_at=CREATED),
+            legacy_product(id="d", created_at="not a date"),
+        ])
+        await db.orders.insert_one({"id": "o1", "created_at": "2026-03-01T10:30:15.123", "updated_at": CREATED})
+        first = await migrate_string_dates(db, fields, batch_size=2)
+        second = await migrate_string_dates(db, fields, batch_size=2)
+        products = {doc["id"]: doc["created_at"] async for doc in db.products.find({}, {"_id": 0, "id": 1, "created_at": 1})}
+        return first, second, products, await db.orders.find_one({"id": "o1"})
+
+    first, second, products, order = run(scenario())
+    assert first == {"products": 2, "orders": 1}
+    assert second == {}
+    assert [products[key] for key in "abc"] == [CREATED] * 3
+    assert products["d"] == "not a date"
+    assert order["created_at"] == CREATED
@@ -0,0 +1,45 @@
+from enrichment import EnrichmentJobs
+from llm import FakeLLMBackend, LLMClient
+from tests.conftest import run
+
+
+class FlakyBackend(FakeLLMBackend):
+    """Fails every prompt about products named in ``failing``."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    async def complete(self, prompt, system_message, session_id):
+        if any(name in prompt for name in self.failing):
+            raise RuntimeError("model unavailable")
+        return await super().complete(prompt, system_message, session_id)
+
+
+def test_failed_products_end_the_job_with_errors_and_are_retried_on_resume(mongo):
+    db = mongo.luxdrop_test
+    backend = FlakyBackend(failing=["Bolsa"])
+    jobs = EnrichmentJobs(db, LLMClient(backend), max_attempts=1)
+    products = [
+        {"id": "p1", "name": "Relógio", "category": "Acessórios", "price": 99.0},
+        {"id": "p2", "name": "Bolsa", "category": "Acessórios", "price": 59.0},
+    ]
+
+    async def scenario():
+        await db.products.insert_many([dict(product) for product in products])
+        job = await jobs.create(["p1", "p2"], ["instagram"])
+        await jobs._tasks[job["id"]]
+        first = await jobs.get(job["id"])
+        backend.failing.clear()
+        calls = backend.calls
+        await jobs.resume(job["id"])
+        await jobs._tasks[job["id"]]
+        return first, await jobs.get(job["id"]), backend.calls - calls, await db.products.find_one({"id": "p2"})
+
+    first, resumed, calls, bolsa = run(scenario())
+    assert (first["status"], first["succeeded"], first["failed"]) == ("completed_with_errors", 1, 1)
+    assert first["errors"][0]["product_id"] == "p2"
+    assert (resumed["status"], resumed["succeeded"], resumed["failed"]) == ("completed", 2, 0)
+    # description, tags and one social post, for the failed product only
+    assert calls == 3
+    assert bolsa["ai_enrichment"]["job_id"] == resumed["id"]
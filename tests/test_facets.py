@@ -0,0 +1,41 @@
+from facets import FacetCounts, browse_query
+from tests.conftest import run
+
+PRODUCTS = [
+    {"id": "p1", "category": "Beleza", "supplier": "temu", "tags": ["novo"], "price": 10.0, "rating": 4.5, "stock": 3},
+    {"id": "p2", "category": "Beleza", "supplier": "shein", "tags": ["novo"], "price": 30.0, "rating": 3.0, "stock": 0},
+    {"id": "p3", "category": "Casa", "supplier": "temu", "tags": ["promo"], "price": 60.0, "rating": 4.8, "stock": 5},
+    {"id": "p4", "category": "Moda", "supplier": "shein", "tags": ["promo"], "price": 20.0, "rating": 4.1, "stock": 2},
+]
+
+
+def test_filtered_counts_leave_out_each_dimensions_own_filter(mongo):
+    db = mongo.luxdrop_test
+    facets = FacetCounts(db)
+
+    async def scenario():
+        await db.products.insert_many([dict(product) for product in PRODUCTS])
+        return await facets.filtered_counts(browse_query(category=["Beleza"], supplier=["temu"]))
+
+    counts, total = run(scenario())
+    assert total == 1
+    # Category is counted over temu products, supplier over Beleza products
+    assert counts["category"] == {"Beleza": 1, "Casa": 1}
+    assert counts["supplier"] == {"temu": 1, "shein": 1}
+    # Unfiltered dimensions are counted over the full match
+    assert counts["tags"] == {"novo": 1}
+    assert counts["in_stock"] == {"true": 1}
+
+
+def test_browse_counts_without_filters_use_maintained_counts(mongo):
+    db = mongo.luxdrop_test
+    facets = FacetCounts(db)
+
+    async def scenario():
+        await db.products.insert_many([dict(product) for product in PRODUCTS])
+        await facets.refresh()
+        return await facets.browse_counts({})
+
+    counts, total = run(scenario())
+    assert total == 4
+    assert counts["category"] == {"Beleza": 2, "Casa": 1, "Moda": 1}
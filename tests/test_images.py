@@ -0,0 +1,90 @@
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from images import DiskCache, ImageProxy, ImageProxyError
+from tests.conftest import run
+
+
+def png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "gold").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def proxy_with(tmp_path, routes: dict) -> ImageProxy:
+    """An ImageProxy whose upstream answers each URL from ``routes``; unknown URLs are 404."""
+    proxy = ImageProxy(str(tmp_path), ["cdn.example.com"])
+    proxy.requested = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        proxy.requested.append(str(request.url))
+        return routes.get(str(request.url)) or httpx.Response(404)
+
+    proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+    return proxy
+
+
+def image_response() -> httpx.Response:
+    return httpx.Response(200, headers={"content-type": "image/png"}, content=png())
+
+
+def test_only_allowed_hosts_and_their_subdomains_are_fetched(tmp_path):
+    proxy = ImageProxy(str(tmp_path), ["cdn.example.com"])
+    assert proxy.allowed("https://cdn.example.com/a.png")
+    assert proxy.allowed("https://eu.cdn.example.com/a.png")
+    assert not proxy.allowed("https://cdn.example.com.evil.test/a.png")
+    assert not proxy.allowed("https://evil-cdn.example.com/a.png")
+    assert not proxy.allowed("ftp://cdn.example.com/a.png")
+    with pytest.raises(ImageProxyError) as error:
+        run(proxy.original("http://169.254.169.254/latest/meta-data"))
+    assert error.value.status_code == 403
+
+
+def test_redirects_between_allowed_hosts_are_followed(tmp_path):
+    proxy = proxy_with(tmp_path, {
+        "https://cdn.example.com/a.png": httpx.Response(302, headers={"location": "https://eu.cdn.example.com/a.png"}),
+        "https://eu.cdn.example.com/a.png": image_response(),
+    })
+    digest = run(proxy.original("https://cdn.example.com/a.png"))
+    assert proxy.cache.get(digest).read_bytes() == png()
+
+
+def test_redirect_to_a_host_not_on_the_list_is_refused(tmp_path):
+    proxy = proxy_with(tmp_path, {
+        "https://cdn.example.com/a.png": httpx.Response(302, headers={"location": "http://127.0.0.1:27017/"}),
+    })
+    with pytest.raises(ImageProxyError) as error:
+        run(proxy.original("https://cdn.example.com/a.png"))
+    assert error.value.status_code == 403
+    assert proxy.requested == ["https://cdn.example.com/a.png"]
+
+
+def test_redirect_loops_are_cut_off(tmp_path):
+    proxy = proxy_with(tmp_path, {
+        "https://cdn.example.com/a.png": httpx.Response(301, headers={"location": "/a.png"}),
+    })
+    with pytest.raises(ImageProxyError) as error:
+        run(proxy.original("https://cdn.example.com/a.png"))
+    assert error.value.status_code == 502
+    assert len(proxy.requested) == 6
+
+
+def test_disk_cache_evicts_least_recently_used_first(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=25)
+    cache.load()
+    for key in ("aa1", "bb2", "cc3"):
+        path = cache.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        cache.add(key, 10)
+        if key == "bb2":
+            # Reading aa1 makes bb2 the least recently used
+            assert cache.get("aa1")
+
+    assert cache.get("bb2") is None
+    assert not cache.path("bb2").exists()
+    assert cache.get("aa1") and cache.get("cc3")
+    assert cache.stats() == {"files": 2, "bytes": 20, "max_bytes": 25}
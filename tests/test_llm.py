@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from llm import FakeLLMBackend, LLMBackend, LLMClient, LLMError
+from tests.conftest import run
+
+
+class SlowBackend(LLMBackend):
+    """Records how many calls overlap."""
+
+    provider = model = "slow"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+
+    async def complete(self, prompt, system_message, session_id):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return f"reply to {prompt}"
+
+
+def test_identical_prompts_are_answered_from_the_cache():
+    backend = FakeLLMBackend()
+    client = LLMClient(backend)
+
+    async def scenario():
+        first = await client.generate("Descreve o relógio")
+        second = await client.generate("Descreve o relógio")
+        other = await client.generate("Descreve a bolsa")
+        return first, second, other
+
+    first, second, other = run(scenario())
+    assert first == second != other
+    assert backend.calls == 2
+
+
+def test_concurrent_identical_prompts_share_one_call():
+    backend = FakeLLMBackend(delay=0.05)
+    client = LLMClient(backend)
+
+    async def scenario():
+        return await asyncio.gather(*(client.generate("Descreve o relógio") for _ in range(5)))
+
+    assert len(set(run(scenario()))) == 1
+    assert backend.calls == 1
+
+
+def test_concurrency_is_bounded_by_the_semaphore():
+    backend = SlowBackend(delay=0.02)
+    client = LLMClient(backend, max_concurrency=3)
+
+    async def scenario():
+        return await asyncio.gather(*(client.generate(f"prompt {i}") for i in range(10)))
+
+    assert len(run(scenario())) == 10
+    assert backend.max_running == 3
+
+
+def test_timeout_raises_llm_error_and_is_not_cached():
+    backend = SlowBackend(delay=0.2)
+    client = LLMClient(backend, timeout=0.01)
+
+    with pytest.raises(LLMError):
+        run(client.generate("prompt"))
+    assert client.consecutive_failures == 1
+    backend.delay = 0
+    assert run(client.generate("prompt")) == "reply to prompt"
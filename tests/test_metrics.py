@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from prometheus_client import REGISTRY
+
+from llm import LLMError
+from metrics import MetricsMiddleware, MongoCommandMetrics, record_llm_call
+from tests.conftest import run
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def requests(method: str, route: str, status: int) -> float:
+    return sample("http_requests_total", method=method, route=route, status=str(status))
+
+
+def metered_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/products/{product_id}")
+    async def get_product(product_id: str):
+        if product_id == "missing":
+            raise HTTPException(status_code=404, detail="Product not found")
+        return {"id": product_id}
+
+    @app.get("/api/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def call(*paths: str):
+    async def scenario():
+        transport = httpx.ASGITransport(app=metered_app(), raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return [(await http.get(path)).status_code for path in paths]
+
+    return run(scenario())
+
+
+def test_requests_are_labelled_by_route_template_and_status():
+    template = "/api/products/{product_id}"
+    before = (requests("GET", template, 200), requests("GET", template, 404), requests("GET", "unmatched", 404))
+    statuses = call("/api/products/p1", "/api/products/p2", "/api/products/missing", "/api/nowhere")
+
+    assert statuses == [200, 200, 404, 404]
+    after = (requests("GET", template, 200), requests("GET", template, 404), requests("GET", "unmatched", 404))
+    assert [b - a for a, b in zip(before, after)] == [2, 1, 1]
+    assert sample("http_requests_total", method="GET", route="/api/products/p1", status="200") == 0
+    assert sample("http_requests_in_progress", method="GET") == 0
+
+
+def test_a_route_that_raises_is_counted_as_500():
+    before = requests("GET", "/api/boom", 500)
+    assert call("/api/boom") == [500]
+    assert requests("GET", "/api/boom", 500) - before == 1
+
+
+def command_event(name: str, request_id: int, collection="products", duration_micros=2000):
+    return SimpleNamespace(
+        command_name=name, command={name: collection}, connection_id=("localhost", 27017),
+        request_id=request_id, duration_micros=duration_micros,
+    )
+
+
+def test_command_listener_pairs_started_with_succeeded_and_failed():
+    listener = MongoCommandMetrics()
+    count = lambda command: sample("mongodb_command_duration_seconds_count", command=command, collection="products")
+    failures = lambda: sample("mongodb_command_failures_total", command="aggregate", collection="products")
+    before = count("find"), count("aggregate"), failures()
+
+    listener.started(command_event("find", 1))
+    listener.started(command_event("aggregate", 2))
+    listener.succeeded(command_event("find", 1))
+    listener.failed(command_event("aggregate", 2))
+    # Finished events without a started one (ignored commands, unknown ids) record nothing
+    listener.started(command_event("ping", 3, collection=1))
+    listener.succeeded(command_event("ping", 3, collection=1))
+    listener.succeeded(command_event("find", 99))
+
+    assert (count("find") - before[0], count("aggregate") - before[1], failures() - before[2]) == (1, 1, 1)
+    assert listener._pending == {}
+
+
+def test_llm_calls_record_latency_tokens_and_error_kind():
+    labels = {"provider": "fake", "model": "metrics-test"}
+    record_llm_call("fake", "metrics-test", "Descreve o relógio dourado", "Um relógio elegante", 0.2, None)
+    record_llm_call("fake", "metrics-test", "Olá", None, 60.0, LLMError("LLM call timed out after 60s"))
+    cause = ConnectionError("reset")
+    error = LLMError("reset")
+    error.__cause__ = cause
+    record_llm_call("fake", "metrics-test", "Olá", None, 0.1, error)
+
+    assert sample("llm_request_duration_seconds_count", outcome="ok", **labels) == 1
+    assert sample("llm_request_duration_seconds_count", outcome="error", **labels) == 2
+    assert sample("llm_tokens_total", direction="prompt", **labels) > 0
+    assert sample("llm_tokens_total", direction="completion", **labels) > 0
+    assert sample("llm_errors_total", kind="timeout", **labels) == 1
+    assert sample("llm_errors_total", kind="ConnectionError", **labels) == 1
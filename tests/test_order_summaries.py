@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+from order_summaries import BACKFILL_ID, OrderSummaries, summarize
+from tests.conftest import run
+
+
+def order(order_id: str) -> dict:
+    return {
+        "id": order_id, "user_email": "ana@example.com", "status": "pending", "total": 10.0,
+        "items": [{"product_id": "p1", "name": "Relógio", "quantity": 1, "price": 10.0}],
+        "created_at": datetime(2026, 3, 1, tzinfo=timezone.utc),
+    }
+
+
+def test_backfill_adds_missing_summaries_even_when_counts_match(mongo):
+    db = mongo.luxdrop_test
+    summaries = OrderSummaries(db)
+
+    async def scenario():
+        await db.orders.insert_many([order("o1"), order("o2")])
+        # As many summaries as orders, but o2 has none
+        await db.order_summaries.insert_many([summarize(order("o1")), summarize(order("gone"))])
+        added = await summaries.backfill()
+        again = await summaries.backfill()
+        return added, again, sorted(await db.order_summaries.distinct("id"))
+
+    added, again, ids = run(scenario())
+    assert added == 1
+    assert again == 0
+    assert ids == ["gone", "o1", "o2"]
+
+
+def test_backfill_resumes_from_its_checkpoint_and_runs_once(mongo):
+    db = mongo.luxdrop_test
+    summaries = OrderSummaries(db)
+
+    async def scenario():
+        await db.orders.insert_many([order("o1"), order("o2"), order("o3")])
+        # An earlier run got through o1 before it was interrupted
+        await db.backfills.insert_one({"_id": BACKFILL_ID, "last_id": "o1"})
+        added = await summaries.backfill()
+        # Orders written from now on come with their summary; the walk isn't repeated
+        await db.orders.insert_one(order("o4"))
+        again = await summaries.backfill()
+        return added, again, sorted(await db.order_summaries.distinct("id")), await db.backfills.find_one({})
+
+    added, again, ids, checkpoint = run(scenario())
+    assert (added, again) == (2, 0)
+    assert ids == ["o2", "o3"]
+    assert checkpoint["done"] and checkpoint["last_id"] == "o3"
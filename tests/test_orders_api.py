@@ -0,0 +1,125 @@
+from tests.conftest import api, run
+
+PRODUCT = {"id": "p1", "name": "Relógio Gold", "description": "", "price": 30.0, "category": "Acessórios", "stock": 5}
+ADDRESS = {"street": "Rua Augusta 1", "city": "Lisboa", "postal_code": "1100-048", "country": "Portugal"}
+
+
+def order_body(product_id="p1", quantity=2):
+    return {
+        "user_email": "ana@example.com",
+        "user_name": "Ana",
+        "items": [{"product_id": product_id, "quantity": quantity}],
+        "total": 0,
+        "payment_method": "mbway",
+        "shipping_address": ADDRESS,
+    }
+
+
+async def stock(app):
+    return (await app.db.products.find_one({"id": "p1"}))["stock"]
+
+
+def test_unknown_product_is_404_and_stock_out_is_409(app):
+    async def scenario():
+        await app.db.products.insert_one(dict(PRODUCT))
+        async with api(app) as http:
+            unknown = await http.post("/api/orders", json=order_body(product_id="missing"))
+            short = await http.post("/api/orders", json=order_body(quantity=6))
+        return unknown, short, await stock(app)
+
+    unknown, short, left = run(scenario())
+    assert unknown.status_code == 404
+    assert unknown.json()["detail"]["product_ids"] == ["missing"]
+    assert short.status_code == 409
+    assert left == 5
+
+
+def test_cancelling_a_confirmed_order_returns_its_stock_once(app):
+    async def scenario():
+        await app.db.products.insert_one(dict(PRODUCT))
+        async with api(app) as http:
+            order = (await http.post("/api/orders", json=order_body())).json()
+            path = f"/api/orders/{order['id']}/status"
+            confirmed = await http.patch(path, params={"status": "confirmed"})
+            after_confirm = await stock(app)
+            cancelled = await http.patch(path, params={"status": "cancelled"})
+            after_cancel = await stock(app)
+            again = await http.patch(path, params={"status": "confirmed"})
+        return confirmed, after_confirm, cancelled, after_cancel, again, await stock(app)
+
+    confirmed, after_confirm, cancelled, after_cancel, again, final = run(scenario())
+    assert confirmed.status_code == cancelled.status_code == 200
+    assert after_confirm == 3
+    assert after_cancel == 5
+    # Cancelled is final, so the stock can't be taken or returned a second time
+    assert again.status_code == 409
+    assert final == 5
+
+
+def test_status_must_be_known_and_a_valid_transition(app):
+    async def scenario():
+        await app.db.products.insert_one(dict(PRODUCT))
+        async with api(app) as http:
+            order = (await http.post("/api/orders", json=order_body())).json()
+            path = f"/api/orders/{order['id']}/status"
+            unknown = await http.patch(path, params={"status": "lost"})
+            skipped = await http.patch(path, params={"status": "delivered"})
+            missing = await http.patch("/api/orders/nope/status", params={"status": "confirmed"})
+        return unknown, skipped, missing
+
+    unknown, skipped, missing = run(scenario())
+    assert unknown.status_code == 422
+    assert skipped.status_code == 409
+    assert missing.status_code == 404
+
+
+def test_repeating_a_status_is_a_no_op(app, monkeypatch):
+    monkeypatch.setattr(app, "ORDER_WEBHOOK_URLS", ["http://hooks.test/orders"])
+
+    async def scenario():
+        await app.db.products.insert_one(dict(PRODUCT))
+        async with api(app) as http:
+            order = (await http.post("/api/orders", json=order_body())).json()
+            path = f"/api/orders/{order['id']}/status"
+            first = await http.patch(path, params={"status": "confirmed"})
+            counters = await app.stats_service.get_counters()
+            repeated = await http.patch(path, params={"status": "confirmed"})
+        webhooks = await app.db.outbox_events.count_documents({"kind": "status_webhook"})
+        return first, repeated, webhooks, counters, await app.stats_service.get_counters(), await stock(app)
+
+    first, repeated, webhooks, before, after, left = run(scenario())
+    assert first.status_code == repeated.status_code == 200
+    assert repeated.json()["message"] == "Order status unchanged"
+    assert webhooks == 1
+    assert after["orders_by_status"] == before["orders_by_status"]
+    assert left == 3
+
+
+def test_order_history_needs_one_of_the_customers_order_ids(app):
+    async def scenario():
+        await app.db.products.insert_one(dict(PRODUCT))
+        async with api(app) as http:
+            order = (await http.post("/api/orders", json=order_body(quantity=1))).json()
+            other = (await http.post("/api/orders", json={**order_body(quantity=1), "user_email": "rui@example.com"})).json()
+            history = "/api/orders/history"
+            own = await http.get(history, params={"user_email": "ana@example.com", "order_id": order["id"]})
+            email_only = await http.get(history, params={"user_email": "ana@example.com"})
+            someone_elses = await http.get(history, params={"user_email": "ana@example.com", "order_id": other["id"]})
+        return order, own, email_only, someone_elses
+
+    order, own, email_only, someone_elses = run(scenario())
+    assert own.status_code == 200
+    assert [summary["id"] for summary in own.json()] == [order["id"]]
+    assert email_only.status_code == 422
+    assert someone_elses.status_code == 404
+
+
+def test_an_order_without_items_is_400(app):
+    async def scenario():
+        async with api(app) as http:
+            response = await http.post("/api/orders", json={**order_body(), "items": []})
+        return response, await app.db.orders.count_documents({}), await app.db.outbox_events.count_documents({})
+
+    response, orders, events = run(scenario())
+    assert response.status_code == 400
+    assert orders == events == 0
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import hmac
+
+import httpx
+
+from outbox import Outbox, WebhookHandler, new_event
+from tests.conftest import run
+
+
+class FakeWebhookHandler(WebhookHandler):
+    """Sends through an in-memory transport that answers with ``statuses`` in turn."""
+
+    def __init__(self, statuses, **kwargs):
+        super().__init__(**kwargs)
+        self.statuses = list(statuses)
+        self.requests = []
+        self._client = httpx.AsyncClient(transport=httpx.MockTransport(self.respond))
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0])
+
+
+def webhook_event(key: str) -> dict:
+    return new_event("status_webhook", key, {"url": "http://hooks.test/orders", "body": {"order_id": key}})
+
+
+async def deliver(db, client, handler, events, **options):
+    """Enqueue ``events`` and run the workers until none is left pending."""
+    outbox = Outbox(db, client, {"status_webhook": handler}, workers=2, base_delay=0, poll_interval=0.01,
+                    transactions=False, **options)
+    await outbox.start()
+    await outbox.write(lambda session: asyncio.sleep(0), lambda _: events)
+    for _ in range(200):
+        if not await db.outbox_events.count_documents({"status": {"$in": ["pending", "processing"]}}):
+            break
+        await asyncio.sleep(0.01)
+    await outbox.shutdown(drain_timeout=1)
+    return await db.outbox_events.find({}, {"_id": 0}).sort("idempotency_key", 1).to_list(None)
+
+
+def test_webhooks_are_delivered_signed_with_their_idempotency_key(mongo):
+    handler = FakeWebhookHandler([200], secret="s3cret")
+    events = run(deliver(mongo.luxdrop_test, mongo, handler, [webhook_event("a"), webhook_event("b")]))
+
+    assert [(event["status"], event["attempts"]) for event in events] == [("delivered", 1), ("delivered", 1)]
+    request = next(request for request in handler.requests if request.headers["Idempotency-Key"] == "a")
+    signature = hmac.new(b"s3cret", request.content, hashlib.sha256).hexdigest()
+    assert request.headers["X-LuxDrop-Signature"] == f"sha256={signature}"
+    assert request.headers["X-LuxDrop-Event"] == "status_webhook"
+
+
+def test_retryable_failures_are_retried_until_delivered(mongo):
+    handler = FakeWebhookHandler([503, 502, 200])
+    [event] = run(deliver(mongo.luxdrop_test, mongo, handler, [webhook_event("a")]))
+
+    assert event["status"] == "delivered"
+    assert event["attempts"] == 3
+    assert len(handler.requests) == 3
+
+
+def test_rejected_and_exhausted_events_are_dead_lettered(mongo):
+    rejected = run(deliver(mongo.luxdrop_test, mongo, FakeWebhookHandler([400]), [webhook_event("a")]))
+    exhausted = run(deliver(mongo.luxdrop_test, mongo, FakeWebhookHandler([503]), [webhook_event("b")], max_attempts=3))
+
+    assert (rejected[0]["status"], rejected[0]["attempts"]) == ("dead", 1)
+    assert exhausted[1]["status"] == "dead"
+    assert exhausted[1]["attempts"] == 3
+    assert exhausted[1]["last_error"].startswith("HTTPStatusError")
@@ -0,0 +1,100 @@
+from tests.conftest import api, run
+
+
+def test_search_rejects_sort_cursor_and_ndjson(app):
+    async def scenario():
+        async with api(app) as http:
+            plain = await http.get("/api/products", params={"search": "relógio"})
+            responses = [
+                await http.get("/api/products", params={"search": "relógio", **params})
+                for params in ({"sort": "rating"}, {"cursor": "abc"}, {"format": "ndjson"})
+            ]
+        return plain, responses
+
+    plain, responses = run(scenario())
+    assert plain.status_code == 200
+    assert [response.status_code for response in responses] == [400, 400, 400]
+
+
+def test_listing_still_sorts_without_search(app):
+    async def scenario():
+        await app.db.products.insert_many([
+            {"id": "a", "name": "A", "description": "", "price": 1.0, "category": "Beleza", "rating": 3.0},
+            {"id": "b", "name": "B", "description": "", "price": 1.0, "category": "Beleza", "rating": 5.0},
+        ])
+        async with api(app) as http:
+            return await http.get("/api/products", params={"sort": "rating"})
+
+    response = run(scenario())
+    assert [product["id"] for product in response.json()] == ["b", "a"]
+
+
+def test_search_follows_product_writes(app):
+    from changes import ProductChange
+
+    product = {"name": "Relógio Dourado", "description": "Aço inoxidável", "price": 50.0,
+               "category": "Acessórios", "images": [], "stock": 3, "supplier": "temu"}
+
+    async def scenario():
+        await app.search_index.rebuild(app.db.products)
+        async with api(app) as http:
+            created = (await http.post("/api/products", json=product)).json()
+            found = await http.get("/api/products", params={"search": "relogio"})
+            await app.db.products.update_one({"id": created["id"]}, {"$set": {"name": "Pulseira Dourada"}})
+            await app.product_changes.publish([ProductChange(created["id"], "updated", changed_fields=["name"])])
+            renamed = await http.get("/api/products", params={"search": "relogio"})
+            by_new_name = await http.get("/api/products", params={"search": "pulseira"})
+        return created, found, renamed, by_new_name
+
+    created, found, renamed, by_new_name = run(scenario())
+    assert [product["id"] for product in found.json()] == [created["id"]]
+    assert renamed.json() == []
+    assert [product["id"] for product in by_new_name.json()] == [created["id"]]
+
+
+def test_listing_pages_chain_through_the_cursor(app):
+    from datetime import datetime, timezone
+
+    async def scenario():
+        await app.db.products.insert_many([
+            {"id": f"p{i}", "name": f"P{i}", "description": "", "price": 1.0, "category": "Beleza",
+             "created_at": datetime(2026, 3, 1 + i, tzinfo=timezone.utc)}
+            for i in range(5)
+        ])
+        pages = []
+        async with api(app) as http:
+            params = {"limit": 2}
+            while True:
+                response = await http.get("/api/products", params=params)
+                pages.append([product["id"] for product in response.json()])
+                if "X-Next-Cursor" not in response.headers:
+                    return pages
+                params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert run(scenario()) == [["p4", "p3"], ["p2", "p1"], ["p0"]]
+
+
+def test_tampered_cursors_are_400(app):
+    import base64
+    import json
+
+    def cursor(payload) -> str:
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+    async def scenario():
+        async with api(app) as http:
+            return [
+                await http.get("/api/products", params={"cursor": value})
+                for value in (
+                    "not-base64!",
+                    cursor(["created_at", {"$dt": "yesterday"}, "p1"]),
+                    cursor(["created_at", {"$dt": 5}, "p1"]),
+                    cursor(["created_at", "2026-03-01"]),
+                    cursor(["rating", 4.5, "p1"]),
+                )
+            ]
+
+    responses = run(scenario())
+    assert [response.status_code for response in responses] == [400] * 5
+    assert responses[1].json()["detail"] == "Invalid cursor"
+    assert responses[4].json()["detail"] == "Cursor does not match sort order"
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from indexes import QueryPlanGuard, QueryPlanGuardMiddleware, ensure_indexes
+from tests.conftest import api, run
+
+FIND = SimpleNamespace(command_name="find", database_name="luxdrop_test", command={"find": "products", "filter": {"category": "Beleza"}})
+
+
+class RecordingGuard(QueryPlanGuard):
+    """Reports every captured command as a violation instead of explaining it."""
+
+    async def check(self, client, route, capture):
+        found = [{"route": route, "collection": command[name]} for _, name, command in capture.commands]
+        self.violations.extend(found)
+        return found
+
+
+def test_commands_are_attributed_to_the_capture_they_ran_in():
+    guard = QueryPlanGuard()
+    background_may_run = asyncio.Event()
+
+    async def background():
+        await background_may_run.wait()
+        guard.listener.started(FIND)
+
+    async def scenario():
+        task = asyncio.create_task(background())
+        with guard.capture() as first:
+            # Motor runs commands in executor threads with a copy of the caller's context
+            await asyncio.to_thread(guard.listener.started, FIND)
+            background_may_run.set()
+            await task
+            spawned = asyncio.create_task(asyncio.sleep(0.01))
+        with guard.capture() as second:
+            await spawned
+        guard.listener.started(FIND)
+        return first, second
+
+    first, second = run(scenario())
+    assert len(first.commands) == 1
+    assert second.commands == []
+
+
+def test_middleware_covers_commands_sent_while_streaming():
+    guard = RecordingGuard()
+    streaming = FastAPI()
+
+    @streaming.get("/export")
+    async def export():
+        async def body():
+            yield b"first\n"
+            guard.listener.started(FIND)
+            yield b"second\n"
+        return StreamingResponse(body())
+
+    async def scenario():
+        async with api(SimpleNamespace(app=QueryPlanGuardMiddleware(streaming, guard, client=None))) as http:
+            return await http.get("/export")
+
+    response = run(scenario())
+    assert response.status_code == 500
+    assert response.json()["violations"] == [{"route": "GET /export", "collection": "products"}]
+
+
+# explain needs a real server: MONGO_TEST_URL=mongodb://localhost:27017 pytest tests/test_query_plans.py
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL")
+
+
+@pytest.mark.skipif(not MONGO_TEST_URL, reason="MONGO_TEST_URL is not set")
+def test_storefront_routes_use_indexes(monkeypatch):
+    import server
+
+    guard = QueryPlanGuard(min_docs=200)
+    monkeypatch.setattr(server.client, "url", MONGO_TEST_URL)
+    monkeypatch.setitem(server.client.options, "event_listeners", [guard.listener])
+    categories = ["Beleza", "Acessórios", "Casa & Decoração"]
+    products = [
+        {"id": f"qp-{i}", "name": f"Produto {i}", "description": "", "price": 10.0 + i % 90, "category": categories[i % 3],
+         "images": [], "stock": 10, "supplier": "temu", "tags": ["luxo"], "rating": 3.0 + i % 20 / 10,
+         "created_at": server.utcnow()}
+        for i in range(500)
+    ]
+    order = {
+        "id": "qp-order", "user_email": "ana@example.com", "user_name": "Ana", "status": "pending", "total": 10.0,
+        "payment_method": "mbway", "items": [{"product_id": "qp-7", "name": "Produto 7", "quantity": 1, "price": 10.0}],
+        "shipping_address": {"city": "Lisboa", "country": "Portugal"}, "created_at": server.utcnow(),
+    }
+    routes = [
+        "/api/products", "/api/products?category=Beleza", "/api/products?sort=rating&order=desc",
+        "/api/products/qp-7", "/api/products/browse?category=Beleza&sort=price", "/api/products/qp-7/related",
+        "/api/categories", "/api/orders?user_email=ana@example.com",
+        "/api/orders/history?user_email=ana@example.com&order_id=qp-order", "/api/orders/qp-order/tracking",
+    ]
+
+    async def scenario():
+        server.client.open()
+        try:
+            await server.client.drop_database(server.db.name)
+            await ensure_indexes(server.db)
+            await server.db.products.insert_many(products)
+            await server.db.orders.insert_one(dict(order))
+            await server.order_summaries.add(order)
+            async with api(SimpleNamespace(app=QueryPlanGuardMiddleware(server.app, guard, server.client))) as http:
+                return {route: (await http.get(route)).status_code for route in routes}
+        finally:
+            await server.client.drop_database(server.db.name)
+            server.client.close()
+
+    statuses = run(scenario())
+    assert guard.violations == []
+    assert set(statuses.values()) == {200}
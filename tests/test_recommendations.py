@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+from recommendations import Recommender
+from tests.conftest import api, run
+
+STARTED = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+PRODUCTS = [
+    {"id": "watch", "name": "Relógio dourado", "description": "Relógio de pulso", "category": "Acessórios",
+     "tags": ["relógio"], "stock": 5},
+    {"id": "strap", "name": "Bracelete de couro", "description": "Bracelete para relógio", "category": "Acessórios",
+     "tags": ["relógio"], "stock": 5},
+    {"id": "box", "name": "Caixa para relógios", "description": "Guarda relógio", "category": "Acessórios",
+     "tags": ["relógio"], "stock": 5},
+    {"id": "wallet", "name": "Carteira de couro", "description": "Carteira", "category": "Acessórios",
+     "tags": ["couro"], "stock": 0},
+    {"id": "candle", "name": "Vela aromática", "description": "Vela de soja", "category": "Casa",
+     "tags": ["decoração"], "stock": 5},
+]
+
+
+def order(order_id: str, *product_ids: str, status="confirmed", minutes=0) -> dict:
+    return {
+        "id": order_id, "status": status, "created_at": STARTED + timedelta(minutes=minutes),
+        "items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids],
+    }
+
+
+def ids(products):
+    return [product["id"] for product in products]
+
+
+async def seed(db, orders=()):
+    await db.products.insert_many([dict(product) for product in PRODUCTS])
+    if orders:
+        await db.orders.insert_many(list(orders))
+
+
+def test_bought_together_ranks_by_co_purchases_and_skips_the_product_and_stock_outs(mongo):
+    db = mongo.luxdrop_test
+    recommender = Recommender(db)
+    orders = [
+        order("o1", "watch", "strap"),
+        order("o2", "watch", "strap", "candle"),
+        order("o3", "watch", "strap"),
+        order("o4", "watch", "candle"),
+        order("o5", "watch", "wallet"),
+        order("o6", "watch", "wallet"),
+        order("o7", "watch", "wallet"),
+        # Cancelled orders don't count
+        order("o8", "watch", "box", status="cancelled"),
+        order("o9", "watch", "box", status="cancelled"),
+    ]
+
+    async def scenario():
+        await seed(db, orders)
+        await recommender.rebuild()
+        stored = await db.product_recommendations.find_one({"product_id": "watch"})
+        return stored, await recommender.related("watch")
+
+    stored, related = run(scenario())
+    assert [entry["id"] for entry in stored["bought_together"]] == ["strap", "wallet", "candle"]
+    # wallet is out of stock, and a product is never recommended with itself
+    assert ids(related["frequently_bought_together"]) == ["strap", "candle"]
+    assert "watch" not in ids(related["similar"])
+    assert "box" in ids(related["similar"])
+    assert not set(ids(related["similar"])) & set(ids(related["frequently_bought_together"]))
+
+
+def test_without_orders_similar_products_come_from_content(mongo):
+    db = mongo.luxdrop_test
+    recommender = Recommender(db)
+
+    async def scenario():
+        await seed(db)
+        await recommender.rebuild()
+        return await recommender.related("watch"), await recommender.related("candle")
+
+    watch, candle = run(scenario())
+    assert watch["frequently_bought_together"] == []
+    assert ids(watch["similar"])[:2] in (["box", "strap"], ["strap", "box"])
+    assert "wallet" not in ids(watch["similar"])
+    assert "candle" not in ids(candle["similar"])
+
+
+def test_new_orders_update_only_the_rows_they_touch(mongo):
+    db = mongo.luxdrop_test
+    recommender = Recommender(db)
+
+    async def scenario():
+        await seed(db, [order("o1", "watch", "strap")])
+        await recommender.rebuild()
+        before = await db.product_recommendations.find_one({"product_id": "candle"})
+        now = datetime.now(timezone.utc)
+        await db.orders.insert_one({**order("o2", "candle", "box"), "created_at": now})
+        applied = await recommender.apply_new_orders()
+        again = await recommender.apply_new_orders()
+        return applied, again, before, await recommender.related("candle")
+
+    applied, again, before, candle = run(scenario())
+    assert before["bought_together"] == []
+    assert (applied, again) == (1, 0)
+    assert ids(candle["frequently_bought_together"]) == ["box"]
+
+
+def test_related_endpoint_is_empty_before_the_first_rebuild(app):
+    async def scenario():
+        await seed(app.db)
+        async with api(app) as http:
+            return (await http.get("/api/products/watch/related")).json()
+
+    assert run(scenario()) == {"frequently_bought_together": [], "similar": []}
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import runpy
+from types import SimpleNamespace
+
+from runtime import LeaderJob, LeaderLease, pool_options
+from tests.conftest import BACKEND_DIR, run
+
+TTL = 0.3
+RENEW = 0.05
+
+
+def leases(db, ttl=TTL):
+    return LeaderLease(db.leases, "jobs", "worker-a", ttl), LeaderLease(db.leases, "jobs", "worker-b", ttl)
+
+
+async def until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_one_worker_holds_the_lease_until_it_releases_it(mongo):
+    a, b = leases(mongo.luxdrop_test)
+
+    async def scenario():
+        steps = [await a.acquire(), await b.acquire(), await a.acquire()]
+        await a.release()
+        steps += [await b.acquire(), await a.acquire()]
+        return steps
+
+    assert run(scenario()) == [True, False, True, True, False]
+    assert (a.held, b.held) == (False, True)
+
+
+def test_an_expired_lease_can_be_taken_over(mongo):
+    a, b = leases(mongo.luxdrop_test, ttl=0.1)
+
+    async def scenario():
+        await a.acquire()
+        blocked = await b.acquire()
+        await asyncio.sleep(0.15)
+        return blocked, await b.acquire(), await a.acquire()
+
+    assert run(scenario()) == (False, True, False)
+
+
+class Workers:
+    """Two LeaderJobs on one lease whose job records which worker is running it."""
+
+    def __init__(self, db):
+        self.running = []
+
+        def job(name):
+            async def work():
+                self.running.append(name)
+                try:
+                    await asyncio.Event().wait()
+                finally:
+                    self.running.remove(name)
+            return work
+
+        a, b = leases(db)
+        self.a = LeaderJob(a, job("a"), renew_every=RENEW)
+        self.b = LeaderJob(b, job("b"), renew_every=RENEW)
+
+
+def test_only_the_holder_runs_the_job_and_hands_over_on_stop(mongo):
+    workers = Workers(mongo.luxdrop_test)
+
+    async def scenario():
+        workers.a.start()
+        await until(lambda: workers.running == ["a"])
+        workers.b.start()
+        await asyncio.sleep(RENEW * 4)
+        alone = list(workers.running)
+        loop = asyncio.get_running_loop()
+        await workers.a.stop()
+        stopped_at = loop.time()
+        await until(lambda: workers.running == ["b"])
+        took = loop.time() - stopped_at
+        await workers.b.stop()
+        return alone, took, workers.a.status(), await mongo.luxdrop_test.leases.count_documents({})
+
+    alone, took, status, left = run(scenario())
+    assert alone == ["a"]
+    # Released, so b didn't have to wait for the lease to expire
+    assert took < TTL
+    assert status == {"held": False, "running": False, "finished": False}
+    assert left == 0
+
+
+def test_a_dead_holders_lease_is_taken_over_once_it_expires(mongo):
+    workers = Workers(mongo.luxdrop_test)
+
+    async def scenario():
+        workers.a.start()
+        await until(lambda: workers.running == ["a"])
+        workers.b.start()
+        # a dies: its loop and job stop without releasing the lease
+        workers.a._loop_task.cancel()
+        await workers.a._stop_job()
+        loop = asyncio.get_running_loop()
+        died_at = loop.time()
+        await until(lambda: workers.running == ["b"])
+        waited = loop.time() - died_at
+        await workers.b.stop()
+        return waited
+
+    waited = run(scenario())
+    assert TTL - RENEW * 2 <= waited < TTL * 3
+
+
+def test_failed_jobs_restart_and_finished_ones_stay_finished(mongo):
+    db = mongo.luxdrop_test
+    calls = {"flaky": 0, "once": 0}
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise RuntimeError("try again")
+        await asyncio.Event().wait()
+
+    async def once():
+        calls["once"] += 1
+
+    jobs = [
+        LeaderJob(LeaderLease(db.leases, "flaky", "worker-a", TTL), flaky, renew_every=RENEW),
+        LeaderJob(LeaderLease(db.leases, "once", "worker-a", TTL), once, renew_every=RENEW),
+    ]
+
+    async def scenario():
+        for job in jobs:
+            job.start()
+        await until(lambda: calls["flaky"] == 3)
+        await asyncio.sleep(RENEW * 4)
+        statuses = [job.status() for job in jobs]
+        for job in jobs:
+            await job.stop()
+        return statuses
+
+    flaky_status, once_status = run(scenario())
+    assert flaky_status == {"held": True, "running": True, "finished": False}
+    assert once_status == {"held": True, "running": False, "finished": True}
+    assert calls == {"flaky": 3, "once": 1}
+
+
+def test_pool_options_come_from_the_environment():
+    options = pool_options({"MONGO_MAX_POOL_SIZE": "10"})
+    assert options["maxPoolSize"] == 10
+    assert options["minPoolSize"] == 5
+
+
+def test_gunicorn_passes_the_worker_count_on(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    config = runpy.run_path(str(BACKEND_DIR / "gunicorn.conf.py"))
+    assert config["workers"] == 2
+    assert config["preload_app"] is False
+    # --workers on the command line wins over the environment
+    config["on_starting"](SimpleNamespace(cfg=SimpleNamespace(workers=6)))
+    assert os.environ["WEB_CONCURRENCY"] == "6"
@@ -0,0 +1,79 @@
+from search import ProductSearchIndex, normalize, order_by_ids, tokenize
+
+PRODUCTS = [
+    {"id": "watch", "name": "Relógio Dourado", "description": "Relógio de pulso em aço", "category": "Acessórios",
+     "tags": ["relógio", "dourado"], "supplier": "temu"},
+    {"id": "strap", "name": "Bracelete de couro", "description": "Para relógio de pulso", "category": "Acessórios",
+     "tags": ["couro"], "supplier": "shein"},
+    {"id": "candles", "name": "Velas aromáticas", "description": "Conjunto de três velas", "category": "Casa",
+     "tags": ["decoração"], "supplier": "temu"},
+    {"id": "lamp", "name": "Candeeiro de mesa", "description": "Luz quente", "category": "Casa",
+     "tags": ["decoração"], "supplier": "shein"},
+]
+
+
+def index_of(products=PRODUCTS) -> ProductSearchIndex:
+    index = ProductSearchIndex()
+    for product in products:
+        index.add(product)
+    return index
+
+
+def test_tokenize_folds_accents_case_stopwords_and_plurals():
+    assert normalize("Relógio AÇO") == "relogio aco"
+    assert tokenize("As Velas de Relógios") == ["vela", "relogio"]
+    assert tokenize("Decorações") == ["decoracao"]
+
+
+def test_name_matches_rank_above_description_matches():
+    index = index_of()
+    results = index.search("relogio")
+    assert [doc_id for doc_id, _ in results] == ["watch", "strap"]
+    assert results[0][1] > results[1][1]
+
+
+def test_accents_and_plurals_match_either_way():
+    index = index_of()
+    assert index.search_ids("RELOGIOS") == index.search_ids("relógio")
+    assert index.search_ids("vela") == ["candles"]
+
+
+def test_every_term_adds_to_the_score():
+    index = index_of()
+    assert index.search_ids("relogio couro")[0] == "strap"
+    assert set(index.search_ids("decoracao")) == {"candles", "lamp"}
+
+
+def test_last_term_matches_as_a_prefix():
+    index = index_of()
+    assert index.search_ids("candee") == ["lamp"]
+    assert index.search_ids("candee", prefix=False, fuzzy=False) == []
+
+
+def test_terms_without_matches_fall_back_to_trigrams():
+    index = index_of()
+    assert index.search_ids("braclete", prefix=False) == ["strap"]
+    assert index.search_ids("braclete", prefix=False, fuzzy=False) == []
+
+
+def test_category_and_supplier_filter_the_matches():
+    index = index_of()
+    assert index.search_ids("decoracao", supplier="temu") == ["candles"]
+    assert index.search_ids("relogio", category="Casa") == []
+
+
+def test_reindexing_and_removing_update_the_postings():
+    index = index_of()
+    index.add({**PRODUCTS[3], "name": "Candeeiro de relógio"})
+    assert "lamp" in index.search_ids("relogio")
+    assert index.search_ids("candee") == ["lamp"]
+
+    index.remove("lamp")
+    assert "lamp" not in index.search_ids("relogio")
+    assert index.search_ids("candee", fuzzy=False) == []
+    assert len(index) == 3
+
+
+def test_order_by_ids_follows_the_ranking():
+    docs = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    assert [doc["id"] for doc in order_by_ids(docs, ["c", "missing", "a"])] == ["c", "a"]
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from changes import ProductChange
+from stats import COUNTERS_ID, StatsService
+from tests.conftest import run
+
+
+def test_cancelling_an_order_takes_it_out_of_revenue(mongo):
+    db = mongo.luxdrop_test
+    stats = StatsService(db)
+    order = {"total": 40.0, "status": "pending", "created_at": datetime(2026, 3, 1, 10, 30, tzinfo=timezone.utc)}
+
+    async def scenario():
+        await stats.record_order(order)
+        await stats.record_status_change("pending", "cancelled", order)
+        cancelled = await stats.get_counters()
+        await stats.record_status_change("cancelled", "confirmed", order)
+        return cancelled, await stats.get_counters(), await stats.get_rollups("day", 1)
+
+    cancelled, restored, rollups = run(scenario())
+    assert cancelled["total_revenue"] == 0
+    assert cancelled["orders_by_status"] == {"pending": 0, "cancelled": 1}
+    assert restored["total_revenue"] == 40.0
+    assert rollups[0]["revenue"] == 40.0
+
+
+def test_category_edit_recounts_products(mongo):
+    db = mongo.luxdrop_test
+    stats = StatsService(db, recount_delay=0)
+    product = {"id": "p1", "category": "Beleza", "supplier": "temu"}
+
+    async def scenario():
+        await db.products.insert_one(dict(product))
+        await stats.apply_product_changes([ProductChange.created(product)])
+        await db.products.update_one({"id": "p1"}, {"$set": {"category": "Casa"}})
+        await stats.apply_product_changes([ProductChange(product_id="p1", kind="updated", changed_fields=["category"])])
+        await stats._recount_task
+        return await db.stats_counters.find_one({"_id": COUNTERS_ID})
+
+    counters = run(scenario())
+    assert counters["products_total"] == 1
+    assert counters["products_by_category"] == {"Casa": 1}
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from changes import ChangeFeed
+from inventory import Inventory
+from scrapers import HttpSupplierScraper, TokenBucket
+from scrapers import fake_supplier
+from sync import SupplierSync
+from tests.conftest import run
+
+CATALOG_SIZE = 300
+
+
+@pytest.fixture(autouse=True)
+def small_catalog(monkeypatch):
+    monkeypatch.setattr(fake_supplier, "PRODUCT_COUNT", CATALOG_SIZE)
+    # Hold the catalog still; it otherwise moves on every FAKE_SUPPLIER_CHANGE_SECONDS
+    monkeypatch.setattr(fake_supplier, "current_epoch", lambda: 1000)
+
+
+class FakeSupplierScraper(HttpSupplierScraper):
+    """Talks to ``scrapers.fake_supplier`` in-process and records the pages it asked for."""
+
+    def __init__(self, supplier_app=fake_supplier.app, **kwargs):
+        super().__init__("http://supplier.test", **kwargs)
+        self.supplier_app = supplier_app
+        self.pages = []
+        # Set to make the scraper wait before fetching that page
+        self.hold_page = None
+        self.held = asyncio.Event()
+        self.release = asyncio.Event()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.supplier_app), base_url=self.base_url)
+        return self._client
+
+    async def scrape_products(self, category, page=1):
+        if page == self.hold_page:
+            self.held.set()
+            await self.release.wait()
+        self.pages.append(page)
+        return await super().scrape_products(category, page)
+
+
+def test_token_bucket_spaces_requests_beyond_the_burst():
+    bucket = TokenBucket(rate=50, capacity=2)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # Two tokens are free, the other five arrive at 50/s
+    assert run(scenario()) >= 0.09
+
+
+def test_catalog_sync_is_rate_limited(mongo):
+    scraper = FakeSupplierScraper(rate=40, burst=1, page_size=75)
+    sync = SupplierSync(mongo.luxdrop_test, {"temu": scraper}, ChangeFeed())
+
+    async def scenario():
+        started = time.monotonic()
+        run_doc = await sync.start("products")
+        await sync._tasks[run_doc["id"]]
+        return time.monotonic() - started, await sync.get_run(run_doc["id"])
+
+    elapsed, finished = run(scenario())
+    assert finished["status"] == "completed"
+    assert finished["suppliers"]["temu"]["upserted"] == CATALOG_SIZE
+    # Four pages, one request at a time after the first token
+    assert elapsed >= 3 / 40
+
+
+def test_interrupted_catalog_sync_resumes_from_its_checkpoint(mongo):
+    db = mongo.luxdrop_test
+    scraper = FakeSupplierScraper(rate=1000, page_size=50)
+    scraper.hold_page = 4
+    sync = SupplierSync(db, {"temu": scraper}, ChangeFeed())
+
+    async def scenario():
+        run_doc = await sync.start("products")
+        await scraper.held.wait()
+        # A redeploy: the task is cancelled and the run stays running
+        await sync.stop_runs()
+        interrupted = await sync.get_run(run_doc["id"])
+        scraper.hold_page = None
+        scraper.pages.clear()
+        assert await sync.resume_interrupted() == 1
+        await sync._tasks[run_doc["id"]]
+        return interrupted, await sync.get_run(run_doc["id"]), await db.products.count_documents({})
+
+    interrupted, finished, products = run(scenario())
+    assert interrupted["status"] == "running"
+    assert scraper.pages == list(range(4, 7))
+    assert finished["status"] == "completed"
+    assert products == CATALOG_SIZE
+
+
+def test_suppliers_with_the_same_supplier_ids_keep_separate_products(mongo):
+    db = mongo.luxdrop_test
+    sync = SupplierSync(
+        db, {"temu": FakeSupplierScraper(rate=1000), "shein": FakeSupplierScraper(rate=1000)}, ChangeFeed()
+    )
+
+    async def scenario():
+        for _ in range(2):
+            run_doc = await sync.start("products")
+            await sync._tasks[run_doc["id"]]
+        return (
+            await db.products.count_documents({"supplier": "temu"}),
+            await db.products.count_documents({"supplier": "shein"}),
+            await sync.get_run(run_doc["id"]),
+        )
+
+    temu, shein, second = run(scenario())
+    assert temu == shein == CATALOG_SIZE
+    assert second["suppliers"]["shein"]["unchanged"] == CATALOG_SIZE
+
+
+def test_delta_sync_without_a_change_listing_walks_the_catalog(mongo):
+    # Same catalog API, but /products/changes answers 404
+    supplier_app = FastAPI()
+    supplier_app.get("/products")(fake_supplier.list_products)
+    scraper = FakeSupplierScraper(supplier_app, rate=1000)
+    sync = SupplierSync(mongo.luxdrop_test, {"temu": scraper}, ChangeFeed())
+
+    async def scenario():
+        run_doc = await sync.start("delta")
+        await sync._tasks[run_doc["id"]]
+        return await sync.get_run(run_doc["id"])
+
+    finished = run(scenario())
+    assert finished["status"] == "completed"
+    assert finished["suppliers"]["temu"]["upserted"] == CATALOG_SIZE
+    assert scraper.pages == [1, 2, 3]
+
+
+def test_sync_keeps_units_held_by_open_checkouts_off_the_shelf(mongo):
+    db = mongo.luxdrop_test
+    sync = SupplierSync(db, {}, ChangeFeed())
+    inventory = Inventory(db, ChangeFeed())
+    raw = fake_supplier.make_product(7)
+
+    async def scenario():
+        await sync._apply("temu", [{**raw, "stock": 10}])
+        product = await db.products.find_one({"supplier_id": raw["supplier_id"]})
+        await inventory.reserve("order-1", [{"product_id": product["id"], "quantity": 3}])
+        await sync._apply("temu", [{**raw, "version": "next", "stock": 8}])
+        held = await db.products.find_one({"id": product["id"]})
+        await inventory.release("order-1", "cancelled")
+        return held, await db.products.find_one({"id": product["id"]})
+
+    held, released = run(scenario())
+    assert (held["supplier_stock"], held["reserved"], held["stock"]) == (8, 3, 5)
+    assert (released["reserved"], released["stock"]) == (0, 8)